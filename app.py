@@ -1,13 +1,29 @@
+# yfinance e plotly são importados sob demanda (provedores.py e graficos.py), só nos caminhos que os usam
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-import numpy as np
-import requests
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime
+from datetime import date, datetime, timedelta
+import os
 import time
 
+from aquecimento import obter_aquecedor
+from atualizacao import (
+    PRIORIDADES, AnaliseEmAndamento, obter_estimador, obter_gerenciador, prever_analise, prever_cobertura,
+    priorizar_bdrs
+)
+from dados import (
+    DIRETORIO_CACHE, LIMITE_CACHE_MB, REQUISICOES_POR_TICKER, TAXA_MAXIMA, TTL_SEM_DADOS, WORKERS_PADRAO,
+    obter_cache, obter_checkpoints, obter_controlador, obter_universo_indice
+)
+from exportacao import FORMATOS_EXPORTACAO, exportar, formato_por_extensao, historico_em_cache
+from filtros import IndiceFiltros
+from graficos import assinatura_graficos, montar_graficos
+from metricas import obter_metricas
+from pontuacao import CRITERIOS, ROTULOS_CRITERIOS, ranquear_bdrs
+from snapshots import (
+    carregar_snapshot, consultar_historico, descrever_versao, listar_snapshots, maiores_variacoes,
+    relatorio_memoria, ultimo_snapshot
+)
+
 # Configuração da página
 st.set_page_config(
     page_title="Análise BDRs - Fundamentalista",
@@ -36,428 +52,418 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Constantes
-PERIODOS = 5
-TERMINACOES_BDR = ('31', '32', '33', '34', '35', '39')
+def resultado_ranqueado(df_resultado, criterios):
+    """Resultado ranqueado e seu índice de filtros, refeitos só quando o resultado ou os critérios mudam:
+    digitar na busca ou mexer nos filtros reaproveita os dois"""
+    guardado = st.session_state.get('resultado_indexado')
+    if guardado is None or guardado['origem'] is not df_resultado or guardado['criterios'] != criterios:
+        df = ranquear_bdrs(df_resultado, criterios)
+        guardado = {
+            'origem': df_resultado, 'criterios': criterios, 'df': df,
+            'indice': IndiceFiltros(df), 'assinatura': assinatura_graficos(df), 'exportacoes': {},
+        }
+        st.session_state.resultado_indexado = guardado
+    return guardado
 
-CRITERIOS = {
-    'excelente': {'roe': 20, 'margem': 15, 'crescimento': 10, 'dividend_yield': 2, 'pe_max': 25},
-    'bom': {'roe': 15, 'margem': 10, 'crescimento': 5, 'dividend_yield': 1, 'pe_max': 35},
-    'atencao': {'roe': 10, 'margem': 5, 'crescimento': 0, 'dividend_yield': 0, 'pe_max': 50}
-}
+# Figuras compartilhadas entre sessões e reexecuções: o mesmo resultado (ex: o snapshot do dia) não é
+# redesenhado. Objetos mantidos em memória, sem a serialização do cache_data a cada acerto
+@st.cache_resource(max_entries=16)
+def figuras_resultado(assinatura, _df):
+    return montar_graficos(_df)
 
-MAPA_BDRS_COMPLETO = {
-    'AAPL34': 'AAPL', 'MSFT34': 'MSFT', 'GOGL34': 'GOOGL', 'AMZO34': 'AMZN',
-    'NVDC34': 'NVDA', 'M1TA34': 'META', 'TSLA34': 'TSLA', 'NFLX34': 'NFLX',
-    'A1MD34': 'AMD', 'ITLC34': 'INTC', 'ORCL34': 'ORCL', 'AVGO34': 'AVGO',
-    'ADBE34': 'ADBE', 'CSCO34': 'CSCO', 'QCOM34': 'QCOM', 'TXAS34': 'TXN',
-    'I2BM34': 'IBM', 'S2EA34': 'EA', 'U2NI34': 'U', 'ROXO34': 'RBLX',
-    'C2OI34': 'COIN', 'P2LT34': 'PLTR', 'S2MP34': 'SMPL', 'M2RV34': 'MRVL',
-    'MUTC34': 'MU', 'S2NO34': 'SNOW', 'D2OC34': 'DOCU', 'UBER34': 'UBER',
-    'U1BE34': 'UBER', 'LYFT34': 'LYFT', 'SPOT34': 'SPOT', 'TWTR34': 'TWTR',
-    'PINT34': 'PINS', 'SNAP34': 'SNAP', 'Z1M34': 'ZM', 'SHOP34': 'SHOP',
-    'SQ1U34': 'SQ', 'HOOD34': 'HOOD', 'DKNG34': 'DKNG', 'DDOG34': 'DDOG',
-    'VISA34': 'V', 'V2SA34': 'V', 'M2ST34': 'MA', 'PYPL34': 'PYPL',
-    'CTGP34': 'C', 'B1AC34': 'BAC', 'J2PM34': 'JPM', 'W2FC34': 'WFC',
-    'G2S34': 'GS', 'M2S34': 'MS', 'A1XP34': 'AXP', 'BERK34': 'BRK-B',
-    'B1RO34': 'BRK.A', 'PAGS34': 'PAGS', 'NU34': 'NU', 'STOC34': 'STNE',
-    'S1PW34': 'SPG', 'A1MG34': 'AMG', 'BLK34': 'BLK', 'SCHW34': 'SCHW',
-    'WALM34': 'WMT', 'AMZN34': 'AMZN', 'COST34': 'COST', 'H0MC34': 'HD',
-    'T1GT34': 'TGT', 'T2ND34': 'TGT', 'LOW34': 'LOW', 'M1CD34': 'MCD',
-    'SBUB34': 'SBUX', 'NIKE34': 'NKE', 'COCA34': 'KO', 'P3EP34': 'PEP',
-    'KO34': 'KO', 'PGCO34': 'PG', 'ULVR34': 'UL', 'WMT34': 'WMT',
-    'NKE34': 'NKE', 'LULU34': 'LULU', 'ROST34': 'ROST', 'TJX34': 'TJX',
-    'DISB34': 'DIS', 'CMCS34': 'CMCSA', 'NFLX34': 'NFLX', 'WBD34': 'WBD',
-    'PARA34': 'PARA', 'SONY34': 'SONY', 'EA34': 'EA', 'TTWO34': 'TTWO',
-    'JNJB34': 'JNJ', 'LILY34': 'LLY', 'ABBV34': 'ABBV', 'P1FE34': 'PFE',
-    'UNH34': 'UNH', 'MRK34': 'MRK', 'A1BB34': 'ABT', 'T1MO34': 'TMO',
-    'D1HU34': 'DHR', 'BMY34': 'BMY', 'AMGN34': 'AMGN', 'GILD34': 'GILD',
-    'MDT34': 'MDT', 'CI34': 'CI', 'CVS34': 'CVS', 'HUM34': 'HUM',
-    'B1AX34': 'BAX', 'ZTS34': 'ZTS', 'REGN34': 'REGN', 'VRTX34': 'VRTX',
-    'EXXO34': 'XOM', 'CHVX34': 'CVX', 'SHEL34': 'SHEL', 'TOT34': 'TTE',
-    'BP34': 'BP', 'COP34': 'COP', 'SLB34': 'SLB', 'OXY34': 'OXY',
-    'HAL34': 'HAL', 'MPC34': 'MPC', 'PSX34': 'PSX', 'VLO34': 'VLO',
-    'BOEI34': 'BA', 'C1AT34': 'CAT', 'D1EE34': 'DE', 'G1E34': 'GE',
-    'H1ON34': 'HON', 'L1OC34': 'LMT', 'R1TH34': 'RTX', 'U1PS34': 'UPS',
-    'U2PS34': 'UPS', 'F1DX34': 'FDX', 'GD34': 'GD', 'NOC34': 'NOC',
-    'MMM34': 'MMM', 'EMR34': 'EMR', 'ETN34': 'ETN', 'ITW34': 'ITW',
-    'FCXO34': 'FCX', 'N1VO34': 'NEM', 'F2NV34': 'FNV', 'NUE34': 'NUE',
-    'DOW34': 'DOW', 'LYB34': 'LYB', 'APD34': 'APD', 'ECL34': 'ECL',
-    'VALE34': 'VALE', 'RIO34': 'RIO', 'BHP34': 'BHP', 'SCCO34': 'SCCO',
-    'TSMC34': 'TSM', 'ASML34': 'ASML', 'NVDA34': 'NVDA', 'AVGO34': 'AVGO',
-    'AMD34': 'AMD', 'INTC34': 'INTC', 'QCOM34': 'QCOM', 'TXN34': 'TXN',
-    'MU34': 'MU', 'MRVL34': 'MRVL', 'ADI34': 'ADI', 'KLAC34': 'KLAC',
-    'BABA34': 'BABA', 'BIDU34': 'BIDU', 'JD34': 'JD', 'PDD34': 'PDD',
-    'NIO34': 'NIO', 'XPEV34': 'XPEV', 'LI34': 'LI', 'TCEHY': 'TCEHY',
-    'MELI34': 'MELI', 'GLOB34': 'GLOB', 'PBR34': 'PBR', 'ELET34': 'ELP',
-    'T2T34': 'T', 'VZ34': 'VZ', 'TMUS34': 'TMUS', 'S2P34': 'S',
-    'NEE34': 'NEE', 'DUK34': 'DUK', 'SO34': 'SO', 'D34': 'D',
-    'A2RR34': 'ARR', 'AMT34': 'AMT', 'PLD34': 'PLD', 'EQIX34': 'EQIX',
-    'RGTI34': 'RGTI', 'T2DH34': 'TDG', 'V1ST34': 'VST', 'F1MC34': 'FMC',
-}
+# Fragmento: interagir com os filtros reexecuta só a área da tabela, sem reenviar os gráficos.
+# st.experimental_fragment existe desde o Streamlit 1.33 (requirements.txt) e virou st.fragment no 1.37
+fragmento = getattr(st, 'fragment', None) or st.experimental_fragment
 
-@st.cache_data(ttl=3600)
-def obter_todas_bdrs():
-    """Obtém lista de BDRs da B3 via BRAPI"""
-    try:
-        url = "https://brapi.dev/api/quote/list"
-        r = requests.get(url, timeout=30)
-        dados = r.json().get('stocks', [])
-        
-        bdrs_raw = [d for d in dados if d['stock'].endswith(TERMINACOES_BDR)]
-        
-        bdrs_processadas = []
-        for bdr in bdrs_raw:
-            ticker_bdr = bdr['stock']
-            ticker_us = MAPA_BDRS_COMPLETO.get(ticker_bdr)
-            
-            if not ticker_us:
-                ticker_us = ''.join([c for c in ticker_bdr if c.isalpha()])
-            
-            if ticker_us:
-                bdrs_processadas.append({
-                    'bdr': ticker_bdr,
-                    'ticker_us': ticker_us,
-                    'nome': bdr.get('name', ticker_bdr)
-                })
-        
-        return bdrs_processadas
-    except Exception as e:
-        st.error(f"Erro ao buscar BDRs: {e}")
-        return []
+@st.cache_data
+def ler_snapshot(caminho):
+    return carregar_snapshot(caminho)
 
-def calcular_indicadores_empresa_mae(ticker_us, tentativa=1, max_tentativas=3):
-    """Busca dados fundamentalistas da empresa americana com retry e delay"""
-    try:
-        # Delay progressivo para evitar rate limiting
-        if tentativa > 1:
-            delay = tentativa * 2
-            time.sleep(delay)
-        else:
-            time.sleep(1.5)  # Delay mínimo entre requisições
-        
-        # Criar sessão com headers customizados
-        import yfinance as yf
-        acao = yf.Ticker(ticker_us)
-        
-        # Tentar obter info com retry
-        info = None
-        for i in range(2):
-            try:
-                info = acao.get_info()
-                if info and len(info) > 5:
-                    break
-            except Exception as e:
-                if "429" in str(e) and tentativa < max_tentativas:
-                    time.sleep(5)  # Espera 5 segundos em caso de 429
-                    return calcular_indicadores_empresa_mae(ticker_us, tentativa + 1, max_tentativas)
-                time.sleep(2)
-        
-        if not info or len(info) < 5:
-            return None
-        
-        # Tentar obter demonstrativos
-        try:
-            dre = acao.financials
-            balanco = acao.balance_sheet
-            
-            if hasattr(dre, 'T'):
-                dre = dre.T
-            if hasattr(balanco, 'T'):
-                balanco = balanco.T
-        except Exception as e:
-            if "429" in str(e) and tentativa < max_tentativas:
-                time.sleep(5)
-                return calcular_indicadores_empresa_mae(ticker_us, tentativa + 1, max_tentativas)
-            return None
-        
-        if dre is None or balanco is None or dre.empty or balanco.empty:
-            return None
-        
-        dre = dre.head(PERIODOS)
-        balanco = balanco.head(PERIODOS)
-        
-        # Tentar múltiplos nomes de colunas
-        lucro = None
-        for col in ["Net Income", "NetIncome", "Net Income Common Stockholders"]:
-            if col in dre.columns:
-                lucro = dre[col]
-                break
-        
-        receita = None
-        for col in ["Total Revenue", "TotalRevenue", "Total Revenues"]:
-            if col in dre.columns:
-                receita = dre[col]
-                break
-        
-        patrimonio = None
-        for col in ["Total Stockholder Equity", "Stockholders Equity", 
-                    "StockholdersEquity", "Total Equity Gross Minority Interest"]:
-            if col in balanco.columns:
-                patrimonio = balanco[col]
-                break
-        
-        ativo_total = None
-        for col in ["Total Assets", "TotalAssets"]:
-            if col in balanco.columns:
-                ativo_total = balanco[col]
-                break
-        
-        divida_total = None
-        for col in ["Total Debt", "Long Term Debt", "TotalDebt"]:
-            if col in balanco.columns:
-                divida_total = balanco[col]
-                break
-        
-        if lucro is None or receita is None or patrimonio is None:
-            return None
-        
-        # Calcular indicadores
-        roe = (lucro / patrimonio) * 100
-        margem_liquida = (lucro / receita) * 100
-        crescimento_receita = receita.pct_change() * 100
-        roa = (lucro / ativo_total) * 100 if ativo_total is not None else pd.Series([np.nan])
-        
-        if divida_total is not None and patrimonio is not None:
-            divida_pl = (divida_total / patrimonio) * 100
-        else:
-            divida_pl = pd.Series([np.nan])
-        
-        # Dados de mercado
-        preco_atual = (info.get('currentPrice') or 
-                      info.get('regularMarketPrice') or 
-                      info.get('previousClose'))
-        
-        pe_ratio = (info.get('trailingPE') or info.get('forwardPE'))
-        pb_ratio = info.get('priceToBook')
-        
-        dividend_yield = 0
-        if info.get('dividendYield'):
-            dividend_yield = info.get('dividendYield') * 100
-        elif info.get('trailingAnnualDividendYield'):
-            dividend_yield = info.get('trailingAnnualDividendYield') * 100
-        
-        market_cap = (info.get('marketCap') or info.get('enterpriseValue') or 0) / 1e9
-        setor = info.get('sector') or info.get('industry') or 'N/A'
-        
-        # Médias dos indicadores
-        return {
-            'roe': roe.mean() if not roe.empty else 0,
-            'margem': margem_liquida.mean() if not margem_liquida.empty else 0,
-            'crescimento': crescimento_receita.mean() if not crescimento_receita.empty else 0,
-            'dividapl': divida_pl.mean() if not divida_pl.empty else 0,
-            'preco': preco_atual,
-            'pe': pe_ratio,
-            'pb': pb_ratio,
-            'dividend_yield': dividend_yield,
-            'market_cap': market_cap,
-            'setor': setor
-        }
-    except Exception as e:
-        # Se for erro 429 e ainda temos tentativas, retry com delay maior
-        if "429" in str(e) and tentativa < max_tentativas:
-            time.sleep(10)
-            return calcular_indicadores_empresa_mae(ticker_us, tentativa + 1, max_tentativas)
-        return None
+# A versão do snapshot mais recente entra na chave do cache, para um snapshot novo invalidar as consultas
+@st.cache_data(max_entries=32)
+def historico_bdr(bdr, colunas, desde, versao):
+    with obter_metricas().cronometrar('historico'):
+        return consultar_historico(colunas, [bdr], desde)
 
-def classificar_tamanho(market_cap):
-    """Classifica empresa por tamanho"""
-    if market_cap >= 200:
-        return 'Mega Cap'
-    elif market_cap >= 10:
-        return 'Large Cap'
-    elif market_cap >= 2:
-        return 'Mid Cap'
-    else:
-        return 'Small Cap'
+@st.cache_data(max_entries=32)
+def variacoes_desde(desde, coluna, n, versao):
+    with obter_metricas().cronometrar('historico'):
+        return maiores_variacoes(desde, coluna, n)
 
-def classificar_bdr(dados):
-    """Classifica BDR baseado nos fundamentos"""
-    score = 0
-    max_score = 6
-    alertas = []
-    
-    roe = dados.get('roe', 0)
-    margem = dados.get('margem', 0)
-    crescimento = dados.get('crescimento', 0)
-    dividapl = dados.get('dividapl', 0)
-    pe = dados.get('pe', 0)
-    dividend_yield = dados.get('dividend_yield', 0)
-    
-    if roe >= CRITERIOS['excelente']['roe']:
-        score += 1
-    elif roe >= CRITERIOS['bom']['roe']:
-        score += 0.5
+def mostrar_progresso(tarefa):
+    """Progresso da análise em andamento no servidor, lido do estado compartilhado da tarefa"""
+    progresso = tarefa.progresso()
+    st.header("🔄 Análise em andamento")
+    if tarefa.sessoes > 1:
+        st.caption(f"🔗 Compartilhada por {tarefa.sessoes} pedidos: cada empresa é buscada uma única vez")
+    
+    if not progresso:
+        st.info("🔍 Buscando lista de BDRs...")
     else:
-        alertas.append('ROE baixo')
+        if progresso['buscas_economizadas']:
+            st.info(
+                f"♻️ {progresso['total_bdrs']} BDRs de {progresso['empresas']} empresas-mãe: "
+                f"{progresso['buscas_economizadas']} buscas "
+                f"(~{progresso['buscas_economizadas'] * REQUISICOES_POR_TICKER} requisições) economizadas"
+            )
+        if progresso['recuperadas']:
+            st.info(
+                f"⏯️ Retomando análise {progresso['execucao_id']}: "
+                f"{progresso['recuperadas']} empresas recuperadas do checkpoint"
+            )
+        if progresso['evento'] == 'plano':
+            st.info("💹 Buscando cotações em lote...")
+        elif progresso['requisicoes_cotacoes']:
+            st.caption(
+                f"💹 Cotações de {progresso['pendentes']} empresas em {progresso['requisicoes_cotacoes']} requisições"
+            )
+        
+        st.progress(progresso['processadas'] / progresso['total_bdrs'])
+        if progresso['prazo']:
+            decorrido = (datetime.now() - tarefa.iniciada_em).total_seconds()
+            st.caption(f"⏳ Prazo: {max(progresso['prazo'] - decorrido, 0) / 60:.1f} de {progresso['prazo'] / 60:.0f} minutos restantes")
+        if progresso['segundos_restantes']:
+            st.caption(f"⏱️ Término estimado em ~{progresso['segundos_restantes'] / 60:.1f} minutos")
+        if progresso['ticker_atual']:
+            st.text(
+                f"🔄 [{progresso['concluidas']}/{progresso['pendentes']}] {progresso['ticker_atual']} → "
+                f"{', '.join(progresso['bdrs_atuais'])}"
+            )
+        metricas = obter_metricas()
+        st.markdown(f"""
+        **Progresso**: {progresso['processadas']}/{progresso['total_bdrs']}
+        - ✅ Sucesso: {progresso['sucesso']}
+        - ⚠️ Falhas: {progresso['falhas']}
+        - ♻️ Buscas economizadas: {progresso['buscas_economizadas']}
+        - 🚫 Erros 429: {progresso['erros_429']}
+        - ⚡ Taxa atual: {obter_controlador().taxa:.2f} req/s ({progresso['vazao']:.2f} req/s efetivas)
+        - 💾 Cache: {metricas.total('cache_acertos')} acertos, {metricas.total('cache_faltas')} faltas
+        - 📥 Baixados: {metricas.total('bytes_baixados') / 1024 / 1024:.1f} MB
+        """)
+        if progresso['limitados']:
+            st.warning(f"⚠️ Rate limit persistente em: {', '.join(progresso['limitados'])}")
+
+PRIORIDADE_POR_ROTULO = {rotulo: prioridade for prioridade, rotulo in PRIORIDADES.items()}
+
+@st.cache_data(ttl=30)
+def previsao_analise(limite, prazo, prioridade, forcar_atualizacao):
+    """Tempo previsto (com limite) ou BDRs cobertas (com prazo), pelo que já está em cache e pela vazão
+    medida nas análises anteriores. Sem o universo em disco, supõe tudo fora do cache"""
+    lista_bdrs = priorizar_bdrs(obter_universo_indice().listar(), prioridade)[:limite]
+    vazao = obter_estimador().estimar()
+    if prazo is None:
+        segundos = (prever_analise(lista_bdrs, forcar_atualizacao, vazao)['segundos'] if lista_bdrs
+                    else limite * REQUISICOES_POR_TICKER / vazao)
+        return f"⏱️ Tempo estimado: ~{max(round(segundos / 60), 1)} minutos ({vazao:.2f} req/s)"
+    if not lista_bdrs:
+        return f"⏱️ Cobertura estimada: ~{int(prazo * vazao / REQUISICOES_POR_TICKER)} BDRs ({vazao:.2f} req/s)"
+    cobertas = prever_cobertura(lista_bdrs, prazo, forcar_atualizacao, vazao)
+    return f"⏱️ Cobertura estimada: ~{cobertas} de {len(lista_bdrs)} BDRs ({vazao:.2f} req/s)"
+
+# Segundos entre as atualizações do progresso enquanto uma análise está em andamento
+INTERVALO_ACOMPANHAMENTO = 1.0
+
+# Arquivos de exportação guardados por resultado (um por formato e estado dos filtros)
+MAX_EXPORTACOES = 8
+# Buscas que mostram até este número de BDRs contam como visualização delas
+LIMITE_BUSCA_VISUALIZACAO = 10
+
+def registrar_visualizacoes(tickers):
+    """Conta cada ticker uma vez por sessão (reexecuções não inflam a contagem). As contagens
+    priorizam o aquecimento do cache (ver aquecimento.py)"""
+    vistos = st.session_state.setdefault('tickers_vistos', set())
+    novos = [t for t in dict.fromkeys(tickers) if t not in vistos]
+    if novos:
+        obter_cache().registrar_visualizacoes(novos)
+        vistos.update(novos)
+
+FORMATO_POR_ROTULO = {descricao['rotulo']: formato for formato, descricao in FORMATOS_EXPORTACAO.items()}
+
+@fragmento
+def mostrar_tabela(df, indice_filtros, exportacoes):
+    """Filtros, tabela e download do resultado ranqueado. exportacoes guarda os arquivos já
+    gerados deste resultado, por formato e estado dos filtros"""
+    st.header("🔍 Filtros e Tabela")
     
-    if margem >= CRITERIOS['excelente']['margem']:
-        score += 1
-    elif margem >= CRITERIOS['bom']['margem']:
-        score += 0.5
-    else:
-        alertas.append('Margem baixa')
-    
-    if crescimento >= CRITERIOS['excelente']['crescimento']:
-        score += 1
-    elif crescimento >= CRITERIOS['bom']['crescimento']:
-        score += 0.5
-    elif crescimento < 0:
-        alertas.append('Receita em queda')
-    
-    if dividend_yield >= CRITERIOS['excelente']['dividend_yield']:
-        score += 1
-    elif dividend_yield >= CRITERIOS['bom']['dividend_yield']:
-        score += 0.5
-    
-    if pe and pe > 0:
-        if pe <= CRITERIOS['excelente']['pe_max']:
-            score += 1
-        elif pe <= CRITERIOS['bom']['pe_max']:
-            score += 0.5
-        elif pe > CRITERIOS['atencao']['pe_max']:
-            alertas.append('P/E elevado')
-    
-    if not np.isnan(dividapl):
-        if dividapl < 50:
-            score += 1
-        elif dividapl < 100:
-            score += 0.5
-        else:
-            alertas.append('Endividamento alto')
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        filtro_status = st.multiselect(
+            "Status",
+            options=indice_filtros.opcoes['Status'],
+            default=indice_filtros.opcoes['Status']
+        )
     
-    percentual = (score / max_score) * 100
+    with col2:
+        filtro_setor = st.multiselect(
+            "Setor",
+            options=indice_filtros.opcoes['Setor'],
+            default=indice_filtros.opcoes['Setor']
+        )
     
-    if percentual >= 80:
-        status = '🟢 Excelente'
-    elif percentual >= 60:
-        status = '🟡 Bom'
-    elif percentual >= 40:
-        status = '🟠 Atenção'
-    else:
-        status = '🔴 Fraco'
+    with col3:
+        filtro_tamanho = st.multiselect(
+            "Tamanho",
+            options=indice_filtros.opcoes['Tamanho'],
+            default=indice_filtros.opcoes['Tamanho']
+        )
+    
+    with col4:
+        busca = st.text_input("🔎 Buscar BDR/Ticker/Empresa")
+    
+    # Aplicar filtros
+    inicio_tabela = time.perf_counter()
+    # Máscaras pré-calculadas por valor e busca no texto já em minúsculas (ver filtros.py)
+    df_filtrado = indice_filtros.filtrar(
+        {'Status': filtro_status, 'Setor': filtro_setor, 'Tamanho': filtro_tamanho},
+        busca
+    )
+    
+    st.info(f"📊 Mostrando {len(df_filtrado)} de {len(df)} BDRs")
+    if busca and len(df_filtrado) <= LIMITE_BUSCA_VISUALIZACAO:
+        registrar_visualizacoes(df_filtrado['Ticker US'].astype(str))
+    
+    # Tabela
+    st.dataframe(
+        df_filtrado,
+        use_container_width=True,
+        height=600,
+        column_config={
+            "Score": st.column_config.ProgressColumn(
+                "Score",
+                format="%.1f",
+                min_value=0,
+                max_value=6,
+            ),
+            "ROE (%)": st.column_config.NumberColumn(
+                "ROE (%)",
+                format="%.2f%%",
+            ),
+            "Market Cap (B)": st.column_config.NumberColumn(
+                "Market Cap (B)",
+                format="$%.2fB",
+            ),
+            # Indicadores são float32; sem formato a tabela mostraria 15.670000076
+            **{
+                coluna: st.column_config.NumberColumn(coluna, format="%.2f")
+                for coluna in ('Margem (%)', 'Cresc (%)', 'Dívida/PL (%)', 'P/E', 'P/B', 'Div Yield (%)')
+            },
+        }
+    )
+    obter_metricas().registrar_duracao('tabela', time.perf_counter() - inicio_tabela)
     
-    return status, score, alertas
+    # Download: o arquivo só é gerado quando pedido, e reaproveitado enquanto os filtros forem os mesmos
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        formato = FORMATO_POR_ROTULO[st.selectbox("Formato", list(FORMATO_POR_ROTULO), label_visibility="collapsed")]
+    with col2:
+        chave = (formato, tuple(filtro_status), tuple(filtro_setor), tuple(filtro_tamanho), busca)
+        arquivo = exportacoes.get(chave)
+        if arquivo is None and st.button("📦 Gerar arquivo", use_container_width=True):
+            arquivo = exportacoes[chave] = exportar(df_filtrado, formato)
+            while len(exportacoes) > MAX_EXPORTACOES:
+                exportacoes.pop(next(iter(exportacoes)))
+        if arquivo is not None:
+            st.download_button(
+                label=f"📥 Download {FORMATOS_EXPORTACAO[formato]['rotulo']} ({len(df_filtrado)} BDRs)",
+                data=arquivo,
+                file_name=f"bdrs_analise_{datetime.now().strftime('%Y%m%d')}{FORMATOS_EXPORTACAO[formato]['extensao']}",
+                mime=FORMATOS_EXPORTACAO[formato]['mime'],
+                use_container_width=True
+            )
+
+
+# Renovação do cache em segundo plano, uma thread por processo (BDR_AQUECIMENTO_REQ_HORA=0 desliga)
+obter_aquecedor().iniciar()
 
 # Interface Principal
 st.title("📊 Análise Fundamentalista de BDRs")
 st.markdown("**Análise completa baseada nos últimos 5 balanços das empresas-mãe americanas**")
 
 # Sidebar
+snapshot = ultimo_snapshot()
+# Snapshots parciais também mudam o histórico: a versão do mais recente, de qualquer tipo, invalida as consultas
+versao_historico = listar_snapshots()[-1][0] if snapshot else None
+
 with st.sidebar:
+    # Snapshot pré-calculado pelo batch.py
+    if snapshot:
+        versao_snapshot, caminho_snapshot = snapshot
+        st.subheader("📂 Snapshot")
+        st.caption(f"Último snapshot: {descrever_versao(versao_snapshot)}")
+        if st.button("Carregar último snapshot", use_container_width=True):
+            st.session_state.df_resultado = ler_snapshot(caminho_snapshot)
+            st.session_state.origem_resultado = f"snapshot de {descrever_versao(versao_snapshot)}"
+    
     st.header("⚙️ Configurações")
     
-    limite_bdrs = st.slider(
-        "Limite de BDRs para analisar",
-        min_value=10,
-        max_value=500,
-        value=30,
-        step=10,
-        help="⚠️ IMPORTANTE: Devido ao rate limiting do Yahoo Finance, recomendamos começar com 30-50 BDRs"
+    modo_analise = st.radio("Escopo da análise", ["Limite de BDRs", "Tempo disponível"], horizontal=True)
+    if modo_analise == "Limite de BDRs":
+        limite_bdrs = st.slider(
+            "Limite de BDRs para analisar",
+            min_value=10,
+            max_value=500,
+            value=30,
+            step=10,
+            help="⚠️ IMPORTANTE: Devido ao rate limiting do Yahoo Finance, recomendamos começar com 30-50 BDRs"
+        )
+        prazo_analise = None
+    else:
+        limite_bdrs = None
+        prazo_analise = st.slider(
+            "Tempo disponível (minutos)",
+            min_value=1,
+            max_value=60,
+            value=10,
+            help="A análise busca as BDRs em ordem de prioridade e termina no prazo com as que couberem, "
+                 "começando pelas que já estão em cache"
+        ) * 60
+    prioridade = PRIORIDADE_POR_ROTULO[st.selectbox(
+        "Prioridade",
+        list(PRIORIDADE_POR_ROTULO),
+        help="Ordem em que as BDRs entram na análise (e quais ficam com o limite)"
+    )]
+    
+    taxa_maxima = st.slider(
+        "Taxa máxima (requisições por segundo)",
+        min_value=0.5,
+        max_value=10.0,
+        value=TAXA_MAXIMA,
+        step=0.5,
+        help="Teto para o controle automático de taxa, compartilhado entre todos os workers. A taxa sobe devagar enquanto não há erro 429 e cai pela metade a cada 429"
+    )
+    # O teto é aplicado quando a análise pedida começa, e não a cada reexecução de cada sessão
+    controlador = obter_controlador()
+    
+    n_workers = st.slider(
+        "Workers paralelos",
+        min_value=1,
+        max_value=16,
+        value=WORKERS_PADRAO,
+        help="Quantidade de BDRs buscadas ao mesmo tempo. A vazão total continua limitada pelas requisições por segundo"
     )
     
-    delay_entre_req = st.slider(
-        "Delay entre requisições (segundos)",
-        min_value=1.0,
-        max_value=5.0,
-        value=2.0,
-        step=0.5,
-        help="Aumentar o delay ajuda a evitar erro 429 (Too Many Requests)"
+    st.caption(f"⚡ Taxa atual: {controlador.taxa:.2f} req/s · 🚫 {controlador.erros_429} erros 429 nesta sessão do servidor")
+    # A caixa "Forçar atualização" fica mais abaixo: o valor vem do estado da sessão
+    st.warning(previsao_analise(
+        limite_bdrs, prazo_analise, prioridade, st.session_state.get('forcar_atualizacao', False)
+    ))
+    st.info("💡 Dica: Se der muitos erros 429, reduza a taxa máxima ou a quantidade de BDRs")
+    
+    st.subheader("💾 Cache")
+    forcar_atualizacao = st.checkbox(
+        "Forçar atualização",
+        value=False,
+        key="forcar_atualizacao",
+        help="Ignora o cache em disco e busca tudo novamente no Yahoo Finance"
+    )
+    stats_cache = obter_cache().estatisticas()
+    st.caption(
+        f"{stats_cache['tickers']} tickers em cache "
+        f"({stats_cache['tamanho_mb']:.1f} MB de {LIMITE_CACHE_MB} MB)"
     )
+    sem_dados = obter_cache().sem_dados()
+    if sem_dados:
+        st.caption(
+            f"🚫 {len(sem_dados)} tickers sem dados no Yahoo ignorados por {TTL_SEM_DADOS / 86400:.0f} dias "
+            f"({', '.join(sorted(sem_dados)[:5])}{'...' if len(sem_dados) > 5 else ''})"
+        )
+    if st.button("🗑️ Limpar cache", use_container_width=True):
+        obter_cache().limpar()
+        st.rerun()
+    
+    with st.expander("🎯 Critérios de pontuação", expanded=False):
+        st.caption("Alterar os critérios reclassifica os resultados na hora, sem buscar dados novamente")
+        criterios = {nivel: dict(valores) for nivel, valores in CRITERIOS.items()}
+        for chave, rotulo in ROTULOS_CRITERIOS.items():
+            col_exc, col_bom = st.columns(2)
+            for coluna, nivel, nome_nivel in ((col_exc, 'excelente', 'Excelente'), (col_bom, 'bom', 'Bom')):
+                criterios[nivel][chave] = coluna.number_input(
+                    f"{rotulo} · {nome_nivel}",
+                    value=float(CRITERIOS[nivel][chave]),
+                    step=1.0,
+                    key=f"criterio_{nivel}_{chave}"
+                )
+        criterios['atencao']['pe_max'] = st.number_input(
+            "P/E a partir do qual gera alerta",
+            value=float(CRITERIOS['atencao']['pe_max']),
+            step=1.0,
+            key="criterio_atencao_pe_max"
+        )
     
-    st.warning(f"⏱️ Tempo estimado: ~{int(limite_bdrs * delay_entre_req / 60)} minutos")
-    st.info("💡 Dica: Se der erro 429, aumente o delay ou reduza a quantidade de BDRs")
+    # Uma análise por vez no servidor: com outra em andamento, o botão passa a acompanhá-la
+    tarefa_ativa = obter_gerenciador().ativa()
+    if tarefa_ativa and st.session_state.get('tarefa_id') != tarefa_ativa.id:
+        progresso_ativa = tarefa_ativa.progresso()
+        st.caption(
+            f"🔄 Análise em andamento no servidor desde {tarefa_ativa.iniciada_em.strftime('%H:%M')} "
+            f"({tarefa_ativa.descrever()})"
+            + (f": {progresso_ativa['processadas']}/{progresso_ativa['total_bdrs']} BDRs" if progresso_ativa else "")
+        )
     
-    if st.button("🚀 Iniciar Análise", type="primary", use_container_width=True):
-        st.session_state.analisar = True
+    if st.button(
+        "🔗 Acompanhar análise em andamento" if tarefa_ativa else "🚀 Iniciar Análise",
+        type="primary", use_container_width=True,
+        disabled=tarefa_ativa is not None and st.session_state.get('tarefa_id') == tarefa_ativa.id
+    ):
+        if tarefa_ativa:
+            st.session_state.acompanhar = True
+        else:
+            st.session_state.analisar = True
+            st.session_state.execucao_id = None
+    
+    # Execução interrompida (aba recarregada, servidor reiniciado...) pode ser retomada
+    interrompida = None if tarefa_ativa else obter_checkpoints().interrompida_mais_recente()
+    if interrompida and not st.session_state.get('analisar'):
+        st.caption(
+            f"⏸️ Análise {interrompida['id']} interrompida: "
+            f"{interrompida['sucessos']}/{interrompida['tickers']} empresas concluídas, "
+            f"{interrompida['falhas']} falhas"
+        )
+        if st.button("▶️ Retomar análise", use_container_width=True):
+            st.session_state.analisar = True
+            st.session_state.execucao_id = interrompida['id']
 
-# Análise
-if 'analisar' in st.session_state and st.session_state.analisar:
-    
-    # Buscar BDRs
-    with st.spinner("🔍 Buscando lista de BDRs..."):
-        lista_bdrs = obter_todas_bdrs()
-    
-    if not lista_bdrs:
-        st.error("❌ Não foi possível obter a lista de BDRs")
-        st.stop()
-    
-    st.success(f"✅ {len(lista_bdrs)} BDRs encontradas!")
-    
-    # Limitar quantidade
-    lista_bdrs = lista_bdrs[:limite_bdrs]
-    
-    # Processar BDRs
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    stats_placeholder = st.empty()
-    
-    resultado = []
-    sucesso = 0
-    falhas = 0
-    erro_429_count = 0
-    
-    for idx, bdr_info in enumerate(lista_bdrs):
-        bdr = bdr_info['bdr']
-        ticker_us = bdr_info['ticker_us']
-        nome = bdr_info['nome']
-        
-        status_text.text(f"🔄 [{idx+1}/{len(lista_bdrs)}] {bdr} → {ticker_us}")
-        
-        try:
-            dados = calcular_indicadores_empresa_mae(ticker_us)
-            
-            if dados:
-                status, score, alertas = classificar_bdr(dados)
-                tamanho = classificar_tamanho(dados['market_cap'])
-                
-                resultado.append({
-                    'BDR': bdr,
-                    'Ticker US': ticker_us,
-                    'Empresa': nome.split()[0] if nome else ticker_us,
-                    'Setor': dados['setor'],
-                    'Tamanho': tamanho,
-                    'Status': status,
-                    'Score': round(score, 1),
-                    'ROE (%)': round(dados['roe'], 2),
-                    'Margem (%)': round(dados['margem'], 2),
-                    'Cresc (%)': round(dados['crescimento'], 2),
-                    'Dívida/PL (%)': round(dados['dividapl'], 2),
-                    'P/E': round(dados['pe'], 2) if dados['pe'] else np.nan,
-                    'P/B': round(dados['pb'], 2) if dados['pb'] else np.nan,
-                    'Div Yield (%)': round(dados['dividend_yield'], 2),
-                    'Market Cap (B)': round(dados['market_cap'], 2),
-                    'Alertas': ', '.join(alertas) if alertas else 'OK'
-                })
-                sucesso += 1
-            else:
-                falhas += 1
-        except Exception as e:
-            if "429" in str(e):
-                erro_429_count += 1
-                st.warning(f"⚠️ Rate limit atingido! Aguardando 10 segundos...")
-                time.sleep(10)
-            falhas += 1
-        
-        progress_bar.progress((idx + 1) / len(lista_bdrs))
-        
-        # Mostrar stats parciais a cada 5 BDRs
-        if (idx + 1) % 5 == 0:
-            stats_placeholder.markdown(f"""
-            **Progresso**: {idx+1}/{len(lista_bdrs)}
-            - ✅ Sucesso: {sucesso}
-            - ⚠️ Falhas: {falhas}
-            - 🚫 Erros 429: {erro_429_count}
-            """)
-        
-        # Delay configurável entre requisições
-        time.sleep(delay_entre_req)
-    
-    progress_bar.empty()
-    status_text.empty()
-    stats_placeholder.empty()
-    
-    if not resultado:
+# Sem resultado na sessão, o último snapshot é exibido na hora, sem buscar nada na rede
+if snapshot and 'df_resultado' not in st.session_state:
+    st.session_state.df_resultado = ler_snapshot(caminho_snapshot)
+    st.session_state.origem_resultado = f"snapshot de {descrever_versao(versao_snapshot)}"
+
+# Análise: pedida ao gerenciador do servidor, que roda uma única análise por vez em segundo plano.
+# Pedidos iguais de outras sessões durante a análise se juntam a ela, e todas leem o mesmo progresso
+if st.session_state.get('analisar'):
+    st.session_state.analisar = False
+    try:
+        tarefa, nova = obter_gerenciador().solicitar(
+            limite_bdrs, n_workers, forcar_atualizacao, st.session_state.get('execucao_id'), prazo_analise,
+            prioridade, taxa_maxima
+        )
+        st.session_state.tarefa_id = tarefa.id
+        st.session_state.execucao_id = None
+        if not nova:
+            st.info("🔗 Já havia uma análise igual em andamento no servidor: acompanhando-a, sem buscar os dados de novo")
+    except AnaliseEmAndamento as e:
+        st.warning(f"⚠️ {e}: aguarde ela terminar para iniciar a sua, ou acompanhe-a pela barra lateral")
+elif st.session_state.get('acompanhar'):
+    tarefa = obter_gerenciador().acompanhar()
+    if tarefa is not None:
+        st.session_state.tarefa_id = tarefa.id
+    st.session_state.acompanhar = False
+
+tarefa = obter_gerenciador().obter(st.session_state['tarefa_id']) if 'tarefa_id' in st.session_state else None
+acompanhando = tarefa is not None and tarefa.ativa
+
+if acompanhando:
+    # Mostrado aqui e atualizado no fim do script, depois que o resto da página já foi desenhado
+    painel_progresso = st.empty()
+    with painel_progresso.container():
+        mostrar_progresso(tarefa)
+elif tarefa is not None:
+    # Análise terminada: o resultado é entregue a esta sessão uma única vez
+    del st.session_state['tarefa_id']
+    if tarefa.estado == 'falhou':
+        st.error(f"❌ {tarefa.erro}")
+    elif tarefa.resultado.empty:
         st.error("❌ Nenhuma BDR com dados suficientes encontrada")
         st.info("""
         **Possíveis causas:**
@@ -466,30 +472,31 @@ if 'analisar' in st.session_state and st.session_state.analisar:
         - Dados não disponíveis
         
         **Soluções:**
-        - Aumente o delay entre requisições
+        - Reduza a taxa máxima de requisições
         - Reduza a quantidade de BDRs
         - Tente novamente mais tarde
         """)
-        st.session_state.analisar = False
-        st.stop()
-    
-    # Criar DataFrame
-    df = pd.DataFrame(resultado)
-    df = df.sort_values(
-        by=['Score', 'ROE (%)', 'Div Yield (%)'],
-        ascending=[False, False, False]
-    ).reset_index(drop=True)
-    
-    st.session_state.df_resultado = df
-    st.session_state.analisar = False
-    st.rerun()
+    else:
+        if tarefa.aviso:
+            st.warning(f"⚠️ {tarefa.aviso}")
+        fora_do_prazo = tarefa.progresso().get('fora_do_prazo')
+        if fora_do_prazo:
+            st.info(f"⏳ Prazo atingido: {fora_do_prazo} empresas-mãe menos prioritárias ficaram de fora desta análise")
+        st.session_state.df_resultado = tarefa.resultado
+        st.session_state.origem_resultado = (
+            f"análise ao vivo de {tarefa.terminada_em.strftime('%d/%m/%Y %H:%M')}"
+        )
 
 # Exibir resultados
 if 'df_resultado' in st.session_state:
-    df = st.session_state.df_resultado
+    # Reclassifica com os critérios atuais da barra lateral, sem buscar dados novamente
+    resultado = resultado_ranqueado(st.session_state.df_resultado, criterios)
+    df = resultado['df']
     
     # Estatísticas
     st.header("📈 Estatísticas Gerais")
+    if 'origem_resultado' in st.session_state:
+        st.caption(f"Fonte: {st.session_state.origem_resultado}")
     
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -509,145 +516,133 @@ if 'df_resultado' in st.session_state:
         st.metric("🔴 Fraco", fracos)
     
     # Gráficos
+    inicio_graficos = time.perf_counter()
     st.header("📊 Visualizações")
     
+    figuras = figuras_resultado(resultado['assinatura'], df)
     col1, col2 = st.columns(2)
     
     with col1:
-        # Pizza - Status
-        fig_pizza = px.pie(
-            df, 
-            names='Status', 
-            title='Distribuição por Status',
-            color='Status',
-            color_discrete_map={
-                '🟢 Excelente': '#10b981',
-                '🟡 Bom': '#f59e0b',
-                '🟠 Atenção': '#f97316',
-                '🔴 Fraco': '#ef4444'
-            }
-        )
-        st.plotly_chart(fig_pizza, use_container_width=True)
+        st.plotly_chart(figuras['status'], use_container_width=True)
     
     with col2:
-        # Pizza - Tamanho
-        fig_tamanho = px.pie(
-            df,
-            names='Tamanho',
-            title='Distribuição por Tamanho',
-            color='Tamanho',
-            color_discrete_map={
-                'Mega Cap': '#8b5cf6',
-                'Large Cap': '#3b82f6',
-                'Mid Cap': '#10b981',
-                'Small Cap': '#f59e0b'
-            }
-        )
-        st.plotly_chart(fig_tamanho, use_container_width=True)
+        st.plotly_chart(figuras['tamanho'], use_container_width=True)
     
     # Top ROE
     st.subheader("🏆 Top 15 BDRs por ROE")
-    top_roe = df.nlargest(15, 'ROE (%)')
-    fig_roe = px.bar(
-        top_roe,
-        x='ROE (%)',
-        y='BDR',
-        orientation='h',
-        title='Top 15 por ROE',
-        color='ROE (%)',
-        color_continuous_scale='Greens'
-    )
-    st.plotly_chart(fig_roe, use_container_width=True)
+    st.plotly_chart(figuras['top_roe'], use_container_width=True)
     
     # Setores
     st.subheader("🏢 Distribuição por Setor")
-    setor_count = df['Setor'].value_counts().head(10)
-    fig_setor = px.bar(
-        x=setor_count.values,
-        y=setor_count.index,
-        orientation='h',
-        title='Top 10 Setores',
-        labels={'x': 'Quantidade', 'y': 'Setor'}
-    )
-    st.plotly_chart(fig_setor, use_container_width=True)
-    
-    # Filtros
-    st.header("🔍 Filtros e Tabela")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        filtro_status = st.multiselect(
-            "Status",
-            options=df['Status'].unique(),
-            default=df['Status'].unique()
+    st.plotly_chart(figuras['setores'], use_container_width=True)
+    obter_metricas().registrar_duracao('graficos', time.perf_counter() - inicio_graficos)
+    
+    # Filtros e tabela (fragmento)
+    mostrar_tabela(df, resultado['indice'], resultado['exportacoes'])
+    
+    # Histórico dos snapshots
+    if snapshot:
+        st.header("🕰️ Histórico")
+        indicadores_historico = ['Score', 'ROE (%)', 'Margem (%)', 'Cresc (%)', 'Dívida/PL (%)',
+                                 'P/E', 'P/B', 'Div Yield (%)']
+        aba_evolucao, aba_variacoes, aba_exportar = st.tabs(
+            ["📈 Evolução por BDR", "🔀 Maiores variações", "📦 Exportar histórico"]
         )
-    
-    with col2:
-        filtro_setor = st.multiselect(
-            "Setor",
-            options=sorted(df['Setor'].unique()),
-            default=sorted(df['Setor'].unique())
-        )
-    
-    with col3:
-        filtro_tamanho = st.multiselect(
-            "Tamanho",
-            options=df['Tamanho'].unique(),
-            default=df['Tamanho'].unique()
-        )
-    
-    with col4:
-        busca = st.text_input("🔎 Buscar BDR/Ticker/Empresa")
-    
-    # Aplicar filtros
-    df_filtrado = df[
-        (df['Status'].isin(filtro_status)) &
-        (df['Setor'].isin(filtro_setor)) &
-        (df['Tamanho'].isin(filtro_tamanho))
-    ]
-    
-    if busca:
-        df_filtrado = df_filtrado[
-            df_filtrado['BDR'].str.contains(busca, case=False) |
-            df_filtrado['Ticker US'].str.contains(busca, case=False) |
-            df_filtrado['Empresa'].str.contains(busca, case=False)
-        ]
-    
-    st.info(f"📊 Mostrando {len(df_filtrado)} de {len(df)} BDRs")
-    
-    # Tabela
-    st.dataframe(
-        df_filtrado,
-        use_container_width=True,
-        height=600,
-        column_config={
-            "Score": st.column_config.ProgressColumn(
-                "Score",
-                format="%.1f",
-                min_value=0,
-                max_value=6,
-            ),
-            "ROE (%)": st.column_config.NumberColumn(
-                "ROE (%)",
-                format="%.2f%%",
-            ),
-            "Market Cap (B)": st.column_config.NumberColumn(
-                "Market Cap (B)",
-                format="$%.2fB",
-            ),
-        }
-    )
-    
-    # Download
-    csv = df_filtrado.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label="📥 Download CSV",
-        data=csv,
-        file_name=f"bdrs_analise_{datetime.now().strftime('%Y%m%d')}.csv",
-        mime="text/csv",
-        use_container_width=True
-    )
+        
+        with aba_evolucao:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                # Só a escolha feita pelo usuário conta como visualização, não a BDR inicial
+                bdr_historico = st.selectbox(
+                    "BDR", sorted(df['BDR']), key="bdr_historico",
+                    on_change=lambda: registrar_visualizacoes(
+                        df.loc[df['BDR'] == st.session_state.bdr_historico, 'Ticker US'].astype(str)
+                    )
+                )
+            with col2:
+                colunas_historico = st.multiselect(
+                    "Indicadores", indicadores_historico, default=['Score', 'ROE (%)', 'P/E']
+                )
+            with col3:
+                desde_evolucao = st.date_input(
+                    "Desde", value=date.today() - timedelta(days=365), key="desde_evolucao"
+                )
+            
+            if bdr_historico and colunas_historico:
+                serie = historico_bdr(bdr_historico, tuple(colunas_historico), desde_evolucao, versao_historico)
+                if serie.empty:
+                    st.info(f"Nenhum snapshot de {bdr_historico} desde {desde_evolucao.strftime('%d/%m/%Y')}")
+                else:
+                    serie = serie.set_index('data')
+                    for coluna, grafico in zip(colunas_historico, st.columns(len(colunas_historico))):
+                        with grafico:
+                            st.caption(coluna)
+                            st.line_chart(serie[coluna], height=220)
+        
+        with aba_variacoes:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                desde_variacoes = st.date_input(
+                    "Desde", value=date.today() - timedelta(days=30), key="desde_variacoes"
+                )
+            with col2:
+                coluna_variacoes = st.selectbox("Indicador", indicadores_historico)
+            with col3:
+                n_variacoes = st.number_input("Quantidade", min_value=5, max_value=100, value=20, step=5)
+            
+            variacoes, dia_inicio, dia_fim = variacoes_desde(
+                desde_variacoes, coluna_variacoes, n_variacoes, versao_historico
+            )
+            if variacoes.empty:
+                st.info("São necessários snapshots de pelo menos dois dias diferentes para comparar")
+            else:
+                st.caption(f"{coluna_variacoes}: de {dia_inicio.strftime('%d/%m/%Y')} a {dia_fim.strftime('%d/%m/%Y')}")
+                st.dataframe(
+                    variacoes,
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "Variação": st.column_config.NumberColumn("Variação", format="%+.2f"),
+                    }
+                )
+        
+        with aba_exportar:
+            st.caption("Todas as colunas, com a linha mais recente de cada BDR por dia, gravadas dia a dia em disco")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                desde_exportacao = st.date_input(
+                    "Desde", value=date.today() - timedelta(days=365), key="desde_exportacao"
+                )
+            with col2:
+                formato_historico = FORMATO_POR_ROTULO[
+                    st.selectbox("Formato", list(FORMATO_POR_ROTULO), key="formato_historico")
+                ]
+            with col3:
+                st.write("")
+                gerar_historico = st.button("📦 Gerar arquivo", key="gerar_historico", use_container_width=True)
+            
+            if gerar_historico:
+                try:
+                    with st.spinner("Exportando histórico..."):
+                        st.session_state.exportacao_historico = historico_em_cache(
+                            os.path.join(DIRETORIO_CACHE, 'exportacoes'),
+                            formato_historico, versao_historico, desde_exportacao
+                        )
+                except ValueError as e:
+                    st.warning(f"⚠️ {e}")
+            
+            caminho_exportacao = st.session_state.get('exportacao_historico')
+            if caminho_exportacao and os.path.exists(caminho_exportacao):
+                formato_arquivo = formato_por_extensao(caminho_exportacao)
+                with open(caminho_exportacao, 'rb') as arquivo_historico:
+                    st.download_button(
+                        label=f"📥 {os.path.basename(caminho_exportacao)} "
+                              f"({os.path.getsize(caminho_exportacao) / 1024 / 1024:.1f} MB)",
+                        data=arquivo_historico,
+                        file_name=os.path.basename(caminho_exportacao),
+                        mime=FORMATOS_EXPORTACAO[formato_arquivo]['mime'],
+                        use_container_width=True
+                    )
     
     # Legenda
     with st.expander("📖 Legenda e Critérios", expanded=False):
@@ -717,7 +712,7 @@ else:
     
     ### 🚀 Como usar:
     
-    1. Ajuste o limite de BDRs na barra lateral
+    1. Escolha um limite de BDRs ou o tempo disponível na barra lateral
     2. Clique em "Iniciar Análise"
     3. Aguarde o processamento (pode levar alguns minutos)
     4. Explore os resultados com filtros e gráficos
@@ -728,3 +723,78 @@ else:
     **⚠️ Importante**: Esta análise é apenas informativa e não constitui 
     recomendação de investimento. Sempre faça sua própria pesquisa!
     """)
+
+# Diagnóstico da execução atual, no fim do script para incluir os gráficos e a tabela desta reexecução
+with st.sidebar:
+    with st.expander("🩺 Diagnóstico", expanded=False):
+        metricas = obter_metricas()
+        etapas = metricas.resumo_etapas()
+        if etapas:
+            st.dataframe(
+                pd.DataFrame(etapas),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    coluna: st.column_config.NumberColumn(coluna, format="%.3f")
+                    for coluna in ('total_s', 'p50_s', 'p95_s', 'max_s')
+                }
+            )
+        else:
+            st.caption("Nenhuma etapa registrada ainda")
+        
+        st.caption(
+            f"💾 Cache: {metricas.total('cache_acertos')} acertos, {metricas.total('cache_faltas')} faltas · "
+            f"🔁 {metricas.total('retentativas')} retentativas · "
+            f"📥 {metricas.total('bytes_baixados') / 1024 / 1024:.2f} MB baixados"
+        )
+        requisicoes_http = metricas.total('requisicoes_http')
+        if requisicoes_http:
+            conexoes_abertas = metricas.total('conexoes_abertas')
+            st.caption(
+                f"🔌 HTTP: {requisicoes_http} requisições em {conexoes_abertas} conexões "
+                f"({max(requisicoes_http - conexoes_abertas, 0) / requisicoes_http:.0%} reaproveitadas)"
+            )
+        aquecedor = obter_aquecedor()
+        if aquecedor.ativo:
+            ciclo = aquecedor.ultimo_ciclo
+            st.caption(
+                f"🔥 Aquecimento do cache: {aquecedor.orcamento.gastas()}/{aquecedor.orcamento.por_hora} "
+                f"requisições na última hora"
+                + (f" · {ciclo['em'].strftime('%H:%M')}: {ciclo.get('renovados', 0)} tickers renovados, "
+                   f"{ciclo.get('pendentes', 0)} pendentes" if ciclo else "")
+                + (f" (pausado: {ciclo['motivo']})" if ciclo and ciclo['motivo'] else "")
+            )
+        if 'df_resultado' in st.session_state:
+            memoria = relatorio_memoria(st.session_state.df_resultado).sum(numeric_only=True)
+            st.caption(
+                f"🧠 Resultado em memória: {memoria['bytes'] / 1024:.0f} KB "
+                f"({memoria['bytes_sem_compactar'] / 1024:.0f} KB sem compactar)"
+            )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "JSON",
+                data=metricas.para_json(),
+                file_name=f"metricas_{metricas.iniciada_em.strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json",
+                use_container_width=True
+            )
+        with col2:
+            st.download_button(
+                "Prometheus",
+                data=metricas.para_prometheus(),
+                file_name=f"metricas_{metricas.iniciada_em.strftime('%Y%m%d_%H%M%S')}.prom",
+                mime="text/plain",
+                use_container_width=True
+            )
+
+# Enquanto a análise roda no servidor, o progresso é redesenhado no mesmo lugar; ao terminar, uma
+# única reexecução entrega o resultado (reexecutar a cada atualização empilharia uma chamada por vez
+# no ScriptRunner). Mexer em qualquer widget interrompe só esta espera, não a análise
+if acompanhando:
+    while tarefa.ativa:
+        time.sleep(INTERVALO_ACOMPANHAMENTO)
+        with painel_progresso.container():
+            mostrar_progresso(tarefa)
+    st.rerun()
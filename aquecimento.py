@@ -0,0 +1,271 @@
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from dados import (
+    ENDPOINTS_DEMONSTRATIVOS, ENDPOINTS_TTL, FRAGMENTOS, TAMANHO_LOTE_COTACOES, BuscaIncompleta,
+    buscar_cotacoes_em_lote, buscar_dados_empresa_mae, obter_cache, obter_checkpoints, obter_controlador,
+    obter_universo_indice
+)
+
+# Aquecimento do cache: uma thread de fundo renova os dados do universo de BDRs antes de vencerem,
+# das empresas maiores e mais vistas primeiro, dentro de um orçamento de requisições por hora. Pausa na
+# janela antes da abertura do pregão e durante análises, quando a capacidade é do uso interativo
+ORCAMENTO_HORA = int(os.environ.get('BDR_AQUECIMENTO_REQ_HORA', 300))  # 0 desliga o aquecimento
+JANELA_PAUSA = os.environ.get('BDR_AQUECIMENTO_PAUSA', '08:30-10:30')  # Horário de Brasília; vazio = sem pausa
+FUSO_HORARIO = ZoneInfo('America/Sao_Paulo')
+INTERVALO_CICLO = 300  # Segundos entre ciclos; cada ciclo gasta ~1/12 do orçamento da hora
+MARGEM_RENOVACAO = 0.1  # Renova quando resta menos de 10% do TTL (ex: 2,4 h de uma cotação de 1 dia)
+PESO_VISUALIZACOES = 2.0  # Peso de log(1 + visualizações) contra log10(1 + market cap em US$ bi)
+ESPERA_NOVA_TENTATIVA = 6 * 3600
+
+def ler_janela(texto):
+    """'HH:MM-HH:MM' → (início, fim) em minutos do dia, ou None se vazio. A janela pode virar a meia-noite"""
+    if not texto or not texto.strip():
+        return None
+    try:
+        inicio, fim = (
+            int(h) * 60 + int(m)
+            for h, m in (parte.strip().split(':') for parte in texto.split('-'))
+        )
+    except ValueError:
+        raise ValueError(f"Janela inválida: {texto!r} (use HH:MM-HH:MM)")
+    return inicio, fim
+
+def na_janela(janela, instante=None):
+    if janela is None:
+        return False
+    agora = datetime.fromtimestamp(time.time() if instante is None else instante, FUSO_HORARIO)
+    minuto = agora.hour * 60 + agora.minute
+    inicio, fim = janela
+    return inicio <= minuto < fim if inicio <= fim else minuto >= inicio or minuto < fim
+
+class OrcamentoRequisicoes:
+    """Requisições gastas na última hora (janela deslizante) contra um teto por hora"""
+
+    def __init__(self, por_hora=ORCAMENTO_HORA):
+        self.por_hora = por_hora
+        self._gastos = deque()
+        self._lock = threading.Lock()
+
+    def _descartar_antigos(self, agora):
+        while self._gastos and agora - self._gastos[0][0] >= 3600:
+            self._gastos.popleft()
+
+    def gastas(self):
+        with self._lock:
+            self._descartar_antigos(time.monotonic())
+            return sum(n for _, n in self._gastos)
+
+    def disponivel(self):
+        return max(self.por_hora - self.gastas(), 0)
+
+    def consumir(self, n):
+        if n:
+            with self._lock:
+                self._gastos.append((time.monotonic(), n))
+
+class ControladorContado:
+    """O controlador de taxa compartilhado, contando só as requisições feitas através deste objeto
+    (as das análises e de outras threads não entram na conta)"""
+
+    def __init__(self, controlador):
+        self._controlador = controlador
+        self.requisicoes = 0
+
+    def adquirir(self):
+        self.requisicoes += 1
+        self._controlador.adquirir()
+
+    def __getattr__(self, nome):
+        return getattr(self._controlador, nome)
+
+class AquecedorCache:
+    """Renova em segundo plano as entradas do cache (cotação, info e demonstrativos) prestes a vencer"""
+
+    def __init__(self, orcamento_hora=ORCAMENTO_HORA, janela_pausa=JANELA_PAUSA, intervalo=INTERVALO_CICLO,
+                 cache=None):
+        self.orcamento = OrcamentoRequisicoes(orcamento_hora)
+        self.janela_pausa = ler_janela(janela_pausa)
+        self.intervalo = intervalo
+        self.cache = cache or obter_cache()
+        self.ultimo_ciclo = None  # Resumo do último ciclo, para o diagnóstico
+        self._tentativas = {}  # ticker → instante (monotônico) da última renovação individual
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        """Inicia a thread (uma vez por processo; chamadas repetidas não fazem nada)"""
+        with self._lock:
+            if self.ativo or self.orcamento.por_hora <= 0:
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._laco, name='aquecimento-cache', daemon=True)
+            self._thread.start()
+
+    def parar(self, timeout=None):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _laco(self):
+        # O primeiro ciclo espera um intervalo: a abertura do app e a primeira análise vêm antes
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.ultimo_ciclo = self.executar_ciclo()
+            except Exception as e:
+                self.ultimo_ciclo = {'em': datetime.now(), 'motivo': f"erro: {e}"}
+
+    def motivo_pausa(self, instante=None):
+        """Por que o aquecimento não deve gastar requisições agora, ou None"""
+        if na_janela(self.janela_pausa, instante):
+            return "janela de uso interativo"
+        # Pelo checkpoint em disco, uma análise do app vale também para o aquecimento rodando em outro processo
+        if obter_checkpoints().em_andamento() is not None:
+            return "análise em andamento"
+        return None
+
+    def planejar(self, agora=None):
+        """Tickers do universo com algum endpoint vencido ou prestes a vencer, do mais prioritário
+        ao menos: log10(1 + market cap em US$ bi) + PESO_VISUALIZACOES × log(1 + visualizações)"""
+        agora = time.time() if agora is None else agora
+        tickers = sorted({b['ticker_us'] for b in obter_universo_indice().listar()})
+        vencimentos = self.cache.vencimentos()
+        sem_dados = self.cache.sem_dados()
+        visualizacoes = self.cache.visualizacoes()
+        cotacoes = self.cache.valores('cotacao')
+
+        plano = []
+        for ticker in tickers:
+            if ticker in sem_dados:
+                continue
+            # Entradas ausentes contam como vencidas (vencimento 0): o aquecimento também preenche o cache.
+            # Demonstrativos vencem quando um novo período é provável, e antes disso não há o que renovar
+            devidos = [
+                endpoint for endpoint, ttl in ENDPOINTS_TTL.items()
+                if vencimentos.get((ticker, endpoint), 0) - agora
+                < (0 if endpoint in ENDPOINTS_DEMONSTRATIVOS else ttl * MARGEM_RENOVACAO)
+            ]
+            if not devidos:
+                continue
+            market_cap = (cotacoes.get(ticker) or {}).get('marketCap') or 0
+            plano.append({
+                'ticker': ticker,
+                'endpoints': devidos,
+                'prioridade': math.log10(1 + market_cap / 1e9)
+                              + PESO_VISUALIZACOES * math.log1p(visualizacoes.get(ticker, 0)),
+                'vence_em': min(vencimentos.get((ticker, e), 0) for e in devidos),
+            })
+        # Prioridade igual: o que vence antes primeiro
+        plano.sort(key=lambda item: (-item['prioridade'], item['vence_em']))
+        return plano
+
+    def executar_ciclo(self, agora=None):
+        """Renova o que couber na cota deste ciclo e retorna um resumo"""
+        resumo = {'em': datetime.now(), 'motivo': self.motivo_pausa(agora), 'requisicoes': 0,
+                  'renovados': 0, 'pendentes': 0}
+        if resumo['motivo']:
+            return resumo
+
+        # Cota do ciclo: a fatia do orçamento da hora que cabe em um intervalo, sem passar do que resta na hora
+        cota = min(self.orcamento.disponivel(), math.ceil(self.orcamento.por_hora * self.intervalo / 3600))
+        plano = self.planejar(agora)
+        # O orçamento é cobrado pelas requisições do próprio aquecimento, com retentativas e 429
+        controlador = ControladorContado(obter_controlador())
+        individuais = set()
+
+        # Cotações primeiro: uma requisição renova até TAMANHO_LOTE_COTACOES tickers
+        cotacoes = [item['ticker'] for item in plano if 'cotacao' in item['endpoints']]
+        cotacoes = cotacoes[:cota * TAMANHO_LOTE_COTACOES]
+        if cotacoes:
+            antes = controlador.requisicoes
+            buscar_cotacoes_em_lote(cotacoes, forcar_atualizacao=True, cache=self.cache, controlador=controlador)
+            feitas = controlador.requisicoes - antes
+            self.orcamento.consumir(feitas)
+            cota -= feitas
+            resumo['requisicoes'] += feitas
+
+        for item in plano:
+            renovar = [e for e in item['endpoints'] if e in FRAGMENTOS]
+            # Respostas que não vão para o cache (vazias, com erro) deixariam o ticker no topo do plano
+            # para sempre: cada ticker é tentado no máximo uma vez a cada ESPERA_NOVA_TENTATIVA
+            tentado_ha = time.monotonic() - self._tentativas.get(item['ticker'], -math.inf)
+            if not renovar or tentado_ha < ESPERA_NOVA_TENTATIVA:
+                continue
+            if len(renovar) > cota or self._parar.is_set():
+                break
+            # Uma análise pode ter começado no meio do ciclo: a capacidade volta para ela
+            resumo['motivo'] = self.motivo_pausa()
+            if resumo['motivo']:
+                break
+            self._tentativas[item['ticker']] = time.monotonic()
+            antes = controlador.requisicoes
+            try:
+                buscar_dados_empresa_mae(item['ticker'], cache=self.cache, controlador=controlador, renovar=renovar)
+            except BuscaIncompleta:
+                pass  # O que veio já está no cache; o resto fica para depois de ESPERA_NOVA_TENTATIVA
+            feitas = controlador.requisicoes - antes
+            self.orcamento.consumir(feitas)
+            cota -= feitas
+            resumo['requisicoes'] += feitas
+            individuais.add(item['ticker'])
+
+        # Renovado: todos os endpoints devidos do ticker foram buscados neste ciclo
+        cotacoes = set(cotacoes)
+        resumo['renovados'] = sum(
+            ('cotacao' not in item['endpoints'] or item['ticker'] in cotacoes)
+            and (set(item['endpoints']) <= {'cotacao'} or item['ticker'] in individuais)
+            for item in plano
+        )
+        resumo['pendentes'] = len(plano) - resumo['renovados']
+        return resumo
+
+@lru_cache(maxsize=None)
+def obter_aquecedor():
+    return AquecedorCache()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Renova o cache de fundamentos das BDRs antes de vencer, das maiores e mais vistas primeiro"
+    )
+    parser.add_argument('--plano', action='store_true',
+                        help="Só mostra o que seria renovado, em ordem de prioridade, sem acessar a rede")
+    parser.add_argument('--orcamento', type=int, default=ORCAMENTO_HORA,
+                        help=f"Requisições por hora (padrão: {ORCAMENTO_HORA}, ou BDR_AQUECIMENTO_REQ_HORA)")
+    parser.add_argument('--continuo', action='store_true',
+                        help=f"Roda um ciclo a cada {INTERVALO_CICLO}s até ser interrompido (padrão: um ciclo)")
+    args = parser.parse_args(argv)
+
+    aquecedor = AquecedorCache(orcamento_hora=args.orcamento)
+    if args.plano:
+        plano = aquecedor.planejar()
+        for item in plano[:50]:
+            print(f"{item['ticker']:<8} prioridade {item['prioridade']:5.2f}  {', '.join(item['endpoints'])}")
+        print(f"{len(plano)} tickers a renovar")
+        return 0
+
+    while True:
+        resumo = aquecedor.executar_ciclo()
+        print(
+            f"{resumo['em']:%H:%M:%S} {resumo['requisicoes']} requisições, {resumo['renovados']} tickers renovados, "
+            f"{resumo['pendentes']} pendentes" + (f" (pausado: {resumo['motivo']})" if resumo['motivo'] else ""),
+            flush=True
+        )
+        if not args.continuo:
+            return 0
+        time.sleep(aquecedor.intervalo)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from dados import (
+    FRAGMENTOS, TAMANHO_LOTE_COTACOES, WORKERS_PADRAO,
+    buscar_cotacoes_em_lote, calcular_indicadores_lote, eh_erro_429, montar_resultado, obter_cache,
+    obter_checkpoints, obter_controlador, obter_universo, planejar_busca, processar_em_paralelo
+)
+from metricas import iniciar_metricas
+from pontuacao import ranquear_bdrs
+from snapshots import salvar_snapshot
+
+# Atualização do universo de BDRs: o fluxo completo de uma análise (usado pelo app e pelo batch.py)
+# e o gerenciador que roda no máximo uma análise por vez no servidor, compartilhada entre as sessões
+TAREFAS_GUARDADAS = 8  # Tarefas concluídas mantidas para as sessões que as acompanham
+PRIORIDADES = {
+    'market_cap': "Maior market cap",
+    'desatualizadas': "Dados mais antigos",
+    'mais_vistas': "Mais vistas no app",
+}
+MINIMO_MEDICAO = 5.0  # Segundos de busca antes de a vazão medida na análise substituir a estimativa
+
+def custos_empresas(tickers, cache=None, forcar_atualizacao=False, agora=None):
+    """{ticker_us: requisições individuais que a análise faria}: fragmentos ausentes ou vencidos no
+    cache (demonstrativos pelo calendário). 0 = tudo em cache ou ticker no cache negativo"""
+    if forcar_atualizacao:
+        return dict.fromkeys(tickers, len(FRAGMENTOS))
+    cache = cache or obter_cache()
+    agora = time.time() if agora is None else agora
+    vencimentos = cache.vencimentos(FRAGMENTOS)
+    sem_dados = cache.sem_dados()
+    return {
+        t: 0 if t in sem_dados else sum(vencimentos.get((t, e), 0) <= agora for e in FRAGMENTOS)
+        for t in tickers
+    }
+
+def priorizar_bdrs(lista_bdrs, prioridade='market_cap', cache=None, agora=None):
+    """BDRs da mais para a menos prioritária: maior market cap (da cotação em cache), dados em cache
+    mais antigos (ausentes primeiro) ou mais vistas no app. Empates mantêm a ordem da BRAPI"""
+    if prioridade not in PRIORIDADES:
+        raise ValueError(f"Prioridade desconhecida: {prioridade} (use uma de {', '.join(PRIORIDADES)})")
+    cache = cache or obter_cache()
+    if prioridade == 'market_cap':
+        cotacoes = cache.valores('cotacao')
+        chave = {t: -((cotacoes.get(t) or {}).get('marketCap') or 0) for t in {b['ticker_us'] for b in lista_bdrs}}
+    elif prioridade == 'mais_vistas':
+        visualizacoes = cache.visualizacoes()
+        chave = {t: -visualizacoes.get(t, 0) for t in {b['ticker_us'] for b in lista_bdrs}}
+    else:
+        vencimentos = cache.vencimentos(FRAGMENTOS)
+        chave = {
+            t: min(vencimentos.get((t, e), 0) for e in FRAGMENTOS)
+            for t in {b['ticker_us'] for b in lista_bdrs}
+        }
+    return sorted(lista_bdrs, key=lambda b: chave[b['ticker_us']])
+
+class EstimadorVazao:
+    """Vazão efetiva das buscas individuais, em requisições concluídas com sucesso por segundo de relógio
+    (com esperas do limite de taxa, 429 e retentativas), em média móvel entre as análises do processo"""
+
+    def __init__(self, peso_novo=0.5):
+        self.peso_novo = peso_novo
+        self.vazao = None
+        self._lock = threading.Lock()
+
+    def registrar(self, requisicoes, segundos):
+        if requisicoes <= 0 or segundos < MINIMO_MEDICAO:
+            return
+        with self._lock:
+            medida = requisicoes / segundos
+            self.vazao = medida if self.vazao is None else self.peso_novo * medida + (1 - self.peso_novo) * self.vazao
+
+    def estimar(self):
+        """Vazão medida nas análises anteriores ou, sem medição, a taxa atual do controlador"""
+        return self.vazao or obter_controlador().taxa
+
+@lru_cache(maxsize=None)
+def obter_estimador():
+    return EstimadorVazao()
+
+def prever_analise(lista_bdrs, forcar_atualizacao=False, vazao=None, cache=None):
+    """Requisições e segundos previstos para analisar as BDRs, na vazão dada (padrão: a estimada)"""
+    custos = custos_empresas({b['ticker_us'] for b in lista_bdrs}, cache, forcar_atualizacao)
+    requisicoes = sum(custos.values()) + math.ceil(len(custos) / TAMANHO_LOTE_COTACOES)
+    return {
+        'empresas': len(custos),
+        'requisicoes': requisicoes,
+        'segundos': requisicoes / (vazao or obter_estimador().estimar()),
+    }
+
+def prever_cobertura(lista_bdrs, prazo, forcar_atualizacao=False, vazao=None, cache=None):
+    """Quantas das BDRs (já em ordem de prioridade) uma análise com prazo segundos deve cobrir.
+    Empresas inteiras em cache não custam requisições e entram primeiro"""
+    vazao = vazao or obter_estimador().estimar()
+    plano = planejar_busca(lista_bdrs)
+    custos = custos_empresas(plano, cache, forcar_atualizacao)
+    restante = prazo * vazao - math.ceil(len(plano) / TAMANHO_LOTE_COTACOES)
+    cobertas = sum(len(plano[t]) for t in plano if custos[t] == 0)
+    for ticker_us in (t for t in plano if custos[t] > 0):
+        restante -= custos[ticker_us]
+        if restante < 0:
+            break
+        cobertas += len(plano[ticker_us])
+    return cobertas
+
+def executar_analise(limite=None, n_workers=WORKERS_PADRAO, forcar_atualizacao=False, execucao_id=None,
+                     ao_progredir=None, prazo=None, prioridade='market_cap'):
+    """Analisa as BDRs em ordem de prioridade (ou retoma execucao_id) e retorna o DataFrame ranqueado.
+    Com prazo (segundos), termina no tempo com as que couberem. ao_progredir(evento, progresso) a cada etapa"""
+    ao_progredir = ao_progredir or (lambda evento, progresso: None)
+    inicio = time.monotonic()
+    prazo_final = inicio + prazo if prazo else None
+    controlador = obter_controlador()
+    checkpoints = obter_checkpoints()
+    estimador = obter_estimador()
+
+    lista_bdrs = checkpoints.carregar(execucao_id) if execucao_id else None
+    if lista_bdrs is None:
+        lista_bdrs = priorizar_bdrs(obter_universo(forcar_atualizacao), prioridade)[:limite]
+        if not lista_bdrs:
+            raise RuntimeError("Não foi possível obter a lista de BDRs")
+        execucao_id = checkpoints.criar(lista_bdrs)
+
+    # BDRs da mesma empresa-mãe são buscadas uma vez; concluídas no checkpoint não são repetidas
+    plano = planejar_busca(lista_bdrs)
+    brutos = checkpoints.concluidos(execucao_id)
+    pendentes = {t: grupo for t, grupo in plano.items() if t not in brutos}
+    custos = custos_empresas(pendentes, forcar_atualizacao=forcar_atualizacao)
+    if prazo_final is not None:
+        # Cobertura máxima no prazo: empresas que não custam requisições primeiro, o resto por prioridade
+        pendentes = dict(sorted(pendentes.items(), key=lambda item: custos[item[0]] > 0))
+    sucesso = sum(len(plano[t]) for t in brutos)
+    progresso = {
+        'execucao_id': execucao_id,
+        'total_bdrs': len(lista_bdrs),
+        'empresas': len(plano),
+        'recuperadas': len(brutos),
+        'pendentes': len(pendentes),
+        'buscas_economizadas': len(lista_bdrs) - len(plano),
+        'requisicoes_cotacoes': 0,
+        'concluidas': 0,
+        'processadas': sucesso,
+        'sucesso': sucesso,
+        'falhas': 0,
+        'erros_429': 0,
+        'ticker_atual': None,
+        'bdrs_atuais': [],
+        'ultimo_ok': None,
+        'limitados': [],  # Empresas que falharam por rate limit persistente
+        'prazo': prazo,
+        'requisicoes_previstas': sum(custos.values()),
+        'requisicoes_concluidas': 0,
+        'vazao': estimador.estimar(),  # Requisições previstas concluídas por segundo
+        'segundos_restantes': None,  # Estimativa para terminar as empresas pendentes
+        'fora_do_prazo': 0,
+    }
+    ao_progredir('plano', progresso)
+
+    erros_429_inicio = controlador.erros_429
+    progresso['requisicoes_cotacoes'] = buscar_cotacoes_em_lote(list(pendentes), forcar_atualizacao)
+    ao_progredir('cotacoes', progresso)
+
+    inicio_buscas = time.monotonic()
+    sucessos_inicio = controlador.sucessos
+
+    def pode_iniciar(ticker_us, em_andamento):
+        """Sem prazo, sempre. Com prazo, se a empresa termina a tempo: na vazão medida, depois das
+        requisições das empresas já em andamento e das dela"""
+        if prazo_final is None:
+            return True
+        restante = prazo_final - time.monotonic()
+        if restante <= 0:
+            return False
+        fila_requisicoes = custos[ticker_us] + sum(custos[t] for t in em_andamento)
+        return custos[ticker_us] == 0 or restante >= fila_requisicoes / progresso['vazao']
+
+    for ticker_us, grupo, dados, erro in processar_em_paralelo(
+        pendentes, n_workers, forcar_atualizacao, pode_iniciar=pode_iniciar, prazo_final=prazo_final
+    ):
+        checkpoints.registrar(execucao_id, ticker_us, None if erro else dados)
+        ok = bool(dados) and not erro
+        if ok:
+            brutos[ticker_us] = dados
+            progresso['sucesso'] += len(grupo)
+        else:
+            progresso['falhas'] += len(grupo)
+            if erro is not None and eh_erro_429(erro):
+                progresso['limitados'].append(ticker_us)
+        progresso['concluidas'] += 1
+        progresso['processadas'] += len(grupo)
+        progresso['erros_429'] = controlador.erros_429 - erros_429_inicio
+        progresso['ticker_atual'] = ticker_us
+        progresso['bdrs_atuais'] = [b['bdr'] for b in grupo]
+        progresso['ultimo_ok'] = ok
+        # Vazão ao vivo: requisições concluídas com sucesso no controlador, inclusive as das empresas
+        # ainda em andamento, pelo tempo de busca até aqui
+        progresso['requisicoes_concluidas'] += custos[ticker_us]
+        decorrido = time.monotonic() - inicio_buscas
+        if decorrido >= MINIMO_MEDICAO and controlador.sucessos > sucessos_inicio:
+            progresso['vazao'] = (controlador.sucessos - sucessos_inicio) / decorrido
+        progresso['segundos_restantes'] = (
+            (progresso['requisicoes_previstas'] - progresso['requisicoes_concluidas']) / progresso['vazao']
+        )
+        ao_progredir('empresa', progresso)
+
+    estimador.registrar(controlador.sucessos - sucessos_inicio, time.monotonic() - inicio_buscas)
+    # Empresas que não couberam no prazo (nem começaram ou foram canceladas): a análise termina com as demais
+    progresso['fora_do_prazo'] = progresso['pendentes'] - progresso['concluidas']
+    progresso['segundos_restantes'] = 0
+    ao_progredir('fim', progresso)
+    checkpoints.finalizar(execucao_id)
+    # Indicadores de todas as empresas em uma passada vetorizada sobre o painel de demonstrativos
+    return ranquear_bdrs(montar_resultado(plano, calcular_indicadores_lote(brutos)))
+
+class AnaliseEmAndamento(Exception):
+    """Pedido com parâmetros diferentes dos da análise em andamento, que não pode atendê-lo"""
+
+    def __init__(self, tarefa):
+        super().__init__(f"Já há uma análise em andamento no servidor ({tarefa.descrever()})")
+        self.tarefa = tarefa
+
+class TarefaAtualizacao:
+    """Uma análise rodando em uma thread do servidor. O progresso e o resultado ficam aqui,
+    para qualquer sessão acompanhar; nenhuma chamada ao Streamlit é feita fora da sessão"""
+
+    def __init__(self, id, limite=None, n_workers=WORKERS_PADRAO, forcar_atualizacao=False, execucao_id=None,
+                 prazo=None, prioridade='market_cap', taxa_maxima=None):
+        self.id = id
+        self.limite = limite
+        self.prazo = prazo
+        self.prioridade = prioridade
+        self.taxa_maxima = taxa_maxima
+        self.n_workers = n_workers
+        self.forcar_atualizacao = forcar_atualizacao
+        self.execucao_id = execucao_id
+        self.estado = 'executando'  # executando, concluida ou falhou
+        self.resultado = None
+        self.erro = None
+        self.aviso = None
+        self.sessoes = 1  # Pedidos atendidos por esta tarefa
+        self.iniciada_em = datetime.now()
+        self.terminada_em = None
+        self._progresso = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._executar, name=f"atualizacao-{id}", daemon=True)
+
+    @property
+    def ativa(self):
+        return self.estado == 'executando'
+
+    def iniciar(self):
+        self._thread.start()
+
+    def atende(self, limite, forcar_atualizacao, execucao_id, prazo, prioridade):
+        """Se o resultado desta análise é o que um pedido com estes parâmetros teria (workers e teto de
+        taxa só mudam a velocidade)"""
+        return (limite, forcar_atualizacao, execucao_id, prazo, prioridade) == (
+            self.limite, self.forcar_atualizacao, self.execucao_id, self.prazo, self.prioridade
+        )
+
+    def descrever(self):
+        """Parâmetros da análise em texto, ex: 30 BDRs, prioridade: Maior market cap"""
+        partes = [
+            f"{self.limite} BDRs" if self.limite is not None else "todas as BDRs",
+            f"prioridade: {PRIORIDADES[self.prioridade]}",
+        ]
+        if self.prazo is not None:
+            partes.append(f"prazo de {self.prazo / 60:g} min")
+        if self.forcar_atualizacao:
+            partes.append("forçando atualização")
+        if self.execucao_id is not None:
+            partes.append("retomada")
+        return ", ".join(partes)
+
+    def progresso(self):
+        """Cópia do progresso mais recente (vazio até a lista de BDRs ficar pronta)"""
+        with self._lock:
+            return dict(self._progresso)
+
+    def _progredir(self, evento, progresso):
+        with self._lock:
+            self._progresso = {**progresso, 'evento': evento, 'limitados': list(progresso['limitados'])}
+
+    def _executar(self):
+        iniciar_metricas()
+        try:
+            # Teto de taxa pedido para esta análise, aplicado só quando ela começa (como no batch.py)
+            if self.taxa_maxima is not None:
+                obter_controlador().definir_taxa_maxima(self.taxa_maxima)
+            df = executar_analise(
+                self.limite, self.n_workers, self.forcar_atualizacao, self.execucao_id, self._progredir,
+                self.prazo, self.prioridade
+            )
+            # Cada análise vira um snapshot, que alimenta o histórico e a abertura do app; com limite ou
+            # fora do prazo, parcial, para não tomar o lugar do último snapshot completo
+            if not df.empty:
+                parcial = self.limite is not None or self.progresso().get('fora_do_prazo', 0) > 0
+                try:
+                    salvar_snapshot(df, parcial=parcial)
+                except Exception as e:
+                    self.aviso = f"Não foi possível gravar o snapshot: {e}"
+            # Resultado e horário antes do estado: quem vê o estado (outra sessão) lê os dois na hora
+            self.resultado = df
+            self.terminada_em = datetime.now()
+            self.estado = 'concluida'
+        except Exception as e:
+            self.erro = e
+            self.terminada_em = datetime.now()
+            self.estado = 'falhou'
+
+class GerenciadorAtualizacoes:
+    """No máximo uma análise por vez no processo: pedidos iguais feitos durante uma análise em andamento
+    (de qualquer sessão) se juntam a ela, então o custo no Yahoo não cresce com o número de usuários"""
+
+    def __init__(self):
+        self._tarefas = OrderedDict()
+        self._ids = itertools.count(1)
+        self._ativa = None
+        self._lock = threading.Lock()
+
+    def solicitar(self, limite=None, n_workers=WORKERS_PADRAO, forcar_atualizacao=False, execucao_id=None,
+                  prazo=None, prioridade='market_cap', taxa_maxima=None):
+        """(tarefa, nova): a análise em andamento, se houver uma com os mesmos parâmetros, ou uma nova
+        iniciada com eles. Com outra análise em andamento, levanta AnaliseEmAndamento"""
+        with self._lock:
+            if self._ativa is not None and self._ativa.ativa:
+                if not self._ativa.atende(limite, forcar_atualizacao, execucao_id, prazo, prioridade):
+                    raise AnaliseEmAndamento(self._ativa)
+                self._ativa.sessoes += 1
+                return self._ativa, False
+
+            tarefa = TarefaAtualizacao(
+                next(self._ids), limite, n_workers, forcar_atualizacao, execucao_id, prazo, prioridade, taxa_maxima
+            )
+            self._tarefas[tarefa.id] = tarefa
+            self._ativa = tarefa
+            concluidas = [t for t in self._tarefas.values() if not t.ativa]
+            for antiga in concluidas[:max(len(concluidas) - TAREFAS_GUARDADAS, 0)]:
+                del self._tarefas[antiga.id]
+        tarefa.iniciar()
+        return tarefa, True
+
+    def obter(self, id):
+        with self._lock:
+            return self._tarefas.get(id)
+
+    def ativa(self):
+        """A análise em andamento, ou None"""
+        with self._lock:
+            return self._ativa if self._ativa is not None and self._ativa.ativa else None
+
+    def acompanhar(self):
+        """A análise em andamento, contando mais um pedido atendido por ela, ou None"""
+        with self._lock:
+            if self._ativa is None or not self._ativa.ativa:
+                return None
+            self._ativa.sessoes += 1
+            return self._ativa
+
+@lru_cache(maxsize=None)
+def obter_gerenciador():
+    return GerenciadorAtualizacoes()
@@ -0,0 +1,149 @@
+import argparse
+import sys
+import time
+
+from atualizacao import PRIORIDADES, executar_analise
+from dados import TAXA_MAXIMA, WORKERS_PADRAO, obter_checkpoints, obter_controlador
+from exportacao import exportar_historico
+from metricas import iniciar_metricas, obter_metricas
+from provedores import DIRETORIO_GRAVACOES, MODOS_PROVEDOR, criar_provedor, definir_provedor
+from snapshots import DIRETORIO_SNAPSHOTS, relatorio_memoria, relatorio_snapshots, salvar_snapshot
+
+def _imprimir_progresso(evento, progresso):
+    if evento == 'plano':
+        print(
+            f"{progresso['total_bdrs']} BDRs de {progresso['empresas']} empresas-mãe, "
+            f"{progresso['recuperadas']} já concluídas, {progresso['pendentes']} a buscar",
+            flush=True
+        )
+    elif evento == 'cotacoes':
+        print(f"Cotações em lote: {progresso['requisicoes_cotacoes']} requisições", flush=True)
+    elif evento == 'fim':
+        if progresso['fora_do_prazo']:
+            print(f"Prazo atingido: {progresso['fora_do_prazo']} empresas ficaram de fora", flush=True)
+    else:
+        controlador = obter_controlador()
+        print(
+            f"[{progresso['concluidas']}/{progresso['pendentes']}] {progresso['ticker_atual']}: "
+            f"{'ok' if progresso['ultimo_ok'] else 'falha'} "
+            f"(taxa {controlador.taxa:.2f} req/s, {controlador.erros_429} erros 429, "
+            f"~{progresso['segundos_restantes'] / 60:.0f} min restantes)",
+            flush=True
+        )
+
+def analisar_universo(limite=None, n_workers=WORKERS_PADRAO, taxa_maxima=TAXA_MAXIMA,
+                      forcar_atualizacao=False, retomar=False, prazo=None, prioridade='market_cap',
+                      ao_progredir=_imprimir_progresso):
+    """Roda a análise completa das BDRs, no mesmo fluxo do app, e retorna o DataFrame ranqueado"""
+    iniciar_metricas()
+    obter_controlador().definir_taxa_maxima(taxa_maxima)
+    
+    interrompida = obter_checkpoints().interrompida_mais_recente() if retomar else None
+    if interrompida:
+        print(f"Retomando execução {interrompida['id']}")
+    return executar_analise(
+        limite, n_workers, forcar_atualizacao,
+        execucao_id=interrompida['id'] if interrompida else None,
+        ao_progredir=ao_progredir,
+        prazo=prazo,
+        prioridade=prioridade
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analisa o universo de BDRs sem Streamlit e grava um snapshot Parquet versionado, "
+                    "que o app carrega na hora (ex: rodar diariamente via cron)"
+    )
+    parser.add_argument('--limite', type=int, default=None,
+                        help="Quantidade máxima de BDRs (padrão: todas)")
+    parser.add_argument('--prazo', type=float, default=None, metavar='MINUTOS',
+                        help="Tempo disponível: busca as BDRs por prioridade e termina no prazo com as que "
+                             "couberem (padrão: sem prazo)")
+    parser.add_argument('--prioridade', choices=PRIORIDADES, default='market_cap',
+                        help="Ordem das BDRs: " + ", ".join(f"{p} ({d.lower()})" for p, d in PRIORIDADES.items())
+                             + " (padrão: market_cap)")
+    parser.add_argument('--workers', type=int, default=WORKERS_PADRAO,
+                        help=f"Workers paralelos (padrão: {WORKERS_PADRAO})")
+    parser.add_argument('--taxa-maxima', type=float, default=TAXA_MAXIMA,
+                        help=f"Teto de requisições por segundo ao Yahoo (padrão: {TAXA_MAXIMA})")
+    parser.add_argument('--forcar-atualizacao', action='store_true',
+                        help="Ignora o cache em disco e busca tudo novamente")
+    parser.add_argument('--retomar', action='store_true',
+                        help="Retoma a última execução interrompida, se houver")
+    parser.add_argument('--provedor', choices=MODOS_PROVEDOR, default=None,
+                        help="Busca ao vivo, grava as respostas em disco ou reproduz uma gravação "
+                             "(padrão: BDR_PROVEDOR ou ao_vivo)")
+    parser.add_argument('--gravacoes', default=DIRETORIO_GRAVACOES,
+                        help=f"Diretório das gravações (padrão: {DIRETORIO_GRAVACOES})")
+    parser.add_argument('--metricas', default=None,
+                        help="Grava as métricas da execução neste arquivo: texto do Prometheus se "
+                             "terminar em .prom, JSON caso contrário")
+    parser.add_argument('--diretorio', default=DIRETORIO_SNAPSHOTS,
+                        help=f"Diretório dos snapshots (padrão: {DIRETORIO_SNAPSHOTS})")
+    parser.add_argument('--relatorio-memoria', action='store_true',
+                        help="Só mostra a memória medida de cada snapshot já gravado, sem analisar")
+    parser.add_argument('--exportar-historico', default=None, metavar='ARQUIVO',
+                        help="Só exporta o histórico dos snapshots (linha mais recente de cada BDR por dia) para ARQUIVO, "
+                             "em .csv.gz, .parquet ou .xlsx conforme a extensão, sem analisar")
+    args = parser.parse_args(argv)
+    
+    if args.relatorio_memoria:
+        print(relatorio_snapshots(args.diretorio).round(1).to_string(index=False))
+        return 0
+    if args.exportar_historico:
+        try:
+            linhas = exportar_historico(args.exportar_historico, diretorio=args.diretorio)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"{linhas} linhas exportadas para {args.exportar_historico}")
+        return 0
+    if args.provedor:
+        definir_provedor(criar_provedor(args.provedor, args.gravacoes))
+    
+    inicio = time.monotonic()
+    final = {}
+
+    def ao_progredir(evento, progresso):
+        _imprimir_progresso(evento, progresso)
+        if evento == 'fim':
+            final.update(progresso)
+
+    try:
+        df = analisar_universo(
+            limite=args.limite,
+            n_workers=args.workers,
+            taxa_maxima=args.taxa_maxima,
+            forcar_atualizacao=args.forcar_atualizacao,
+            retomar=args.retomar,
+            prazo=args.prazo * 60 if args.prazo else None,
+            prioridade=args.prioridade,
+            ao_progredir=ao_progredir
+        )
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.metricas:
+        metricas = obter_metricas()
+        with open(args.metricas, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(metricas.para_prometheus() if args.metricas.endswith('.prom') else metricas.para_json())
+    
+    if df.empty:
+        print("Nenhuma BDR com dados suficientes encontrada", file=sys.stderr)
+        return 1
+    
+    # Com limite ou fora do prazo, snapshot parcial: não toma o lugar do último completo na abertura do app
+    parcial = args.limite is not None or final.get('fora_do_prazo', 0) > 0
+    caminho = salvar_snapshot(df, args.diretorio, parcial=parcial)
+    memoria = relatorio_memoria(df).sum(numeric_only=True)
+    print(f"Snapshot com {len(df)} BDRs gravado em {caminho} ({time.monotonic() - inicio:.0f}s)")
+    print(f"Memória: {memoria['bytes'] / 1024:.0f} KB ({memoria['bytes_sem_compactar'] / 1024:.0f} KB sem compactar)")
+    requisicoes_http = obter_metricas().total('requisicoes_http')
+    if requisicoes_http:
+        conexoes_abertas = obter_metricas().total('conexoes_abertas')
+        print(f"HTTP: {requisicoes_http} requisições em {conexoes_abertas} conexões "
+              f"({max(requisicoes_http - conexoes_abertas, 0) / requisicoes_http:.0%} reaproveitadas)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
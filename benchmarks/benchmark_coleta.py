@@ -0,0 +1,191 @@
+"""Benchmark offline do pipeline de coleta, sobre um universo gravado e reproduzido com ProvedorReplay.
+
+Exemplos:
+    python benchmarks/benchmark_coleta.py
+    python benchmarks/benchmark_coleta.py --cenarios 4:1:5 8:2:10 16:5:20 --limite-servidor 15
+    python benchmarks/benchmark_coleta.py --gravacoes gravacoes/  # gravação real feita com BDR_PROVEDOR=gravar
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import (  # noqa: E402
+    MAPA_BDRS_COMPLETO, CacheFundamentos, ControladorTaxa, IndiceUniverso, buscar_cotacoes_em_lote,
+    calcular_indicadores_lote, montar_resultado, obter_universo, planejar_busca, processar_em_paralelo
+)
+from metricas import iniciar_metricas  # noqa: E402
+from pontuacao import ranquear_bdrs  # noqa: E402
+from provedores import ProvedorReplay  # noqa: E402
+
+CENARIOS_PADRAO = ('4:2:5', '8:5:10', '16:10:20')
+
+def _tickers_sinteticos(n):
+    """Tickers alfabéticos de 4 letras (ZAAA, ZAAB...), que o fallback da resolução de BDRs mapeia sozinho"""
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    tickers = []
+    for i in range(len(letras) ** 3):
+        ticker = 'Z' + letras[i // 676] + letras[i // 26 % 26] + letras[i % 26]
+        if f"{ticker}34" not in MAPA_BDRS_COMPLETO:
+            tickers.append(ticker)
+        if len(tickers) == n:
+            return tickers
+    raise ValueError(f"No máximo {len(tickers)} tickers sintéticos")
+
+def gerar_gravacao_sintetica(diretorio, n_tickers=500, semente=0):
+    """Grava um universo fictício de n_tickers BDRs no formato do ProvedorGravacao"""
+    aleatorio = np.random.default_rng(semente)
+    tickers = _tickers_sinteticos(n_tickers)
+    periodos = pd.to_datetime([f"{ano}-12-31" for ano in range(2023, 2019, -1)])
+
+    def gravar(endpoint, chave, valor):
+        pasta = os.path.join(diretorio, endpoint)
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, f"{chave}.pkl"), 'wb') as arquivo:
+            pickle.dump(valor, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+
+    gravar('lista', 'acoes', [{'stock': f"{t}34", 'name': f"{t} Inc"} for t in tickers])
+    for ticker in tickers:
+        receita = aleatorio.uniform(1e9, 1e11) * np.cumprod(aleatorio.uniform(0.9, 1.2, len(periodos)))
+        lucro = receita * aleatorio.uniform(-0.05, 0.3, len(periodos))
+        patrimonio = receita * aleatorio.uniform(0.3, 2.0)
+        gravar('cotacao', ticker, {
+            'symbol': ticker,
+            'regularMarketPrice': float(aleatorio.uniform(5, 500)),
+            'regularMarketPreviousClose': float(aleatorio.uniform(5, 500)),
+            'trailingPE': float(aleatorio.uniform(5, 60)),
+            'priceToBook': float(aleatorio.uniform(0.5, 15)),
+            'dividendYield': float(aleatorio.uniform(0, 5)),
+            'marketCap': float(receita[0] * aleatorio.uniform(1, 10)),
+        })
+        gravar('info', ticker, {
+            'symbol': ticker, 'shortName': f"{ticker} Inc", 'sector': 'Technology',
+            'industry': 'Software', 'country': 'United States', 'currency': 'USD',
+        })
+        gravar('financials', ticker, pd.DataFrame(
+            [lucro, receita], index=['Net Income', 'Total Revenue'], columns=periodos
+        ))
+        gravar('balance_sheet', ticker, pd.DataFrame(
+            [patrimonio * np.ones(len(periodos)), patrimonio * 2.5, patrimonio * aleatorio.uniform(0, 1.5)],
+            index=['Stockholders Equity', 'Total Assets', 'Total Debt'], columns=periodos
+        ))
+
+def executar_cenario(diretorio, n_workers, taxa_inicial, taxa_maxima, opcoes_replay):
+    """Roda o pipeline completo (lista, cotações em lote, busca paralela, indicadores e ranking)
+    com cache vazio e retorna as métricas do cenário"""
+    provedor = ProvedorReplay(diretorio, **opcoes_replay)
+    controlador = ControladorTaxa(taxa=taxa_inicial, taxa_max=taxa_maxima)
+    metricas = iniciar_metricas()
+
+    with tempfile.TemporaryDirectory() as diretorio_cache:
+        cache = CacheFundamentos(diretorio_cache)
+        inicio = time.monotonic()
+
+        plano = planejar_busca(obter_universo(provedor=provedor, indice=IndiceUniverso(diretorio_cache)))
+        buscar_cotacoes_em_lote(list(plano), cache=cache, controlador=controlador, provedor=provedor)
+
+        # Latência de cada empresa desde o início da sua última rodada, na mesma busca paralela da análise
+        inicios = {}
+
+        def pode_iniciar(ticker_us, em_andamento):
+            inicios[ticker_us] = time.monotonic()
+            return True
+
+        brutos, latencias = {}, []
+        for ticker_us, _, dados, erro in processar_em_paralelo(
+            plano, n_workers, cache=cache, controlador=controlador, provedor=provedor, pode_iniciar=pode_iniciar
+        ):
+            latencias.append(time.monotonic() - inicios[ticker_us])
+            if dados and not erro:
+                brutos[ticker_us] = dados
+
+        df = ranquear_bdrs(montar_resultado(plano, calcular_indicadores_lote(brutos)))
+        duracao = time.monotonic() - inicio
+
+    return {
+        'workers': n_workers,
+        'taxa_inicial': taxa_inicial,
+        'taxa_maxima': taxa_maxima,
+        'tickers': len(plano),
+        'duracao_s': round(duracao, 2),
+        'tickers_por_s': round(len(plano) / duracao, 2),
+        'p50_ms': round(float(np.percentile(latencias, 50)) * 1000, 1),
+        'p99_ms': round(float(np.percentile(latencias, 99)) * 1000, 1),
+        'requisicoes': provedor.requisicoes,
+        'erros_429': controlador.erros_429,
+        'retentativas': metricas.total('retentativas'),
+        'reenfileiradas': metricas.total('empresas_reenfileiradas'),
+        'falhas': len(plano) - len(brutos),
+        'linhas_resultado': len(df),
+        'taxa_final': round(controlador.taxa, 2),
+    }
+
+def _ler_cenario(texto):
+    try:
+        workers, inicial, maxima = texto.split(':')
+        return int(workers), float(inicial), float(maxima)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Cenário inválido: {texto} (use workers:taxa_inicial:taxa_maxima)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compara concorrência e limites de taxa offline, reproduzindo um universo gravado"
+    )
+    parser.add_argument('--gravacoes', default=None,
+                        help="Diretório de uma gravação (padrão: universo sintético temporário)")
+    parser.add_argument('--tickers', type=int, default=500,
+                        help="Tamanho do universo sintético (padrão: 500)")
+    parser.add_argument('--cenarios', nargs='+', type=_ler_cenario,
+                        default=[_ler_cenario(c) for c in CENARIOS_PADRAO],
+                        help="Cenários no formato workers:taxa_inicial:taxa_maxima")
+    parser.add_argument('--latencia', type=float, default=0.05,
+                        help="Latência média simulada por requisição, em segundos (padrão: 0.05)")
+    parser.add_argument('--prob-429', type=float, default=0.0,
+                        help="Probabilidade de 429 por requisição, além do limite do servidor (padrão: 0)")
+    parser.add_argument('--limite-servidor', type=float, default=10,
+                        help="Req/s acima das quais o servidor simulado responde 429 (padrão: 10)")
+    parser.add_argument('--retry-after', type=float, default=0.5,
+                        help="Retry-After dos 429 simulados, em segundos (padrão: 0.5)")
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    opcoes_replay = {
+        'latencia': args.latencia,
+        'prob_429': args.prob_429,
+        'limite_servidor': args.limite_servidor,
+        'retry_after': args.retry_after,
+        'semente': args.semente,
+    }
+
+    with tempfile.TemporaryDirectory() as temporario:
+        diretorio = args.gravacoes
+        if diretorio is None:
+            diretorio = temporario
+            gerar_gravacao_sintetica(diretorio, args.tickers, args.semente)
+
+        resultados = []
+        for n_workers, taxa_inicial, taxa_maxima in args.cenarios:
+            resultado = executar_cenario(diretorio, n_workers, taxa_inicial, taxa_maxima, opcoes_replay)
+            print(
+                f"workers={n_workers:<3} taxa={taxa_inicial:g}->{taxa_maxima:g}: "
+                f"{resultado['tickers_por_s']} tickers/s, p50 {resultado['p50_ms']}ms, "
+                f"p99 {resultado['p99_ms']}ms, {resultado['erros_429']} erros 429, "
+                f"{resultado['retentativas']} retentativas, "
+                f"{resultado['falhas']} falhas",
+                flush=True
+            )
+            resultados.append(resultado)
+
+    print()
+    print(pd.DataFrame(resultados).to_string(index=False))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
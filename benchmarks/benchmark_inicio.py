@@ -0,0 +1,116 @@
+"""Benchmark de abertura do app: tempo até a primeira renderização e de uma reexecução, cada medida
+em um processo novo (imports frios), sem e com snapshot, sem acessar a rede.
+
+Exemplos:
+    python benchmarks/benchmark_inicio.py
+    python benchmarks/benchmark_inicio.py --repeticoes 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MODULOS_PESADOS = ('yfinance', 'plotly.express', 'requests')
+
+# Roda em um processo novo: o relógio começa antes de qualquer import pesado
+MEDICAO = """
+import time
+inicio = time.perf_counter()
+import json, sys
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=120)
+app.run()
+primeira = time.perf_counter() - inicio
+inicio_reexecucao = time.perf_counter()
+app.run()
+reexecucao = time.perf_counter() - inicio_reexecucao
+print(json.dumps({{
+    'primeira_renderizacao_s': primeira,
+    'reexecucao_s': reexecucao,
+    'excecoes': [str(e.value) for e in app.exception],
+    'carregados': [m for m in {modulos!r} if m in sys.modules],
+}}))
+"""
+
+def gerar_snapshot_sintetico(diretorio, n_bdrs=500, semente=0):
+    """Grava um snapshot fictício com n_bdrs linhas, no formato do batch.py"""
+    from pontuacao import ranquear_bdrs
+    from snapshots import salvar_snapshot
+
+    aleatorio = np.random.default_rng(semente)
+    setores = ['Technology', 'Healthcare', 'Financial Services', 'Energy', 'Consumer Cyclical']
+    bdrs = [f"Z{i:03d}34" for i in range(n_bdrs)]
+    df = pd.DataFrame({
+        'BDR': bdrs,
+        'Ticker US': [b[:-2] for b in bdrs],
+        'Empresa': [b[:-2] for b in bdrs],
+        'Setor': aleatorio.choice(setores, n_bdrs),
+        'ROE (%)': aleatorio.normal(15, 10, n_bdrs).round(2),
+        'Margem (%)': aleatorio.normal(12, 8, n_bdrs).round(2),
+        'Cresc (%)': aleatorio.normal(6, 10, n_bdrs).round(2),
+        'Dívida/PL (%)': aleatorio.uniform(0, 200, n_bdrs).round(2),
+        'P/E': aleatorio.uniform(5, 60, n_bdrs).round(2),
+        'P/B': aleatorio.uniform(0.5, 15, n_bdrs).round(2),
+        'Div Yield (%)': aleatorio.uniform(0, 5, n_bdrs).round(2),
+        'Market Cap (B)': aleatorio.lognormal(3, 1.5, n_bdrs).round(2),
+    })
+    return salvar_snapshot(ranquear_bdrs(df), diretorio)
+
+def medir(diretorio_snapshots, diretorio_cache):
+    ambiente = {
+        **os.environ,
+        'BDR_SNAPSHOT_DIR': diretorio_snapshots,
+        'BDR_CACHE_DIR': diretorio_cache,
+        'PYTHONPATH': RAIZ,
+    }
+    codigo = MEDICAO.format(app=os.path.join(RAIZ, 'app.py'), modulos=MODULOS_PESADOS)
+    saida = subprocess.run(
+        [sys.executable, '-c', codigo], env=ambiente, cwd=RAIZ,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de abertura e de reexecução do app")
+    parser.add_argument('--repeticoes', type=int, default=5,
+                        help="Processos medidos por cenário (padrão: 5)")
+    parser.add_argument('--bdrs', type=int, default=500,
+                        help="Linhas do snapshot sintético (padrão: 500)")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as temporario:
+        vazio = os.path.join(temporario, 'sem_snapshot')
+        com_snapshot = os.path.join(temporario, 'com_snapshot')
+        os.makedirs(vazio)
+        gerar_snapshot_sintetico(com_snapshot, args.bdrs)
+
+        for cenario, diretorio in (('sem snapshot', vazio), ('com snapshot', com_snapshot)):
+            medidas = [
+                medir(diretorio, os.path.join(temporario, f'cache_{cenario}_{i}'))
+                for i in range(args.repeticoes)
+            ]
+            excecoes = sorted({e for m in medidas for e in m['excecoes']})
+            if excecoes:
+                print(f"{cenario}: exceções no app: {excecoes}", file=sys.stderr)
+            resultados.append({
+                'cenario': cenario,
+                'primeira_p50_s': round(float(np.median([m['primeira_renderizacao_s'] for m in medidas])), 3),
+                'primeira_max_s': round(max(m['primeira_renderizacao_s'] for m in medidas), 3),
+                'reexecucao_p50_s': round(float(np.median([m['reexecucao_s'] for m in medidas])), 3),
+                'modulos_pesados': ', '.join(medidas[-1]['carregados']) or '-',
+            })
+
+    print(pd.DataFrame(resultados).to_string(index=False))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
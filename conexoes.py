@@ -0,0 +1,64 @@
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from metricas import obter_metricas
+
+# Sessão HTTP única do processo, usada pela BRAPI e pelo Yahoo (via yfinance). As conexões ficam abertas
+# (keep-alive) e são reaproveitadas entre tickers e workers, sem um novo handshake TLS a cada requisição.
+# Importado sob demanda pelo provedores.py, para o requests não pesar na abertura do app
+TAMANHO_POOL = int(os.environ.get('BDR_POOL_CONEXOES', 20))  # Conexões mantidas por host; ≥ workers
+HOSTS_NO_POOL = 10  # Hosts distintos com conexões guardadas (brapi, query1/query2, fc.yahoo...)
+
+class _ContadorConexoes:
+    """Conta cada conexão aberta no pool; requisições menos conexões abertas = conexões reaproveitadas"""
+
+    def _new_conn(self):
+        obter_metricas().incrementar('conexoes_abertas', host=self.host)
+        return super()._new_conn()
+
+class _PoolHTTP(_ContadorConexoes, HTTPConnectionPool):
+    pass
+
+class _PoolHTTPS(_ContadorConexoes, HTTPSConnectionPool):
+    pass
+
+class AdaptadorPool(HTTPAdapter):
+    """HTTPAdapter com pools que contam as conexões abertas"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _PoolHTTP, 'https': _PoolHTTPS}
+
+def _registrar_resposta(resposta, *args, **kwargs):
+    """Hook de resposta: requisições, bytes baixados e latência (até os cabeçalhos) por host"""
+    metricas = obter_metricas()
+    host = urlparse(resposta.url).hostname
+    metricas.incrementar('requisicoes_http', host=host)
+    metricas.incrementar('bytes_baixados', len(resposta.content), host=host)
+    metricas.registrar_duracao('http', resposta.elapsed.total_seconds())
+
+def criar_sessao(tamanho_pool=TAMANHO_POOL):
+    """Session do requests com pool de conexões keep-alive. Pode ser compartilhada entre threads
+    para requisições simples (GET sem estado), como faz o próprio yfinance"""
+    sessao = requests.Session()
+    # Sem bloquear: com mais threads que conexões, a excedente abre uma conexão avulsa (e é contada)
+    adaptador = AdaptadorPool(pool_connections=HOSTS_NO_POOL, pool_maxsize=tamanho_pool, pool_block=False)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    sessao.hooks['response'].append(_registrar_resposta)
+    return sessao
+
+_sessao = None
+_lock = threading.Lock()
+
+def obter_sessao():
+    global _sessao
+    with _lock:
+        if _sessao is None:
+            _sessao = criar_sessao()
+        return _sessao
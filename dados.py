@@ -0,0 +1,1144 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from metricas import obter_metricas
+from pontuacao import compactar_resultado
+from provedores import obter_provedor
+
+# Constantes
+PERIODOS = 5
+TERMINACOES_BDR = ('31', '32', '33', '34', '35', '39')
+
+# Nomes alternativos usados pelo Yahoo para cada campo dos demonstrativos, em ordem de preferência
+ALIASES_DEMONSTRATIVOS = {
+    'lucro': ('financials', ["Net Income", "NetIncome", "Net Income Common Stockholders"]),
+    'receita': ('financials', ["Total Revenue", "TotalRevenue", "Total Revenues"]),
+    'patrimonio': ('balance_sheet', ["Total Stockholder Equity", "Stockholders Equity",
+                                     "StockholdersEquity", "Total Equity Gross Minority Interest"]),
+    'ativo_total': ('balance_sheet', ["Total Assets", "TotalAssets"]),
+    'divida_total': ('balance_sheet', ["Total Debt", "Long Term Debt", "TotalDebt"]),
+}
+CAMPOS_OBRIGATORIOS = ('lucro', 'receita', 'patrimonio')
+AGREGACOES = {'media': 'mean', 'mediana': 'median'}
+
+MAPA_BDRS_COMPLETO = {
+    'AAPL34': 'AAPL', 'MSFT34': 'MSFT', 'GOGL34': 'GOOGL', 'AMZO34': 'AMZN',
+    'NVDC34': 'NVDA', 'M1TA34': 'META', 'TSLA34': 'TSLA', 'NFLX34': 'NFLX',
+    'A1MD34': 'AMD', 'ITLC34': 'INTC', 'ORCL34': 'ORCL', 'AVGO34': 'AVGO',
+    'ADBE34': 'ADBE', 'CSCO34': 'CSCO', 'QCOM34': 'QCOM', 'TXAS34': 'TXN',
+    'I2BM34': 'IBM', 'S2EA34': 'EA', 'U2NI34': 'U', 'ROXO34': 'RBLX',
+    'C2OI34': 'COIN', 'P2LT34': 'PLTR', 'S2MP34': 'SMPL', 'M2RV34': 'MRVL',
+    'MUTC34': 'MU', 'S2NO34': 'SNOW', 'D2OC34': 'DOCU', 'UBER34': 'UBER',
+    'U1BE34': 'UBER', 'LYFT34': 'LYFT', 'SPOT34': 'SPOT', 'TWTR34': 'TWTR',
+    'PINT34': 'PINS', 'SNAP34': 'SNAP', 'Z1M34': 'ZM', 'SHOP34': 'SHOP',
+    'SQ1U34': 'SQ', 'HOOD34': 'HOOD', 'DKNG34': 'DKNG', 'DDOG34': 'DDOG',
+    'VISA34': 'V', 'V2SA34': 'V', 'M2ST34': 'MA', 'PYPL34': 'PYPL',
+    'CTGP34': 'C', 'B1AC34': 'BAC', 'J2PM34': 'JPM', 'W2FC34': 'WFC',
+    'G2S34': 'GS', 'M2S34': 'MS', 'A1XP34': 'AXP', 'BERK34': 'BRK-B',
+    'B1RO34': 'BRK.A', 'PAGS34': 'PAGS', 'NU34': 'NU', 'STOC34': 'STNE',
+    'S1PW34': 'SPG', 'A1MG34': 'AMG', 'BLK34': 'BLK', 'SCHW34': 'SCHW',
+    'WALM34': 'WMT', 'AMZN34': 'AMZN', 'COST34': 'COST', 'H0MC34': 'HD',
+    'T1GT34': 'TGT', 'T2ND34': 'TGT', 'LOW34': 'LOW', 'M1CD34': 'MCD',
+    'SBUB34': 'SBUX', 'NIKE34': 'NKE', 'COCA34': 'KO', 'P3EP34': 'PEP',
+    'KO34': 'KO', 'PGCO34': 'PG', 'ULVR34': 'UL', 'WMT34': 'WMT',
+    'NKE34': 'NKE', 'LULU34': 'LULU', 'ROST34': 'ROST', 'TJX34': 'TJX',
+    'DISB34': 'DIS', 'CMCS34': 'CMCSA', 'NFLX34': 'NFLX', 'WBD34': 'WBD',
+    'PARA34': 'PARA', 'SONY34': 'SONY', 'EA34': 'EA', 'TTWO34': 'TTWO',
+    'JNJB34': 'JNJ', 'LILY34': 'LLY', 'ABBV34': 'ABBV', 'P1FE34': 'PFE',
+    'UNH34': 'UNH', 'MRK34': 'MRK', 'A1BB34': 'ABT', 'T1MO34': 'TMO',
+    'D1HU34': 'DHR', 'BMY34': 'BMY', 'AMGN34': 'AMGN', 'GILD34': 'GILD',
+    'MDT34': 'MDT', 'CI34': 'CI', 'CVS34': 'CVS', 'HUM34': 'HUM',
+    'B1AX34': 'BAX', 'ZTS34': 'ZTS', 'REGN34': 'REGN', 'VRTX34': 'VRTX',
+    'EXXO34': 'XOM', 'CHVX34': 'CVX', 'SHEL34': 'SHEL', 'TOT34': 'TTE',
+    'BP34': 'BP', 'COP34': 'COP', 'SLB34': 'SLB', 'OXY34': 'OXY',
+    'HAL34': 'HAL', 'MPC34': 'MPC', 'PSX34': 'PSX', 'VLO34': 'VLO',
+    'BOEI34': 'BA', 'C1AT34': 'CAT', 'D1EE34': 'DE', 'G1E34': 'GE',
+    'H1ON34': 'HON', 'L1OC34': 'LMT', 'R1TH34': 'RTX', 'U1PS34': 'UPS',
+    'U2PS34': 'UPS', 'F1DX34': 'FDX', 'GD34': 'GD', 'NOC34': 'NOC',
+    'MMM34': 'MMM', 'EMR34': 'EMR', 'ETN34': 'ETN', 'ITW34': 'ITW',
+    'FCXO34': 'FCX', 'N1VO34': 'NEM', 'F2NV34': 'FNV', 'NUE34': 'NUE',
+    'DOW34': 'DOW', 'LYB34': 'LYB', 'APD34': 'APD', 'ECL34': 'ECL',
+    'VALE34': 'VALE', 'RIO34': 'RIO', 'BHP34': 'BHP', 'SCCO34': 'SCCO',
+    'TSMC34': 'TSM', 'ASML34': 'ASML', 'NVDA34': 'NVDA', 'AVGO34': 'AVGO',
+    'AMD34': 'AMD', 'INTC34': 'INTC', 'QCOM34': 'QCOM', 'TXN34': 'TXN',
+    'MU34': 'MU', 'MRVL34': 'MRVL', 'ADI34': 'ADI', 'KLAC34': 'KLAC',
+    'BABA34': 'BABA', 'BIDU34': 'BIDU', 'JD34': 'JD', 'PDD34': 'PDD',
+    'NIO34': 'NIO', 'XPEV34': 'XPEV', 'LI34': 'LI', 'TCEHY': 'TCEHY',
+    'MELI34': 'MELI', 'GLOB34': 'GLOB', 'PBR34': 'PBR', 'ELET34': 'ELP',
+    'T2T34': 'T', 'VZ34': 'VZ', 'TMUS34': 'TMUS', 'S2P34': 'S',
+    'NEE34': 'NEE', 'DUK34': 'DUK', 'SO34': 'SO', 'D34': 'D',
+    'A2RR34': 'ARR', 'AMT34': 'AMT', 'PLD34': 'PLD', 'EQIX34': 'EQIX',
+    'RGTI34': 'RGTI', 'T2DH34': 'TDG', 'V1ST34': 'VST', 'F1MC34': 'FMC',
+}
+
+# Cache persistente em disco
+DIRETORIO_CACHE = os.environ.get(
+    'BDR_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+TTL_COTACAO = 24 * 3600  # Dados de mercado (preço, P/E, DY...)
+TTL_INFO = 90 * 24 * 3600  # get_info() só é usado para setor/indústria, que quase nunca mudam
+# Demonstrativos anuais só mudam quando um novo exercício é publicado: são buscados de novo quando o
+# calendário do ticker indica um novo período provável (ver CacheFundamentos.registrar_periodo). O TTL
+# é só um teto de segurança (exercício fiscal alterado, revisões)
+TTL_DEMONSTRATIVOS = 400 * 24 * 3600
+ENDPOINTS_DEMONSTRATIVOS = ('financials', 'balance_sheet')
+# Fragmentos buscados individualmente por empresa-mãe, e a etapa de cada um nas métricas
+FRAGMENTOS = ('info', 'financials', 'balance_sheet')
+ETAPAS_FRAGMENTOS = {'info': 'get_info', 'financials': 'financials', 'balance_sheet': 'balance_sheet'}
+PRAZO_PUBLICACAO = 45 * 24 * 3600  # Do fim do exercício ao anual no Yahoo, sem data de resultado conhecida
+PRAZO_MAXIMO_PUBLICACAO = 90 * 24 * 3600  # Prazo do 10-K: resultados depois disso já são de outro trimestre
+ESPERA_NOVO_PERIODO = 7 * 24 * 3600  # Período esperado ainda não publicado: verifica de novo a cada semana
+# Tickers que o Yahoo respondeu sem dados (deslistados, mapeados errado) não são buscados por este período
+TTL_SEM_DADOS = float(os.environ.get('BDR_DIAS_SEM_DADOS', 7)) * 24 * 3600
+LIMITE_CACHE_MB = 200
+ENDPOINTS_TTL = {
+    'cotacao': TTL_COTACAO,
+    'info': TTL_INFO,
+    'financials': TTL_DEMONSTRATIVOS,
+    'balance_sheet': TTL_DEMONSTRATIVOS,
+}
+
+class CacheFundamentos:
+    """Cache SQLite de respostas do Yahoo, por ticker e endpoint, com TTL e limite de tamanho"""
+    
+    def __init__(self, diretorio=DIRETORIO_CACHE, limite_mb=LIMITE_CACHE_MB):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, 'fundamentos.sqlite')
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        with self._conectar() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respostas (
+                    ticker TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    gravado_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL,
+                    PRIMARY KEY (ticker, endpoint)
+                )
+            """)
+            # Último exercício dos demonstrativos em cache e quando o próximo deve estar publicado
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendario (
+                    ticker TEXT PRIMARY KEY,
+                    ultimo_periodo TEXT NOT NULL,
+                    proximo_relatorio REAL NOT NULL,
+                    verificado_em REAL NOT NULL
+                )
+            """)
+            # Quantas vezes cada ticker foi visto no app: prioridade do aquecimento do cache
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS visualizacoes (
+                    ticker TEXT PRIMARY KEY,
+                    contagem INTEGER NOT NULL,
+                    visto_em REAL NOT NULL
+                )
+            """)
+    
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30)
+    
+    def _ler(self, ticker, endpoint, ttl, contar):
+        ttl = ENDPOINTS_TTL.get(endpoint, TTL_COTACAO) if ttl is None else ttl
+        agora = time.time()
+        with self._lock, self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT payload, gravado_em FROM respostas WHERE ticker = ? AND endpoint = ?",
+                (ticker, endpoint)
+            ).fetchone()
+            if not linha or agora - linha[1] > ttl:
+                if contar:
+                    obter_metricas().incrementar('cache_faltas', endpoint=endpoint)
+                return None
+            if contar:
+                conn.execute(
+                    "UPDATE respostas SET acessado_em = ? WHERE ticker = ? AND endpoint = ?",
+                    (agora, ticker, endpoint)
+                )
+        if contar:
+            obter_metricas().incrementar('cache_acertos', endpoint=endpoint)
+        try:
+            return pickle.loads(linha[0])
+        except Exception:
+            return None
+    
+    def obter(self, ticker, endpoint, ttl=None):
+        """Retorna o valor em cache ou None se ausente/expirado"""
+        return self._ler(ticker, endpoint, ttl, contar=True)
+    
+    def espiar(self, ticker, endpoint, ttl=None):
+        """Como obter, mas para consultas internas (cache negativo, cotação, validação): não conta
+        acertos e faltas nas métricas nem renova o acesso da entrada para o despejo"""
+        return self._ler(ticker, endpoint, ttl, contar=False)
+    
+    def gravar(self, ticker, endpoint, valor):
+        payload = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        agora = time.time()
+        with self._lock, self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?)",
+                (ticker, endpoint, payload, len(payload), agora, agora)
+            )
+            self._despejar(conn)
+    
+    def vencimentos(self, endpoints=tuple(ENDPOINTS_TTL)):
+        """{(ticker, endpoint): instante (epoch) em que a entrada vence pelo TTL do endpoint, ou, nos
+        demonstrativos com calendário, em que um novo período é provável}"""
+        marcadores = ', '.join('?' * len(endpoints))
+        with self._lock, self._conectar() as conn:
+            linhas = conn.execute(
+                f"""SELECT r.ticker, r.endpoint, r.gravado_em, c.proximo_relatorio
+                    FROM respostas r LEFT JOIN calendario c ON c.ticker = r.ticker
+                    WHERE r.endpoint IN ({marcadores})""",
+                tuple(endpoints)
+            ).fetchall()
+        vencimentos = {}
+        for ticker, endpoint, gravado_em, proximo_relatorio in linhas:
+            vencimento = gravado_em + ENDPOINTS_TTL.get(endpoint, TTL_COTACAO)
+            if endpoint in ENDPOINTS_DEMONSTRATIVOS and proximo_relatorio is not None:
+                vencimento = min(vencimento, proximo_relatorio)
+            vencimentos[(ticker, endpoint)] = vencimento
+        return vencimentos
+    
+    def calendario(self, ticker):
+        """{'ultimo_periodo', 'proximo_relatorio', 'verificado_em'} do ticker, ou None se desconhecido"""
+        with self._lock, self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT ultimo_periodo, proximo_relatorio, verificado_em FROM calendario WHERE ticker = ?",
+                (ticker,)
+            ).fetchone()
+        if linha is None:
+            return None
+        return {'ultimo_periodo': pd.Timestamp(linha[0]), 'proximo_relatorio': linha[1], 'verificado_em': linha[2]}
+    
+    def registrar_periodo(self, ticker, ultimo_periodo, data_resultado=None):
+        """Grava o último exercício visto nos demonstrativos e estima quando o próximo sai: na data do
+        resultado anunciada (epoch), se for a do fechamento do exercício seguinte, ou PRAZO_PUBLICACAO após
+        o fim dele. Se essa data já passou sem período novo, verifica de novo em ESPERA_NOVO_PERIODO"""
+        agora = time.time()
+        fim_seguinte = (pd.Timestamp(ultimo_periodo) + pd.DateOffset(years=1)).timestamp()
+        if data_resultado and fim_seguinte < data_resultado <= fim_seguinte + PRAZO_MAXIMO_PUBLICACAO:
+            proximo = data_resultado + 24 * 3600  # O Yahoo leva ~1 dia para atualizar os anuais
+        else:
+            proximo = fim_seguinte + PRAZO_PUBLICACAO
+        if proximo <= agora:
+            proximo = agora + ESPERA_NOVO_PERIODO
+        
+        anterior = self.calendario(ticker)
+        if anterior is not None and pd.Timestamp(ultimo_periodo) > anterior['ultimo_periodo']:
+            obter_metricas().incrementar('periodos_novos')
+        with self._lock, self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO calendario VALUES (?, ?, ?, ?)",
+                (ticker, pd.Timestamp(ultimo_periodo).isoformat(), proximo, agora)
+            )
+    
+    def valores(self, endpoint):
+        """{ticker: valor} de um endpoint, vencidos inclusive, sem contar acesso (para planejamento)"""
+        with self._lock, self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT ticker, payload FROM respostas WHERE endpoint = ?",
+                (endpoint,)
+            ).fetchall()
+        valores = {}
+        for ticker, payload in linhas:
+            try:
+                valores[ticker] = pickle.loads(payload)
+            except Exception:
+                continue
+        return valores
+    
+    def registrar_visualizacoes(self, tickers):
+        agora = time.time()
+        with self._lock, self._conectar() as conn:
+            conn.executemany(
+                "INSERT INTO visualizacoes VALUES (?, 1, ?) "
+                "ON CONFLICT (ticker) DO UPDATE SET contagem = contagem + 1, visto_em = excluded.visto_em",
+                [(ticker, agora) for ticker in tickers]
+            )
+    
+    def visualizacoes(self):
+        """{ticker: quantas vezes foi visto no app}"""
+        with self._lock, self._conectar() as conn:
+            return dict(conn.execute("SELECT ticker, contagem FROM visualizacoes").fetchall())
+    
+    def marcar_sem_dados(self, ticker, motivo):
+        """Cache negativo: o ticker não é buscado de novo até TTL_SEM_DADOS vencer"""
+        self.gravar(ticker, 'sem_dados', {'motivo': motivo, 'em': time.time()})
+    
+    def sem_dados(self, ttl=TTL_SEM_DADOS):
+        """{ticker: motivo} dos tickers no cache negativo"""
+        with self._lock, self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT ticker, payload FROM respostas WHERE endpoint = 'sem_dados' AND gravado_em >= ?",
+                (time.time() - ttl,)
+            ).fetchall()
+        return {ticker: pickle.loads(payload)['motivo'] for ticker, payload in linhas}
+    
+    def _despejar(self, conn):
+        """Remove as entradas menos acessadas até caber no limite de tamanho"""
+        total = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total <= self.limite_bytes:
+            return
+        for ticker, endpoint, tamanho in conn.execute(
+            "SELECT ticker, endpoint, tamanho FROM respostas ORDER BY acessado_em"
+        ).fetchall():
+            conn.execute(
+                "DELETE FROM respostas WHERE ticker = ? AND endpoint = ?",
+                (ticker, endpoint)
+            )
+            total -= tamanho
+            if total <= self.limite_bytes:
+                break
+    
+    def limpar(self):
+        with self._lock, self._conectar() as conn:
+            conn.execute("DELETE FROM respostas")
+            conn.execute("DELETE FROM calendario")
+    
+    def estatisticas(self):
+        with self._lock, self._conectar() as conn:
+            entradas, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas"
+            ).fetchone()
+            tickers = conn.execute(
+                "SELECT COUNT(DISTINCT ticker) FROM respostas"
+            ).fetchone()[0]
+        return {'entradas': entradas, 'tickers': tickers, 'tamanho_mb': total / 1024 / 1024}
+
+@lru_cache(maxsize=None)
+def obter_cache():
+    return CacheFundamentos()
+
+# Checkpoints de execuções
+MAX_EXECUCOES_GUARDADAS = 20
+JANELA_ATIVIDADE = 600  # Sem ticker gravado há 10 min, uma execução não concluída é dada como interrompida
+
+class CheckpointExecucoes:
+    """Registro em disco das análises em andamento, para retomar uma execução interrompida"""
+    
+    def __init__(self, diretorio=DIRETORIO_CACHE):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, 'execucoes.sqlite')
+        self._lock = threading.Lock()
+        with self._conectar() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS execucoes (
+                    id TEXT PRIMARY KEY,
+                    criada_em REAL NOT NULL,
+                    bdrs TEXT NOT NULL,
+                    concluida INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tickers (
+                    execucao_id TEXT NOT NULL,
+                    ticker TEXT NOT NULL,
+                    sucesso INTEGER NOT NULL,
+                    dados BLOB,
+                    atualizado_em REAL NOT NULL,
+                    PRIMARY KEY (execucao_id, ticker)
+                )
+            """)
+    
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30)
+    
+    def criar(self, lista_bdrs):
+        """Registra uma nova execução com a lista de BDRs a analisar e retorna seu ID"""
+        execucao_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        with self._lock, self._conectar() as conn:
+            conn.execute(
+                "INSERT INTO execucoes (id, criada_em, bdrs) VALUES (?, ?, ?)",
+                (execucao_id, time.time(), json.dumps(lista_bdrs))
+            )
+            self._limpar_antigas(conn)
+        return execucao_id
+    
+    def carregar(self, execucao_id):
+        """Retorna a lista de BDRs da execução, ou None se ela não existir"""
+        with self._lock, self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT bdrs FROM execucoes WHERE id = ?", (execucao_id,)
+            ).fetchone()
+        return json.loads(linha[0]) if linha else None
+    
+    def registrar(self, execucao_id, ticker, dados):
+        """Grava o resultado de um ticker; dados None marca falha, que será repetida ao retomar"""
+        payload = pickle.dumps(dados, protocol=pickle.HIGHEST_PROTOCOL) if dados else None
+        with self._lock, self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tickers VALUES (?, ?, ?, ?, ?)",
+                (execucao_id, ticker, int(bool(dados)), payload, time.time())
+            )
+    
+    def concluidos(self, execucao_id):
+        """Dados brutos dos tickers já buscados com sucesso na execução"""
+        with self._lock, self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT ticker, dados FROM tickers WHERE execucao_id = ? AND sucesso = 1",
+                (execucao_id,)
+            ).fetchall()
+        return {ticker: pickle.loads(dados) for ticker, dados in linhas}
+    
+    def em_andamento(self, janela=JANELA_ATIVIDADE):
+        """ID da execução não concluída com atividade (criação ou ticker gravado) nos últimos janela
+        segundos, de qualquer processo, ou None. Uma execução interrompida deixa de contar após a janela"""
+        with self._lock, self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT e.id FROM execucoes e LEFT JOIN tickers t ON t.execucao_id = e.id "
+                "WHERE e.concluida = 0 GROUP BY e.id "
+                "HAVING MAX(e.criada_em, COALESCE(MAX(t.atualizado_em), 0)) >= ? "
+                "ORDER BY e.criada_em DESC LIMIT 1",
+                (time.time() - janela,)
+            ).fetchone()
+        return linha[0] if linha else None
+    
+    def finalizar(self, execucao_id):
+        with self._lock, self._conectar() as conn:
+            conn.execute("UPDATE execucoes SET concluida = 1 WHERE id = ?", (execucao_id,))
+    
+    def interrompida_mais_recente(self):
+        """Resumo da última execução não concluída, ou None"""
+        with self._lock, self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT id, bdrs FROM execucoes WHERE concluida = 0 ORDER BY criada_em DESC LIMIT 1"
+            ).fetchone()
+            if not linha:
+                return None
+            sucessos, falhas = conn.execute(
+                "SELECT COALESCE(SUM(sucesso), 0), COALESCE(SUM(1 - sucesso), 0) "
+                "FROM tickers WHERE execucao_id = ?",
+                (linha[0],)
+            ).fetchone()
+        tickers = {b['ticker_us'] for b in json.loads(linha[1])}
+        return {'id': linha[0], 'tickers': len(tickers), 'sucessos': sucessos, 'falhas': falhas}
+    
+    def _limpar_antigas(self, conn, manter=MAX_EXECUCOES_GUARDADAS):
+        antigas = [linha[0] for linha in conn.execute(
+            "SELECT id FROM execucoes ORDER BY criada_em DESC LIMIT -1 OFFSET ?", (manter,)
+        ).fetchall()]
+        for execucao_id in antigas:
+            conn.execute("DELETE FROM tickers WHERE execucao_id = ?", (execucao_id,))
+            conn.execute("DELETE FROM execucoes WHERE id = ?", (execucao_id,))
+
+@lru_cache(maxsize=None)
+def obter_checkpoints():
+    return CheckpointExecucoes()
+
+# Índice persistente do universo de BDRs
+INTERVALO_UNIVERSO = 3600  # Intervalo mínimo entre verificações da lista na BRAPI, em segundos
+
+class IndiceUniverso:
+    """Lista de BDRs resolvidas (bdr → ticker_us, nome, visto_em) em disco, compartilhada entre processos
+    e atualizada só com as diferenças da lista da BRAPI"""
+    
+    def __init__(self, diretorio=DIRETORIO_CACHE):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, 'universo.sqlite')
+        self._lock = threading.Lock()
+        with self._conectar() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bdrs (
+                    bdr TEXT PRIMARY KEY,
+                    ticker_us TEXT NOT NULL,
+                    nome TEXT,
+                    ordem INTEGER NOT NULL,
+                    visto_em REAL NOT NULL,
+                    ativa INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadados (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT
+                )
+            """)
+    
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30)
+    
+    def metadados(self):
+        """ETag, Last-Modified, hash do conteúdo e momento da última verificação"""
+        with self._lock, self._conectar() as conn:
+            return dict(conn.execute("SELECT chave, valor FROM metadados").fetchall())
+    
+    def _gravar_metadados(self, conn, **valores):
+        conn.executemany(
+            "INSERT OR REPLACE INTO metadados VALUES (?, ?)",
+            [(chave, None if valor is None else str(valor)) for chave, valor in valores.items()]
+        )
+    
+    def recente(self, intervalo=INTERVALO_UNIVERSO):
+        verificado_em = self.metadados().get('verificado_em')
+        return verificado_em is not None and time.time() - float(verificado_em) < intervalo
+    
+    def listar(self):
+        """BDRs ativas, na ordem da BRAPI"""
+        with self._lock, self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT bdr, ticker_us, nome FROM bdrs WHERE ativa = 1 ORDER BY ordem"
+            ).fetchall()
+        return [{'bdr': bdr, 'ticker_us': ticker_us, 'nome': nome} for bdr, ticker_us, nome in linhas]
+    
+    def confirmar(self, etag=None, modificado_em=None):
+        """Lista inalterada no servidor (304): só marca as BDRs como vistas agora"""
+        agora = time.time()
+        with self._lock, self._conectar() as conn:
+            conn.execute("UPDATE bdrs SET visto_em = ? WHERE ativa = 1", (agora,))
+            self._gravar_metadados(conn, verificado_em=agora, **(
+                {'etag': etag, 'modificado_em': modificado_em} if etag or modificado_em else {}
+            ))
+    
+    def aplicar(self, bdrs, etag=None, modificado_em=None):
+        """Aplica a lista recém-baixada, gravando só as BDRs novas, alteradas ou removidas.
+        Retorna a quantidade de cada uma"""
+        agora = time.time()
+        conteudo = json.dumps([[b['bdr'], b['ticker_us'], b['nome']] for b in bdrs])
+        hash_conteudo = hashlib.sha256(conteudo.encode()).hexdigest()
+        diferencas = {'novas': 0, 'alteradas': 0, 'removidas': 0}
+        
+        with self._lock, self._conectar() as conn:
+            hash_anterior = conn.execute(
+                "SELECT valor FROM metadados WHERE chave = 'hash'"
+            ).fetchone()
+            if not hash_anterior or hash_anterior[0] != hash_conteudo:
+                atuais = {
+                    bdr: (ticker_us, nome, ordem, ativa)
+                    for bdr, ticker_us, nome, ordem, ativa in conn.execute(
+                        "SELECT bdr, ticker_us, nome, ordem, ativa FROM bdrs"
+                    )
+                }
+                mudancas = []
+                for ordem, b in enumerate(bdrs):
+                    anterior = atuais.get(b['bdr'])
+                    if anterior == (b['ticker_us'], b['nome'], ordem, 1):
+                        continue
+                    diferencas['novas' if anterior is None or not anterior[3] else 'alteradas'] += 1
+                    mudancas.append((b['bdr'], b['ticker_us'], b['nome'], ordem, agora))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bdrs (bdr, ticker_us, nome, ordem, visto_em, ativa) "
+                    "VALUES (?, ?, ?, ?, ?, 1)",
+                    mudancas
+                )
+                
+                # BDRs que sumiram da BRAPI são desativadas, mantendo a data em que foram vistas por último
+                presentes = {b['bdr'] for b in bdrs}
+                removidas = [(bdr,) for bdr, (_, _, _, ativa) in atuais.items() if ativa and bdr not in presentes]
+                conn.executemany("UPDATE bdrs SET ativa = 0 WHERE bdr = ?", removidas)
+                diferencas['removidas'] = len(removidas)
+            
+            conn.execute("UPDATE bdrs SET visto_em = ? WHERE ativa = 1", (agora,))
+            self._gravar_metadados(
+                conn, etag=etag, modificado_em=modificado_em, hash=hash_conteudo, verificado_em=agora
+            )
+        return diferencas
+    
+    def limpar(self):
+        with self._lock, self._conectar() as conn:
+            conn.execute("DELETE FROM bdrs")
+            conn.execute("DELETE FROM metadados")
+
+@lru_cache(maxsize=None)
+def obter_universo_indice():
+    return IndiceUniverso()
+
+# Controle de taxa de requisições
+TAXA_PADRAO = 1.0  # Taxa inicial em requisições por segundo ao Yahoo, somando todos os workers
+TAXA_MINIMA = 0.1
+TAXA_MAXIMA = 5.0
+INCREMENTO_AIMD = 0.02  # Aumento aproximado da taxa, em req/s, a cada segundo sem 429
+WORKERS_PADRAO = 4
+REQUISICOES_POR_TICKER = 3  # info + financials + balance_sheet, sem cache
+
+# Cotações em lote
+TAMANHO_LOTE_COTACOES = 50
+# Campos do get_info() que só vêm para símbolos que o Yahoo conhece. Para um símbolo desconhecido, o
+# yfinance devolve um dict quase vazio (ex: {'trailingPegRatio': None}), não {}
+CAMPOS_IDENTIFICACAO = ('quoteType', 'symbol', 'shortName', 'longName')
+TIPOS_FUNDO = ('ETF', 'MUTUALFUND')  # Têm cotação, mas nunca terão DRE e balanço
+# Com cotação em lote, só estes campos vêm do info (que pode ter até TTL_INFO): os de mercado são da cotação
+CAMPOS_INFO_COM_COTACAO = ('sector', 'industry', *CAMPOS_IDENTIFICACAO)
+RODADAS_FRAGMENTOS = 3  # Vezes que uma empresa-mãe com fragmentos falhos é tentada em uma análise
+
+class LimitadorTaxa:
+    """Limite de requisições por segundo compartilhado entre os workers. Cada chamada reserva o
+    próximo horário livre, em ordem de chegada, e dorme até ele: nenhum worker fica sem vez"""
+    
+    def __init__(self, taxa=TAXA_PADRAO):
+        self.taxa = taxa
+        self._proximo = time.monotonic()  # Próximo horário livre
+        self.requisicoes = 0  # Horários concedidos: uma requisição cada, contando retentativas
+        self._lock = threading.Lock()
+    
+    def adquirir(self):
+        """Bloqueia até o horário reservado para esta requisição"""
+        with self._lock:
+            self.requisicoes += 1
+            horario = max(time.monotonic(), self._proximo)
+            self._proximo = horario + 1 / self.taxa
+        espera = horario - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+class ControladorTaxa(LimitadorTaxa):
+    """Limitador com ajuste AIMD: sobe a taxa devagar a cada sucesso e corta pela metade a cada 429"""
+    
+    def __init__(self, taxa=TAXA_PADRAO, taxa_min=TAXA_MINIMA, taxa_max=TAXA_MAXIMA,
+                 incremento=INCREMENTO_AIMD):
+        super().__init__(taxa)
+        self.taxa_min = taxa_min
+        self.taxa_max = taxa_max
+        self.incremento = incremento
+        self.erros_429 = 0
+        self.sucessos = 0
+        self.pausado_ate = 0.0
+    
+    def definir_taxa_maxima(self, taxa_max):
+        with self._lock:
+            self.taxa_max = max(taxa_max, self.taxa_min)
+            self.taxa = min(self.taxa, self.taxa_max)
+    
+    def adquirir(self):
+        """Espera a pausa pedida pelo servidor (Retry-After), se houver, e depois o horário reservado"""
+        while True:
+            pausa = self.pausado_ate - time.monotonic()
+            if pausa <= 0:
+                break
+            time.sleep(pausa)
+        super().adquirir()
+    
+    def registrar_sucesso(self):
+        with self._lock:
+            self.sucessos += 1
+            # Dividir pela taxa torna o aumento linear no tempo, não no número de requisições
+            self.taxa = min(self.taxa_max, self.taxa + self.incremento / self.taxa)
+    
+    def registrar_429(self, retry_after=None):
+        with self._lock:
+            self.erros_429 += 1
+            self.taxa = max(self.taxa_min, self.taxa / 2)
+            # Próximas reservas só depois de um intervalo na nova taxa (e da pausa pedida pelo servidor)
+            self._proximo = max(self._proximo, time.monotonic() + 1 / self.taxa)
+            if retry_after:
+                self.pausado_ate = max(self.pausado_ate, time.monotonic() + retry_after)
+                self._proximo = max(self._proximo, self.pausado_ate)
+
+@lru_cache(maxsize=None)
+def obter_controlador():
+    return ControladorTaxa()
+
+class BuscaIncompleta(Exception):
+    """Fragmentos (endpoints) da empresa-mãe que falharam mesmo após as retentativas. Os que deram certo
+    ficam em parciais, e uma nova chamada com eles busca só o que falta"""
+    
+    def __init__(self, ticker, erros, parciais):
+        super().__init__(f"{ticker}: " + "; ".join(f"{endpoint}: {erro}" for endpoint, erro in erros.items()))
+        self.ticker = ticker
+        self.erros = erros
+        self.parciais = parciais
+
+def eh_erro_429(erro):
+    if isinstance(erro, BuscaIncompleta):
+        return any(eh_erro_429(e) for e in erro.erros.values())
+    resposta = getattr(erro, 'response', None)
+    return getattr(resposta, 'status_code', None) == 429 or "429" in str(erro)
+
+def _retry_after(erro):
+    """Extrai o header Retry-After (segundos ou data HTTP) de um erro de requisição"""
+    resposta = getattr(erro, 'response', None)
+    valor = getattr(resposta, 'headers', None) or {}
+    valor = valor.get('Retry-After')
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _requisitar(funcao, controlador, max_tentativas=3, etapa='requisicao'):
+    """Executa uma requisição respeitando o controlador de taxa, repetindo-a em caso de 429"""
+    metricas = obter_metricas()
+    for tentativa in range(1, max_tentativas + 1):
+        with metricas.cronometrar('espera_taxa'):
+            controlador.adquirir()
+        try:
+            with metricas.cronometrar(etapa):
+                resultado = funcao()
+        except Exception as e:
+            if not eh_erro_429(e):
+                metricas.incrementar('erros', etapa=etapa)
+                raise
+            metricas.incrementar('erros_429', etapa=etapa)
+            controlador.registrar_429(_retry_after(e))
+            if tentativa == max_tentativas:
+                raise
+            metricas.incrementar('retentativas', etapa=etapa)
+            continue
+        controlador.registrar_sucesso()
+        return resultado
+
+def _resolver_bdrs(dados):
+    """Filtra as BDRs da lista de ativos da BRAPI e resolve o ticker da empresa-mãe"""
+    bdrs_raw = [d for d in dados if d['stock'].endswith(TERMINACOES_BDR)]
+    
+    bdrs_processadas = []
+    for bdr in bdrs_raw:
+        ticker_bdr = bdr['stock']
+        ticker_us = MAPA_BDRS_COMPLETO.get(ticker_bdr)
+        
+        if not ticker_us:
+            ticker_us = ''.join([c for c in ticker_bdr if c.isalpha()])
+        
+        if ticker_us:
+            bdrs_processadas.append({
+                'bdr': ticker_bdr,
+                'ticker_us': ticker_us,
+                'nome': bdr.get('name', ticker_bdr)
+            })
+    
+    return bdrs_processadas
+
+def obter_universo(forcar_atualizacao=False, provedor=None, indice=None, intervalo=INTERVALO_UNIVERSO):
+    """Lista de BDRs do índice em disco. A BRAPI é consultada no máximo uma vez por intervalo,
+    com requisição condicional (ETag/If-Modified-Since), e só as diferenças são gravadas"""
+    indice = indice or obter_universo_indice()
+    metricas = obter_metricas()
+    if not forcar_atualizacao and indice.recente(intervalo):
+        metricas.incrementar('universo', resultado='recente')
+        return indice.listar()
+    
+    # requests só é carregado ao consultar a BRAPI, não na abertura do app
+    import requests
+    
+    provedor = provedor or obter_provedor()
+    metadados = {} if forcar_atualizacao else indice.metadados()
+    try:
+        with metricas.cronometrar('lista_brapi'):
+            dados, etag, modificado_em = provedor.listar_acoes_condicional(
+                metadados.get('etag'), metadados.get('modificado_em')
+            )
+    except (requests.RequestException, ValueError):
+        # BRAPI fora do ar, timeout ou resposta que não é JSON: o índice anterior cobre a análise, e a
+        # BRAPI é consultada de novo na próxima. Sem índice, não há como seguir
+        metricas.incrementar('universo', resultado='erro')
+        bdrs = indice.listar()
+        if not bdrs:
+            raise
+        return bdrs
+    
+    if dados is None:
+        indice.confirmar(etag, modificado_em)
+        metricas.incrementar('universo', resultado='nao_modificado')
+        return indice.listar()
+    
+    bdrs = _resolver_bdrs(dados)
+    if not bdrs:
+        # Resposta vazia é tratada como falha da BRAPI: mantém o índice anterior e tenta de novo na próxima
+        metricas.incrementar('universo', resultado='vazio')
+        return indice.listar()
+    
+    diferencas = indice.aplicar(bdrs, etag, modificado_em)
+    metricas.incrementar('universo', resultado='alterado' if any(diferencas.values()) else 'sem_alteracoes')
+    return indice.listar()
+
+def _normalizar_cotacao(cotacao):
+    """Converte um item da API de cotações para as mesmas chaves de get_info()"""
+    dividend_yield = cotacao.get('dividendYield')
+    return {
+        'currentPrice': cotacao.get('regularMarketPrice'),
+        'previousClose': cotacao.get('regularMarketPreviousClose'),
+        'trailingPE': cotacao.get('trailingPE'),
+        'forwardPE': cotacao.get('forwardPE'),
+        'priceToBook': cotacao.get('priceToBook'),
+        # Na API de cotações o dividendYield já vem em %, no get_info() vem em fração
+        'dividendYield': dividend_yield / 100 if dividend_yield else None,
+        'trailingAnnualDividendYield': cotacao.get('trailingAnnualDividendYield'),
+        'marketCap': cotacao.get('marketCap'),
+        'quoteType': cotacao.get('quoteType'),
+        # Próxima divulgação de resultado (epoch): estima quando sai o próximo anual
+        'earningsTimestamp': cotacao.get('earningsTimestamp') or cotacao.get('earningsTimestampStart'),
+    }
+
+def buscar_cotacoes_em_lote(tickers, forcar_atualizacao=False, cache=None, controlador=None,
+                            provedor=None):
+    """Busca preço, P/E, P/B, DY e market cap de vários tickers por requisição e grava no cache.
+    Retorna o número de requisições feitas"""
+    cache = cache or obter_cache()
+    controlador = controlador or obter_controlador()
+    provedor = provedor or obter_provedor()
+    
+    sem_dados = {} if forcar_atualizacao else cache.sem_dados()
+    pendentes = [
+        t for t in tickers
+        if t not in sem_dados and (forcar_atualizacao or cache.espiar(t, 'cotacao') is None)
+    ]
+    if not pendentes:
+        return 0
+    
+    requisicoes = 0
+    for inicio in range(0, len(pendentes), TAMANHO_LOTE_COTACOES):
+        lote = pendentes[inicio:inicio + TAMANHO_LOTE_COTACOES]
+        requisicoes += 1
+        try:
+            cotacoes = _requisitar(lambda: provedor.cotacoes(lote), controlador, etapa='cotacoes_lote')
+        except Exception:
+            # Os tickers do lote caem no get_info() individual, buscado de novo se tiver mais de TTL_COTACAO
+            continue
+        
+        for cotacao in cotacoes:
+            if cotacao.get('symbol') in lote:
+                cache.gravar(cotacao['symbol'], 'cotacao', _normalizar_cotacao(cotacao))
+    
+    return requisicoes
+
+def _ultimo_periodo(*demonstrativos):
+    """Data de fim do exercício mais recente nas colunas dos demonstrativos, ou None"""
+    datas = pd.to_datetime(
+        [c for d in demonstrativos for c in d.columns], errors='coerce', format='mixed'
+    ).dropna()
+    return datas.max() if len(datas) else None
+
+def _buscar_fragmento(ticker_us, endpoint, provedor, controlador, max_tentativas):
+    """Um fragmento da empresa-mãe (info, financials ou balance_sheet), com retentativas só dele"""
+    buscar = {'info': provedor.info, 'financials': provedor.financials, 'balance_sheet': provedor.balance_sheet}[endpoint]
+    return _requisitar(lambda: buscar(ticker_us), controlador, max_tentativas, ETAPAS_FRAGMENTOS[endpoint])
+
+def buscar_dados_empresa_mae(ticker_us, max_tentativas=3, forcar_atualizacao=False,
+                             cache=None, controlador=None, provedor=None, renovar=(), parciais=None,
+                             cancelar=None):
+    """Info e demonstrativos brutos da empresa americana, fragmento a fragmento, com cache e retentativas.
+    Se um demonstrativo falhar, levanta BuscaIncompleta; o mesmo dict em parciais retoma de onde parou"""
+    parciais = {} if parciais is None else parciais
+    try:
+        cache = cache or obter_cache()
+        controlador = controlador or obter_controlador()
+        provedor = provedor or obter_provedor()
+        metricas = obter_metricas()
+        
+        if not forcar_atualizacao and cache.espiar(ticker_us, 'sem_dados', TTL_SEM_DADOS) is not None:
+            metricas.incrementar('sem_dados_ignorados')
+            return None
+        
+        # Cotação vem do estágio em lote; get_info() só é buscado quando o setor não está em cache
+        cotacao = cache.espiar(ticker_us, 'cotacao') or {}
+        # Demonstrativos só são baixados de novo quando um novo exercício provavelmente já saiu; no dia a dia,
+        # só a cotação (em lote) é atualizada
+        calendario = cache.calendario(ticker_us)
+        novo_periodo = calendario is not None and time.time() >= calendario['proximo_relatorio']
+        if novo_periodo and not parciais:
+            metricas.incrementar('verificacoes_novo_periodo')
+        
+        erros = {}
+        
+        def obter_fragmento(endpoint):
+            """Parcial de uma tentativa anterior, cache ou rede; None se a busca falhou"""
+            if endpoint in parciais:
+                metricas.incrementar('fragmentos_reaproveitados', endpoint=endpoint)
+                return parciais[endpoint]
+            # Endpoints em renovar são buscados de novo mesmo dentro do TTL (ex: pelo aquecimento do cache)
+            ignorar_cache = (forcar_atualizacao or endpoint in renovar
+                             or (novo_periodo and endpoint in ENDPOINTS_DEMONSTRATIVOS))
+            # Sem cotação em lote (ex: o lote falhou), preço, P/E, DY e market cap vêm do info: só vale
+            # um info com a idade de uma cotação, e não o de até TTL_INFO
+            ttl = TTL_COTACAO if endpoint == 'info' and not cotacao else None
+            valor = None if ignorar_cache else cache.obter(ticker_us, endpoint, ttl)
+            if valor is not None:
+                return valor
+            # Busca cancelada (ex: prazo da análise atingido): o que depende da rede falha sem requisição
+            if cancelar is not None and cancelar.is_set():
+                erros[endpoint] = RuntimeError("busca cancelada")
+                return None
+            try:
+                valor = _buscar_fragmento(ticker_us, endpoint, provedor, controlador, max_tentativas)
+            except Exception as e:
+                metricas.incrementar('fragmentos_falhos', endpoint=endpoint)
+                erros[endpoint] = e
+                return None
+            parciais[endpoint] = valor
+            if endpoint == 'info' and valor and len(valor) > 5:
+                cache.gravar(ticker_us, 'info', valor)
+            elif endpoint != 'info' and valor is not None and not valor.empty:
+                cache.gravar(ticker_us, endpoint, valor)
+            return valor
+        
+        info = obter_fragmento('info')
+        
+        # Info respondido sem identificação e ticker ausente da cotação em lote: o Yahoo não conhece o símbolo
+        if info is not None and not any(info.get(c) for c in CAMPOS_IDENTIFICACAO) and not cotacao:
+            cache.marcar_sem_dados(ticker_us, "sem cotação nem info no Yahoo")
+            return None
+        
+        # Com cotação em lote, preço, múltiplos, DY e market cap são só dela, mesmo vazios: um info antigo
+        # não os completa. Um info que falhou não impede o resultado: só o setor fica para a próxima análise
+        if cotacao:
+            info = {
+                **{k: v for k, v in (info or {}).items() if k in CAMPOS_INFO_COM_COTACAO},
+                **{k: v for k, v in cotacao.items() if v is not None or k not in CAMPOS_INFO_COM_COTACAO},
+            }
+        info = info or {}
+        if len(info) < 5:
+            if erros:
+                raise BuscaIncompleta(ticker_us, erros, parciais)
+            return None
+        
+        # Um demonstrativo que falha não impede a busca do outro
+        dre = obter_fragmento('financials')
+        balanco = obter_fragmento('balance_sheet')
+        if any(endpoint in erros for endpoint in ENDPOINTS_DEMONSTRATIVOS):
+            raise BuscaIncompleta(ticker_us, erros, parciais)
+        
+        if info.get('quoteType') in TIPOS_FUNDO:
+            cache.marcar_sem_dados(ticker_us, f"{info['quoteType']} sem demonstrativos no Yahoo")
+            return None
+        # Demonstrativos vazios de uma empresa não vão para o cache negativo: o yfinance também devolve
+        # DataFrame vazio quando a requisição falha (ex: 429), e a empresa sumiria por TTL_SEM_DADOS
+        if dre is None or balanco is None or dre.empty or balanco.empty:
+            return None
+        
+        # Demonstrativos recém-baixados, ou em cache de antes do calendário: atualiza o calendário do ticker
+        if any(endpoint in parciais for endpoint in ENDPOINTS_DEMONSTRATIVOS) or calendario is None:
+            ultimo_periodo = _ultimo_periodo(dre, balanco)
+            if ultimo_periodo is not None:
+                cache.registrar_periodo(ticker_us, ultimo_periodo, info.get('earningsTimestamp'))
+        
+        return {'info': info, 'financials': dre, 'balance_sheet': balanco}
+    except BuscaIncompleta:
+        raise
+    except Exception:
+        return None
+
+def extrair_dados_mercado(info):
+    """Extrai preço, múltiplos, DY, market cap e setor do info (já mesclado com a cotação)"""
+    preco_atual = (info.get('currentPrice') or 
+                  info.get('regularMarketPrice') or 
+                  info.get('previousClose'))
+    
+    pe_ratio = (info.get('trailingPE') or info.get('forwardPE'))
+    pb_ratio = info.get('priceToBook')
+    
+    dividend_yield = 0
+    if info.get('dividendYield'):
+        dividend_yield = info.get('dividendYield') * 100
+    elif info.get('trailingAnnualDividendYield'):
+        dividend_yield = info.get('trailingAnnualDividendYield') * 100
+    
+    market_cap = (info.get('marketCap') or info.get('enterpriseValue') or 0) / 1e9
+    setor = info.get('sector') or info.get('industry') or 'N/A'
+    
+    return {
+        'preco': preco_atual,
+        'pe': pe_ratio,
+        'pb': pb_ratio,
+        'dividend_yield': dividend_yield,
+        'market_cap': market_cap,
+        'setor': setor
+    }
+
+def montar_painel(demonstrativos):
+    """Empilha os demonstrativos brutos de vários tickers em um painel com índice (ticker, periodo)
+    e colunas canônicas, aplicando o mapeamento de aliases uma única vez"""
+    partes = []
+    for ticker, brutos in demonstrativos.items():
+        for origem in ('financials', 'balance_sheet'):
+            df = brutos.get(origem)
+            if df is None or df.empty:
+                continue
+            # yfinance traz os itens nas linhas e os períodos (mais recente primeiro) nas colunas
+            longo = (
+                df.iloc[:, :PERIODOS]
+                .rename_axis('item')
+                .reset_index()
+                .melt(id_vars='item', var_name='periodo', value_name='valor')
+            )
+            longo['ticker'] = ticker
+            longo['origem'] = origem
+            partes.append(longo)
+    
+    campos = list(ALIASES_DEMONSTRATIVOS)
+    if not partes:
+        indice = pd.MultiIndex.from_arrays([[], []], names=['ticker', 'periodo'])
+        return pd.DataFrame(columns=campos, index=indice, dtype=float)
+    
+    longo = pd.concat(partes, ignore_index=True)
+    longo['valor'] = pd.to_numeric(longo['valor'], errors='coerce')
+    
+    mapa = pd.DataFrame(
+        [
+            (origem, alias, campo, prioridade)
+            for campo, (origem, aliases) in ALIASES_DEMONSTRATIVOS.items()
+            for prioridade, alias in enumerate(aliases)
+        ],
+        columns=['origem', 'item', 'campo', 'prioridade']
+    )
+    longo = longo.merge(mapa, on=['origem', 'item'])
+    
+    # Vale o primeiro alias presente em cada ticker, mesmo com períodos vazios
+    longo = longo[longo['prioridade'] == longo.groupby(['ticker', 'campo'])['prioridade'].transform('min')]
+    
+    # Tickers sem algum campo obrigatório ficam de fora
+    obrigatorios = longo[longo['campo'].isin(CAMPOS_OBRIGATORIOS)].groupby('ticker')['campo'].nunique()
+    completos = obrigatorios.index[obrigatorios == len(CAMPOS_OBRIGATORIOS)]
+    longo = longo[longo['ticker'].isin(completos)]
+    
+    return (
+        longo.set_index(['ticker', 'periodo', 'campo'])['valor']
+        .unstack('campo')
+        .reindex(columns=campos)
+        .sort_index()
+    )
+
+def _cagr(serie):
+    """CAGR (%) entre o primeiro e o último período válido de cada ticker"""
+    por_ticker = serie.dropna().groupby(level='ticker')
+    primeiro, ultimo, n = por_ticker.first(), por_ticker.last(), por_ticker.size()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cagr = ((ultimo / primeiro) ** (1 / (n - 1)) - 1) * 100
+    return cagr.where((n > 1) & (primeiro > 0) & (ultimo > 0))
+
+def calcular_indicadores_painel(painel, agregacao='media', crescimento_cagr=False):
+    """Calcula ROE, margem, crescimento, ROA e Dívida/PL de todos os tickers do painel em uma só passada"""
+    painel = painel.sort_index()
+    
+    indicadores = pd.DataFrame({
+        'roe': painel['lucro'] / painel['patrimonio'] * 100,
+        'margem': painel['lucro'] / painel['receita'] * 100,
+        'crescimento': painel.groupby(level='ticker')['receita'].pct_change(fill_method=None) * 100,
+        'roa': painel['lucro'] / painel['ativo_total'] * 100,
+        'dividapl': painel['divida_total'] / painel['patrimonio'] * 100,
+    })
+    
+    agregado = indicadores.groupby(level='ticker').agg(AGREGACOES[agregacao])
+    if crescimento_cagr:
+        agregado['crescimento'] = _cagr(painel['receita'])
+    return agregado
+
+def calcular_indicadores_lote(brutos, agregacao='media', crescimento_cagr=False):
+    """Indicadores fundamentalistas e de mercado por ticker_us, a partir dos dados brutos de buscar_dados_empresa_mae"""
+    with obter_metricas().cronometrar('indicadores'):
+        indicadores = calcular_indicadores_painel(montar_painel(brutos), agregacao, crescimento_cagr)
+        mercado = pd.DataFrame.from_dict(
+            {ticker: extrair_dados_mercado(dados['info']) for ticker, dados in brutos.items()},
+            orient='index',
+            columns=['preco', 'pe', 'pb', 'dividend_yield', 'market_cap', 'setor']
+        )
+        return indicadores.join(mercado, how='inner')
+
+def montar_resultado(plano, indicadores):
+    """Monta a tabela de resultados, uma linha por BDR, a partir dos indicadores por ticker_us"""
+    with obter_metricas().cronometrar('montar_resultado'):
+        bdrs = pd.DataFrame({
+            coluna: [bdr_info[coluna] for grupo in plano.values() for bdr_info in grupo]
+            for coluna in ('bdr', 'ticker_us', 'nome')
+        })
+        df = bdrs.merge(indicadores, left_on='ticker_us', right_index=True, how='inner')
+        pe = pd.to_numeric(df['pe'], errors='coerce')
+        pb = pd.to_numeric(df['pb'], errors='coerce')
+        
+        return compactar_resultado(pd.DataFrame({
+            'BDR': df['bdr'],
+            'Ticker US': df['ticker_us'],
+            'Empresa': df['nome'].str.split().str[0].fillna(df['ticker_us']),
+            'Setor': df['setor'],
+            'ROE (%)': df['roe'].round(2),
+            'Margem (%)': df['margem'].round(2),
+            'Cresc (%)': df['crescimento'].round(2),
+            'Dívida/PL (%)': df['dividapl'].round(2),
+            'P/E': pe.where(pe != 0).round(2),
+            'P/B': pb.where(pb != 0).round(2),
+            'Div Yield (%)': df['dividend_yield'].astype(float).round(2),
+            'Market Cap (B)': df['market_cap'].astype(float).round(2),
+        }).reset_index(drop=True))
+
+def planejar_busca(lista_bdrs):
+    """Agrupa as BDRs por ticker_us, para buscar cada empresa-mãe uma única vez"""
+    plano = {}
+    for bdr_info in lista_bdrs:
+        plano.setdefault(bdr_info['ticker_us'], []).append(bdr_info)
+    return plano
+
+def processar_em_paralelo(plano, n_workers=WORKERS_PADRAO, forcar_atualizacao=False,
+                          cache=None, controlador=None, provedor=None, pode_iniciar=None, prazo_final=None):
+    """Busca as empresas-mãe do plano em um pool e devolve (ticker_us, bdrs, dados, erro) conforme terminam.
+    pode_iniciar(ticker_us, em_andamento) decide na hora se a próxima começa; no prazo_final, para"""
+    # Recursos resolvidos na thread do script, os workers não têm contexto do Streamlit
+    cache = cache or obter_cache()
+    controlador = controlador or obter_controlador()
+    provedor = provedor or obter_provedor()
+    
+    # Fragmentos já obtidos por empresa, mantidos entre as rodadas
+    parciais = {ticker_us: {} for ticker_us in plano}
+    rodadas = dict.fromkeys(plano, 1)
+    fila = deque(plano)
+    futuros = {}
+    cancelar = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=n_workers)
+    
+    def enviar_proximas():
+        # Uma empresa por worker: a decisão de iniciar cada uma é tomada na hora, não na montagem do plano
+        while fila and len(futuros) < n_workers:
+            # Recusada, a empresa espera a próxima conclusão; sem nenhuma em andamento, a fila termina
+            if pode_iniciar is not None and not pode_iniciar(fila[0], list(futuros.values())):
+                if not futuros:
+                    fila.clear()
+                return
+            ticker_us = fila.popleft()
+            futuro = executor.submit(
+                buscar_dados_empresa_mae,
+                ticker_us,
+                forcar_atualizacao=forcar_atualizacao,
+                cache=cache,
+                controlador=controlador,
+                provedor=provedor,
+                parciais=parciais[ticker_us],
+                cancelar=cancelar
+            )
+            futuros[futuro] = ticker_us
+    
+    try:
+        enviar_proximas()
+        while futuros:
+            restante = None if prazo_final is None else prazo_final - time.monotonic()
+            concluidos, _ = wait(futuros, timeout=restante, return_when=FIRST_COMPLETED)
+            if not concluidos:
+                # Prazo atingido: as buscas em andamento param na próxima requisição, sem esperar por elas
+                obter_metricas().incrementar('empresas_canceladas', len(futuros))
+                return
+            for futuro in concluidos:
+                ticker_us = futuros.pop(futuro)
+                try:
+                    dados, erro = futuro.result(), None
+                except Exception as e:
+                    dados, erro = None, e
+                # Fragmento que falhou: a empresa volta ao fim da fila (a taxa já terá se recuperado
+                # quando chegar a vez dela) e busca só o que falta
+                if isinstance(erro, BuscaIncompleta) and rodadas[ticker_us] < RODADAS_FRAGMENTOS:
+                    rodadas[ticker_us] += 1
+                    obter_metricas().incrementar('empresas_reenfileiradas')
+                    fila.append(ticker_us)
+                    continue
+                yield ticker_us, plano[ticker_us], dados, erro
+            enviar_proximas()
+    finally:
+        cancelar.set()
+        executor.shutdown(wait=False, cancel_futures=True)
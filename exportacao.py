@@ -0,0 +1,153 @@
+import gzip
+import io
+import os
+
+import pandas as pd
+
+from metricas import obter_metricas
+from snapshots import DIRETORIO_SNAPSHOTS, iterar_historico
+
+# Exportação da tabela e do histórico em CSV compactado, Parquet e Excel. Os arquivos são escritos
+# em lotes: o histórico inteiro passa dia a dia pelo escritor, sem ser montado na memória
+FORMATOS_EXPORTACAO = {
+    'csv': {'rotulo': 'CSV (gzip)', 'extensao': '.csv.gz', 'mime': 'application/gzip'},
+    'parquet': {'rotulo': 'Parquet', 'extensao': '.parquet', 'mime': 'application/vnd.apache.parquet'},
+    'excel': {
+        'rotulo': 'Excel',
+        'extensao': '.xlsx',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+}
+LINHAS_POR_LOTE = 10_000
+LIMITE_LINHAS_EXCEL = 1_048_576
+
+def formato_por_extensao(caminho):
+    """Formato de exportação a partir do nome do arquivo (ex: historico.csv.gz → csv)"""
+    for formato, descricao in FORMATOS_EXPORTACAO.items():
+        if caminho.endswith(descricao['extensao']):
+            return formato
+    extensoes = ', '.join(d['extensao'] for d in FORMATOS_EXPORTACAO.values())
+    raise ValueError(f"Extensão não reconhecida em {caminho} (use {extensoes})")
+
+class EscritorExportacao:
+    """Escreve lotes de DataFrames com as mesmas colunas em um arquivo (caminho ou objeto binário)"""
+
+    def __init__(self, destino, formato, nome_planilha='BDRs'):
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato desconhecido: {formato}")
+        self.destino = destino
+        self.formato = formato
+        self.nome_planilha = nome_planilha
+        self.linhas = 0
+        self._arquivo = None
+        self._esquema = None
+        self._planilha = None
+
+    def __enter__(self):
+        if self.formato == 'csv':
+            # Nível 6 (o padrão do gzip): o 9 custa ~30% mais tempo por ~1% de arquivo. mtime fixo: o mesmo
+            # conteúdo gera sempre os mesmos bytes
+            if isinstance(self.destino, (str, os.PathLike)):
+                self._arquivo = gzip.GzipFile(self.destino, 'wb', compresslevel=6, mtime=0)
+            else:
+                self._arquivo = gzip.GzipFile(fileobj=self.destino, mode='wb', compresslevel=6, mtime=0)
+        elif self.formato == 'excel':
+            from openpyxl import Workbook
+            # write_only grava as linhas em disco à medida que chegam
+            self._arquivo = Workbook(write_only=True)
+            self._planilha = self._arquivo.create_sheet(self.nome_planilha)
+        return self
+
+    def escrever(self, lote):
+        if self.formato == 'csv':
+            texto = io.TextIOWrapper(self._arquivo, encoding='utf-8', newline='')
+            lote.to_csv(texto, index=False, header=self.linhas == 0)
+            texto.detach()
+        elif self.formato == 'parquet':
+            self._escrever_parquet(lote)
+        else:
+            self._escrever_excel(lote)
+        self.linhas += len(lote)
+
+    def _escrever_parquet(self, lote):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Categorias viram texto: o dicionário de cada lote é diferente, e o Parquet já compacta as repetições
+        lote = lote.astype({c: object for c, tipo in lote.dtypes.items() if isinstance(tipo, pd.CategoricalDtype)})
+        tabela = pa.Table.from_pandas(lote, preserve_index=False)
+        if self._arquivo is None:
+            self._esquema = tabela.schema
+            self._arquivo = pq.ParquetWriter(self.destino, self._esquema, compression='zstd')
+        self._arquivo.write_table(tabela.cast(self._esquema))
+
+    def _escrever_excel(self, lote):
+        if self.linhas + len(lote) + 1 > LIMITE_LINHAS_EXCEL:
+            raise ValueError(f"O Excel aceita no máximo {LIMITE_LINHAS_EXCEL} linhas: use CSV ou Parquet")
+        if self.linhas == 0:
+            self._planilha.append(list(lote.columns))
+        # float32 de volta a float64 em 2 casas, como na pontuação: senão a planilha mostraria 15.670000076
+        lote = lote.astype({c: 'float64' for c, tipo in lote.dtypes.items() if tipo == 'float32'}).round(2)
+        valores = lote.astype(object).where(lote.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            self._planilha.append(linha)
+
+    def __exit__(self, tipo, erro, rastreamento):
+        if self.formato == 'excel':
+            self._arquivo.save(self.destino)
+        elif self._arquivo is not None:
+            self._arquivo.close()
+        return False
+
+def exportar(df, formato):
+    """Bytes do DataFrame no formato pedido (ex: a tabela filtrada, para o botão de download)"""
+    with obter_metricas().cronometrar('exportacao'):
+        destino = io.BytesIO()
+        with EscritorExportacao(destino, formato) as escritor:
+            for inicio in range(0, max(len(df), 1), LINHAS_POR_LOTE):
+                escritor.escrever(df.iloc[inicio:inicio + LINHAS_POR_LOTE])
+        return destino.getvalue()
+
+def exportar_historico(destino, formato=None, colunas=None, bdrs=None, desde=None, ate=None,
+                       diretorio=DIRETORIO_SNAPSHOTS):
+    """Grava o histórico dos snapshots (linha mais recente de cada BDR por dia) em destino, um dia por vez.
+    Retorna a quantidade de linhas gravadas"""
+    formato = formato or formato_por_extensao(str(destino))
+    with obter_metricas().cronometrar('exportacao'):
+        # Grava em arquivo temporário e renomeia, para nunca expor uma exportação pela metade
+        temporario = f"{destino}.tmp"
+        try:
+            with EscritorExportacao(temporario, formato, nome_planilha='Histórico') as escritor:
+                # Dias agrupados em lotes de ~LINHAS_POR_LOTE linhas: escrever dia a dia (centenas de
+                # linhas) gastaria mais tempo com o overhead por chamada do que com os dados
+                lote, linhas_lote = [], 0
+                for dia in iterar_historico(colunas, bdrs, desde, ate, diretorio):
+                    lote.append(dia)
+                    linhas_lote += len(dia)
+                    if linhas_lote >= LINHAS_POR_LOTE:
+                        escritor.escrever(pd.concat(lote, ignore_index=True))
+                        lote, linhas_lote = [], 0
+                if lote:
+                    escritor.escrever(pd.concat(lote, ignore_index=True))
+            if not escritor.linhas:
+                raise ValueError("Nenhum snapshot no intervalo pedido")
+            os.replace(temporario, destino)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return escritor.linhas
+
+def historico_em_cache(diretorio, formato, versao, desde=None, diretorio_snapshots=DIRETORIO_SNAPSHOTS):
+    """Caminho da exportação do histórico desde a data, gerada uma vez por versão do último snapshot.
+    Exportações de versões anteriores são apagadas"""
+    os.makedirs(diretorio, exist_ok=True)
+    sufixo = desde.strftime('%Y%m%d') if desde else 'tudo'
+    nome = f"historico_{versao}_{sufixo}{FORMATOS_EXPORTACAO[formato]['extensao']}"
+    caminho = os.path.join(diretorio, nome)
+    if not os.path.exists(caminho):
+        for antigo in os.listdir(diretorio):
+            if antigo.startswith('historico_') and not antigo.startswith(f"historico_{versao}_"):
+                os.remove(os.path.join(diretorio, antigo))
+        exportar_historico(caminho, formato, desde=desde, diretorio=diretorio_snapshots)
+    return caminho
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Índice de filtros da tabela de resultados, construído uma vez por resultado (e por conjunto de critérios),
+# para que cada tecla digitada na busca não varra o DataFrame inteiro
+COLUNAS_FILTRO = ('Status', 'Setor', 'Tamanho')
+COLUNAS_BUSCA = ('BDR', 'Ticker US', 'Empresa')
+SEPARADOR_CAMPOS = '\x1f'
+SEPARADOR_LINHAS = '\n'
+FRACAO_BUSCA_RARA = 64  # Acima de 1/64 das linhas encontradas, a busca passa a testar linha a linha
+
+class IndiceFiltros:
+    """Máscaras booleanas por valor de Status/Setor/Tamanho, listas de opções e chaves de busca
+    em minúsculas concatenadas num único texto"""
+
+    def __init__(self, df):
+        self.df = df
+        self.n = len(df)
+
+        self.opcoes = {}
+        self.mascaras = {}
+        for coluna in COLUNAS_FILTRO:
+            valores = df[coluna].astype(object).to_numpy()
+            opcoes = list(dict.fromkeys(v for v in valores if isinstance(v, str)))
+            self.opcoes[coluna] = sorted(opcoes) if coluna == 'Setor' else opcoes
+            self.mascaras[coluna] = {valor: valores == valor for valor in opcoes}
+
+        # Uma linha por BDR, com os campos separados para a busca nunca casar entre dois campos
+        chaves = df[list(COLUNAS_BUSCA)].astype(str).agg(SEPARADOR_CAMPOS.join, axis=1).str.lower()
+        self.chaves = chaves.tolist()
+        self.texto = SEPARADOR_LINHAS.join(self.chaves) + SEPARADOR_LINHAS
+        self.inicios = np.concatenate([[0], np.cumsum(chaves.str.len().to_numpy() + 1)[:-1]]).astype(np.int64)
+
+    def _mascara_coluna(self, coluna, selecionados):
+        mascaras = self.mascaras[coluna]
+        mascara = np.zeros(self.n, dtype=bool)
+        for valor in selecionados:
+            if valor in mascaras:
+                mascara |= mascaras[valor]
+        return mascara
+
+    def _mascara_busca(self, busca):
+        """Linhas cuja BDR, ticker ou empresa contém o texto (sem diferenciar maiúsculas)"""
+        busca = busca.lower()
+        mascara = np.zeros(self.n, dtype=bool)
+        if SEPARADOR_CAMPOS in busca or SEPARADOR_LINHAS in busca:
+            return mascara
+        # Busca rara: find no texto concatenado, custo proporcional às linhas encontradas. Busca comum
+        # (ex: "a", "34"): um teste por linha nas chaves, custo fixo e sem uma chamada por ocorrência
+        posicoes = []
+        inicio = self.texto.find(busca)
+        while inicio != -1:
+            posicoes.append(inicio)
+            if len(posicoes) > self.n // FRACAO_BUSCA_RARA:
+                return np.fromiter((busca in chave for chave in self.chaves), dtype=bool, count=self.n)
+            # Uma ocorrência basta para a linha: a próxima busca começa na linha seguinte
+            inicio = self.texto.find(busca, self.texto.find(SEPARADOR_LINHAS, inicio) + 1)
+        if posicoes:
+            mascara[np.searchsorted(self.inicios, posicoes, side='right') - 1] = True
+        return mascara
+
+    def mascara(self, selecoes, busca=''):
+        """selecoes: {coluna: valores escolhidos}; colunas ausentes não filtram"""
+        mascara = np.ones(self.n, dtype=bool)
+        for coluna, selecionados in selecoes.items():
+            mascara &= self._mascara_coluna(coluna, selecionados)
+        if busca:
+            mascara &= self._mascara_busca(busca)
+        return mascara
+
+    def filtrar(self, selecoes, busca=''):
+        return self.df[self.mascara(selecoes, busca)]
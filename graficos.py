@@ -0,0 +1,82 @@
+# Figuras da página de resultados. O plotly só é importado ao desenhar o primeiro gráfico,
+# para não pesar na abertura do app nem nas reexecuções sem resultados
+import hashlib
+
+import pandas as pd
+
+# Colunas lidas pelos gráficos: a assinatura só muda quando alguma delas muda
+COLUNAS_GRAFICOS = ['BDR', 'Setor', 'Tamanho', 'Status', 'ROE (%)']
+
+CORES_STATUS = {
+    '🟢 Excelente': '#10b981',
+    '🟡 Bom': '#f59e0b',
+    '🟠 Atenção': '#f97316',
+    '🔴 Fraco': '#ef4444'
+}
+CORES_TAMANHO = {
+    'Mega Cap': '#8b5cf6',
+    'Large Cap': '#3b82f6',
+    'Mid Cap': '#10b981',
+    'Small Cap': '#f59e0b'
+}
+
+def grafico_status(df):
+    """Pizza com a distribuição por status"""
+    import plotly.express as px
+    return px.pie(
+        df,
+        names='Status',
+        title='Distribuição por Status',
+        color='Status',
+        color_discrete_map=CORES_STATUS
+    )
+
+def grafico_tamanho(df):
+    """Pizza com a distribuição por tamanho (market cap)"""
+    import plotly.express as px
+    return px.pie(
+        df,
+        names='Tamanho',
+        title='Distribuição por Tamanho',
+        color='Tamanho',
+        color_discrete_map=CORES_TAMANHO
+    )
+
+def grafico_top_roe(df, n=15):
+    """Barras horizontais com as n BDRs de maior ROE"""
+    import plotly.express as px
+    return px.bar(
+        df.nlargest(n, 'ROE (%)'),
+        x='ROE (%)',
+        y='BDR',
+        orientation='h',
+        title=f'Top {n} por ROE',
+        color='ROE (%)',
+        color_continuous_scale='Greens'
+    )
+
+def grafico_setores(df, n=10):
+    """Barras horizontais com os n setores com mais BDRs"""
+    import plotly.express as px
+    setor_count = df['Setor'].value_counts().head(n)
+    return px.bar(
+        x=setor_count.values,
+        y=setor_count.index,
+        orientation='h',
+        title=f'Top {n} Setores',
+        labels={'x': 'Quantidade', 'y': 'Setor'}
+    )
+
+def assinatura_graficos(df):
+    """Hash das colunas usadas pelos gráficos, para memorizar as figuras de um mesmo resultado"""
+    hashes = pd.util.hash_pandas_object(df[COLUNAS_GRAFICOS], index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+def montar_graficos(df):
+    """As quatro figuras da página de resultados"""
+    return {
+        'status': grafico_status(df),
+        'tamanho': grafico_tamanho(df),
+        'top_roe': grafico_top_roe(df, 15),
+        'setores': grafico_setores(df, 10),
+    }
@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import threading
+import time
+
+import numpy as np
+
+# Instrumentação das etapas da análise: histogramas de duração e contadores por execução
+LIMITES_HISTOGRAMA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIXO_PROMETHEUS = 'bdr'
+
+class MetricasExecucao:
+    """Durações por etapa e contadores (retentativas, cache, bytes) de uma execução, seguro entre threads"""
+
+    def __init__(self):
+        self.iniciada_em = datetime.now()
+        self._duracoes = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def registrar_duracao(self, etapa, segundos):
+        with self._lock:
+            self._duracoes.setdefault(etapa, []).append(segundos)
+
+    @contextmanager
+    def cronometrar(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_duracao(etapa, time.perf_counter() - inicio)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def resumo_etapas(self):
+        """Uma linha por etapa: chamadas, tempo total e percentis, em segundos"""
+        with self._lock:
+            duracoes = {etapa: np.array(valores) for etapa, valores in self._duracoes.items()}
+        return [
+            {
+                'etapa': etapa,
+                'chamadas': len(valores),
+                'total_s': float(valores.sum()),
+                'p50_s': float(np.percentile(valores, 50)),
+                'p95_s': float(np.percentile(valores, 95)),
+                'max_s': float(valores.max()),
+            }
+            for etapa, valores in sorted(duracoes.items())
+        ]
+
+    def contadores(self):
+        """Lista de {'nome', 'rotulos', 'valor'}"""
+        with self._lock:
+            itens = sorted(self._contadores.items())
+        return [{'nome': nome, 'rotulos': dict(rotulos), 'valor': valor} for (nome, rotulos), valor in itens]
+
+    def total(self, nome):
+        """Soma de um contador sobre todos os rótulos"""
+        with self._lock:
+            return sum(valor for (n, _), valor in self._contadores.items() if n == nome)
+
+    def para_json(self):
+        return json.dumps({
+            'iniciada_em': self.iniciada_em.isoformat(timespec='seconds'),
+            'etapas': self.resumo_etapas(),
+            'contadores': self.contadores(),
+        }, indent=2, ensure_ascii=False)
+
+    def para_prometheus(self):
+        """Formato de texto de exposição do Prometheus"""
+        with self._lock:
+            duracoes = {etapa: list(valores) for etapa, valores in self._duracoes.items()}
+            contadores = sorted(self._contadores.items())
+
+        nome = f"{PREFIXO_PROMETHEUS}_etapa_duracao_segundos"
+        linhas = [
+            f"# HELP {nome} Duração de cada etapa da análise",
+            f"# TYPE {nome} histogram",
+        ]
+        for etapa, valores in sorted(duracoes.items()):
+            valores = np.sort(valores)
+            for limite in LIMITES_HISTOGRAMA:
+                acumulado = int(np.searchsorted(valores, limite, side='right'))
+                linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="+Inf"}} {len(valores)}')
+            linhas.append(f'{nome}_sum{{etapa="{etapa}"}} {float(valores.sum())}')
+            linhas.append(f'{nome}_count{{etapa="{etapa}"}} {len(valores)}')
+
+        tipos_declarados = set()
+        for (contador, rotulos), valor in contadores:
+            nome = f"{PREFIXO_PROMETHEUS}_{contador}_total"
+            if nome not in tipos_declarados:
+                linhas.append(f"# TYPE {nome} counter")
+                tipos_declarados.add(nome)
+            texto_rotulos = ','.join(f'{chave}="{rotulo}"' for chave, rotulo in rotulos)
+            linhas.append(f"{nome}{{{texto_rotulos}}} {valor}" if texto_rotulos else f"{nome} {valor}")
+        return '\n'.join(linhas) + '\n'
+
+_metricas = MetricasExecucao()
+
+def obter_metricas():
+    """Métricas da execução atual, compartilhadas pelo processo"""
+    return _metricas
+
+def iniciar_metricas():
+    """Descarta as métricas anteriores e começa a registrar uma nova execução"""
+    global _metricas
+    _metricas = MetricasExecucao()
+    return _metricas
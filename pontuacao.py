@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from metricas import obter_metricas
+
+CRITERIOS = {
+    'excelente': {'roe': 20, 'margem': 15, 'crescimento': 10, 'dividend_yield': 2, 'pe_max': 25, 'dividapl_max': 50},
+    'bom': {'roe': 15, 'margem': 10, 'crescimento': 5, 'dividend_yield': 1, 'pe_max': 35, 'dividapl_max': 100},
+    'atencao': {'roe': 10, 'margem': 5, 'crescimento': 0, 'dividend_yield': 0, 'pe_max': 50}
+}
+
+ROTULOS_CRITERIOS = {
+    'roe': 'ROE mín. (%)',
+    'margem': 'Margem mín. (%)',
+    'crescimento': 'Cresc. mín. (%)',
+    'dividend_yield': 'DY mín. (%)',
+    'pe_max': 'P/E máx.',
+    'dividapl_max': 'Dív/PL máx. (%)',
+}
+
+COLUNAS_RESULTADO = [
+    'BDR', 'Ticker US', 'Empresa', 'Setor', 'Tamanho', 'Status', 'Score',
+    'ROE (%)', 'Margem (%)', 'Cresc (%)', 'Dívida/PL (%)', 'P/E', 'P/B',
+    'Div Yield (%)', 'Market Cap (B)', 'Alertas'
+]
+
+# Esquema compacto do resultado: float32 para os indicadores e category para colunas com poucos valores
+# distintos, que se repetem muito entre snapshots e sessões guardadas em memória
+CATEGORIAS_STATUS = ['🟢 Excelente', '🟡 Bom', '🟠 Atenção', '🔴 Fraco']
+CATEGORIAS_TAMANHO = ['Mega Cap', 'Large Cap', 'Mid Cap', 'Small Cap']
+TIPOS_RESULTADO = {
+    'Empresa': 'category',
+    'Setor': 'category',
+    'Tamanho': pd.CategoricalDtype(CATEGORIAS_TAMANHO),
+    'Status': pd.CategoricalDtype(CATEGORIAS_STATUS),
+    'Alertas': 'category',
+    **{coluna: 'float32' for coluna in [
+        'Score', 'ROE (%)', 'Margem (%)', 'Cresc (%)', 'Dívida/PL (%)',
+        'P/E', 'P/B', 'Div Yield (%)', 'Market Cap (B)'
+    ]},
+}
+
+def compactar_resultado(df):
+    """Converte as colunas presentes para o esquema compacto"""
+    return df.astype({coluna: tipo for coluna, tipo in TIPOS_RESULTADO.items() if coluna in df})
+
+def _indicador(df, coluna):
+    """Coluna como float64 de volta em 2 casas: o float32 guardado (ex: 0.7 → 0.69999999)
+    daria comparações diferentes com os critérios"""
+    return df[coluna].to_numpy(dtype=float).round(2)
+
+def classificar_tamanhos(market_cap):
+    """Classifica empresas por tamanho a partir do market cap em bilhões"""
+    market_cap = np.asarray(market_cap, dtype=float)
+    return np.select(
+        [market_cap >= 200, market_cap >= 10, market_cap >= 2],
+        ['Mega Cap', 'Large Cap', 'Mid Cap'],
+        default='Small Cap'
+    )
+
+def pontuar_bdrs(df, criterios=CRITERIOS):
+    """Calcula Tamanho, Score, Status e Alertas de todas as BDRs de uma vez, a partir dos indicadores"""
+    exc, bom, atencao = criterios['excelente'], criterios['bom'], criterios['atencao']
+    max_score = 6
+    
+    roe = _indicador(df, 'ROE (%)')
+    margem = _indicador(df, 'Margem (%)')
+    crescimento = _indicador(df, 'Cresc (%)')
+    dividapl = _indicador(df, 'Dívida/PL (%)')
+    pe = _indicador(df, 'P/E')
+    dividend_yield = _indicador(df, 'Div Yield (%)')
+    
+    # Comparações com NaN são falsas, como nos if/elif da versão linha a linha
+    with np.errstate(invalid='ignore'):
+        pe_valido = pe > 0
+        dividapl_valido = ~np.isnan(dividapl)
+        
+        score = (
+            np.select([roe >= exc['roe'], roe >= bom['roe']], [1.0, 0.5], 0.0)
+            + np.select([margem >= exc['margem'], margem >= bom['margem']], [1.0, 0.5], 0.0)
+            + np.select([crescimento >= exc['crescimento'], crescimento >= bom['crescimento']], [1.0, 0.5], 0.0)
+            + np.select([dividend_yield >= exc['dividend_yield'], dividend_yield >= bom['dividend_yield']], [1.0, 0.5], 0.0)
+            + np.select([pe_valido & (pe <= exc['pe_max']), pe_valido & (pe <= bom['pe_max'])], [1.0, 0.5], 0.0)
+            + np.select([dividapl_valido & (dividapl < exc['dividapl_max']),
+                         dividapl_valido & (dividapl < bom['dividapl_max'])], [1.0, 0.5], 0.0)
+        )
+        
+        mascaras_alerta = [
+            (~(roe >= bom['roe']), 'ROE baixo'),
+            (~(margem >= bom['margem']), 'Margem baixa'),
+            (~(crescimento >= bom['crescimento']) & (crescimento < 0), 'Receita em queda'),
+            (pe_valido & ~(pe <= bom['pe_max']) & (pe > atencao['pe_max']), 'P/E elevado'),
+            (dividapl_valido & (dividapl >= bom['dividapl_max']), 'Endividamento alto'),
+        ]
+    
+    alertas = np.full(len(df), '', dtype=object)
+    for mascara, texto in mascaras_alerta:
+        alertas = alertas + np.where(mascara, texto + ', ', '')
+    alertas = pd.Series(alertas, index=df.index).str.rstrip(', ').replace('', 'OK')
+    
+    percentual = (score / max_score) * 100
+    status = np.select(
+        [percentual >= 80, percentual >= 60, percentual >= 40],
+        ['🟢 Excelente', '🟡 Bom', '🟠 Atenção'],
+        default='🔴 Fraco'
+    )
+    
+    df = df.assign(
+        Tamanho=classificar_tamanhos(_indicador(df, 'Market Cap (B)')),
+        Status=status,
+        Score=score.round(1),
+        Alertas=alertas
+    )
+    return compactar_resultado(df[COLUNAS_RESULTADO])
+
+def ranquear_bdrs(df, criterios=CRITERIOS):
+    """Pontua e ordena as BDRs, sem nenhuma requisição de rede"""
+    with obter_metricas().cronometrar('pontuacao'):
+        return pontuar_bdrs(df, criterios).sort_values(
+            by=['Score', 'ROE (%)', 'Div Yield (%)'],
+            ascending=[False, False, False]
+        ).reset_index(drop=True)
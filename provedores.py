@@ -0,0 +1,205 @@
+import os
+import pickle
+import random
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+from metricas import obter_metricas
+
+# Provedores de dados: ao vivo (BRAPI + Yahoo), gravação em disco e replay offline
+URL_LISTA_BRAPI = "https://brapi.dev/api/quote/list"
+URL_COTACOES_YAHOO = "https://query1.finance.yahoo.com/v7/finance/quote"
+DIRETORIO_GRAVACOES = os.environ.get(
+    'BDR_GRAVACOES_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gravacoes')
+)
+MODOS_PROVEDOR = ('ao_vivo', 'gravar', 'replay')
+
+class ProvedorAoVivo:
+    """Busca direto na BRAPI e no Yahoo Finance, pela sessão HTTP compartilhada (conexoes.py)"""
+
+    def _yahoo(self):
+        """Singleton do yfinance usando a sessão compartilhada, com pool de conexões e métricas"""
+        from conexoes import obter_sessao
+        from yfinance.data import YfData
+        return YfData(session=obter_sessao())
+
+    def listar_acoes(self):
+        return self.listar_acoes_condicional()[0]
+
+    def listar_acoes_condicional(self, etag=None, modificado_em=None):
+        """(ativos, ETag, Last-Modified) da BRAPI; ativos é None se a lista não mudou (304)"""
+        from conexoes import obter_sessao
+        cabecalhos = {}
+        if etag:
+            cabecalhos['If-None-Match'] = etag
+        if modificado_em:
+            cabecalhos['If-Modified-Since'] = modificado_em
+        r = obter_sessao().get(URL_LISTA_BRAPI, headers=cabecalhos, timeout=30)
+        if r.status_code == 304:
+            return None, etag, modificado_em
+        return r.json().get('stocks', []), r.headers.get('ETag'), r.headers.get('Last-Modified')
+
+    def cotacoes(self, tickers):
+        dados_yahoo = self._yahoo()
+        resposta = dados_yahoo.get_raw_json(
+            URL_COTACOES_YAHOO,
+            params={'symbols': ','.join(tickers), 'formatted': 'false'}
+        )
+        return (resposta.get('quoteResponse') or {}).get('result') or []
+
+    def info(self, ticker):
+        import yfinance as yf
+        self._yahoo()
+        return yf.Ticker(ticker).get_info()
+
+    def financials(self, ticker):
+        import yfinance as yf
+        self._yahoo()
+        return yf.Ticker(ticker).financials
+
+    def balance_sheet(self, ticker):
+        import yfinance as yf
+        self._yahoo()
+        return yf.Ticker(ticker).balance_sheet
+
+class ProvedorGravacao(ProvedorAoVivo):
+    """Busca ao vivo e grava cada resposta em disco, para replay posterior"""
+
+    def __init__(self, diretorio=DIRETORIO_GRAVACOES):
+        self.diretorio = diretorio
+
+    def _gravar(self, endpoint, chave, valor):
+        pasta = os.path.join(self.diretorio, endpoint)
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, f"{chave}.pkl"), 'wb') as arquivo:
+            pickle.dump(valor, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def listar_acoes_condicional(self, etag=None, modificado_em=None):
+        acoes, etag, modificado_em = super().listar_acoes_condicional(etag, modificado_em)
+        if acoes is not None:
+            self._gravar('lista', 'acoes', acoes)
+        return acoes, etag, modificado_em
+
+    def cotacoes(self, tickers):
+        resultado = super().cotacoes(tickers)
+        # Gravadas por ticker, para o replay responder a lotes com qualquer composição
+        for cotacao in resultado:
+            if cotacao.get('symbol'):
+                self._gravar('cotacao', cotacao['symbol'], cotacao)
+        return resultado
+
+    def info(self, ticker):
+        info = super().info(ticker)
+        self._gravar('info', ticker, info)
+        return info
+
+    def financials(self, ticker):
+        dre = super().financials(ticker)
+        self._gravar('financials', ticker, dre)
+        return dre
+
+    def balance_sheet(self, ticker):
+        balanco = super().balance_sheet(ticker)
+        self._gravar('balance_sheet', ticker, balanco)
+        return balanco
+
+class ProvedorReplay:
+    """Responde a partir de uma gravação em disco, com latência e erros 429 simulados.
+
+    latencia: tempo médio por requisição, em segundos (±jitter)
+    prob_429: probabilidade de cada requisição falhar com 429
+    limite_servidor: req/s acima das quais o "servidor" responde 429, com Retry-After
+    """
+
+    def __init__(self, diretorio=DIRETORIO_GRAVACOES, latencia=0.0, jitter=0.5,
+                 prob_429=0.0, limite_servidor=None, retry_after=1.0, semente=None):
+        self.diretorio = diretorio
+        self.latencia = latencia
+        self.jitter = jitter
+        self.prob_429 = prob_429
+        self.limite_servidor = limite_servidor
+        self.retry_after = retry_after
+        self.requisicoes = 0
+        self.erros_429 = 0
+        self._aleatorio = random.Random(semente)
+        self._recentes = deque()
+        self._lock = threading.Lock()
+
+    def _ler(self, endpoint, chave, padrao=None):
+        caminho = os.path.join(self.diretorio, endpoint, f"{chave}.pkl")
+        if not os.path.exists(caminho):
+            return padrao
+        obter_metricas().incrementar('bytes_baixados', os.path.getsize(caminho), host='replay')
+        with open(caminho, 'rb') as arquivo:
+            return pickle.load(arquivo)
+
+    def _simular_requisicao(self):
+        with self._lock:
+            self.requisicoes += 1
+            agora = time.monotonic()
+            self._recentes.append(agora)
+            while self._recentes and agora - self._recentes[0] > 1.0:
+                self._recentes.popleft()
+            excedeu_limite = self.limite_servidor is not None and len(self._recentes) > self.limite_servidor
+            erro_429 = excedeu_limite or self._aleatorio.random() < self.prob_429
+            espera = self.latencia * self._aleatorio.uniform(1 - self.jitter, 1 + self.jitter)
+            if erro_429:
+                self.erros_429 += 1
+
+        time.sleep(max(espera, 0.0))
+        if erro_429:
+            import requests
+            resposta = requests.Response()
+            resposta.status_code = 429
+            resposta.headers['Retry-After'] = str(self.retry_after)
+            raise requests.HTTPError("429 Client Error: Too Many Requests (replay)", response=resposta)
+
+    def listar_acoes(self):
+        self._simular_requisicao()
+        return self._ler('lista', 'acoes', [])
+
+    def listar_acoes_condicional(self, etag=None, modificado_em=None):
+        # Gravações não guardam ETag; o índice do universo compara o hash do conteúdo
+        return self.listar_acoes(), None, None
+
+    def cotacoes(self, tickers):
+        self._simular_requisicao()
+        return [c for c in (self._ler('cotacao', t) for t in tickers) if c]
+
+    def info(self, ticker):
+        self._simular_requisicao()
+        return self._ler('info', ticker, {})
+
+    def financials(self, ticker):
+        self._simular_requisicao()
+        return self._ler('financials', ticker, pd.DataFrame())
+
+    def balance_sheet(self, ticker):
+        self._simular_requisicao()
+        return self._ler('balance_sheet', ticker, pd.DataFrame())
+
+def criar_provedor(modo='ao_vivo', diretorio=DIRETORIO_GRAVACOES, **opcoes_replay):
+    if modo == 'ao_vivo':
+        return ProvedorAoVivo()
+    if modo == 'gravar':
+        return ProvedorGravacao(diretorio)
+    if modo == 'replay':
+        return ProvedorReplay(diretorio, **opcoes_replay)
+    raise ValueError(f"Modo de provedor inválido: {modo} (use um de {', '.join(MODOS_PROVEDOR)})")
+
+_provedor = None
+
+def obter_provedor():
+    """Provedor em uso, definido por BDR_PROVEDOR (ao_vivo, gravar ou replay) se nenhum foi configurado"""
+    global _provedor
+    if _provedor is None:
+        _provedor = criar_provedor(os.environ.get('BDR_PROVEDOR', 'ao_vivo'))
+    return _provedor
+
+def definir_provedor(provedor):
+    global _provedor
+    _provedor = provedor
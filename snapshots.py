@@ -0,0 +1,166 @@
+from datetime import datetime
+import glob
+import os
+
+import pandas as pd
+
+from pontuacao import compactar_resultado
+
+# Snapshots versionados do universo de BDRs, particionados por data (data=AAAA-MM-DD/<versão>.parquet).
+# Análises parciais (com limite de BDRs ou que não couberam no prazo) ganham o sufixo -parcial na versão
+DIRETORIO_SNAPSHOTS = os.environ.get(
+    'BDR_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+)
+FORMATO_VERSAO = '%Y%m%d-%H%M%S'
+SUFIXO_PARCIAL = '-parcial'
+
+def salvar_snapshot(df, diretorio=DIRETORIO_SNAPSHOTS, momento=None, parcial=False):
+    """Grava o resultado de uma análise como um novo snapshot Parquet e retorna o caminho"""
+    momento = momento or datetime.now()
+    particao = os.path.join(diretorio, f"data={momento.strftime('%Y-%m-%d')}")
+    os.makedirs(particao, exist_ok=True)
+    versao = momento.strftime(FORMATO_VERSAO) + (SUFIXO_PARCIAL if parcial else '')
+    caminho = os.path.join(particao, f"{versao}.parquet")
+    
+    # Grava em arquivo temporário e renomeia, para nunca expor um snapshot pela metade
+    temporario = caminho + '.tmp'
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+    return caminho
+
+def listar_snapshots(diretorio=DIRETORIO_SNAPSHOTS):
+    """Lista (versão, caminho) dos snapshots, do mais antigo para o mais recente"""
+    caminhos = glob.glob(os.path.join(diretorio, 'data=*', '*.parquet'))
+    return sorted(
+        (os.path.splitext(os.path.basename(caminho))[0], caminho)
+        for caminho in caminhos
+    )
+
+def ultimo_snapshot(diretorio=DIRETORIO_SNAPSHOTS):
+    """(versão, caminho) do snapshot completo mais recente; sem nenhum completo, do parcial mais
+    recente; None se não houver nenhum"""
+    snapshots = listar_snapshots(diretorio)
+    completos = [snapshot for snapshot in snapshots if not snapshot[0].endswith(SUFIXO_PARCIAL)]
+    return (completos or snapshots or [None])[-1]
+
+def carregar_snapshot(caminho):
+    # Snapshots antigos, gravados antes do esquema compacto, também são convertidos
+    return compactar_resultado(pd.read_parquet(caminho))
+
+def relatorio_memoria(df):
+    """Memória medida de cada coluna, no esquema atual e no esquema sem compactar (object/float64)"""
+    expandido = df.astype({
+        coluna: object if isinstance(tipo, pd.CategoricalDtype) else 'float64'
+        for coluna, tipo in df.dtypes.items()
+        if isinstance(tipo, pd.CategoricalDtype) or tipo == 'float32'
+    })
+    return pd.DataFrame({
+        'tipo': df.dtypes.astype(str),
+        'bytes': df.memory_usage(deep=True, index=False),
+        'bytes_sem_compactar': expandido.memory_usage(deep=True, index=False),
+    })
+
+def relatorio_snapshots(diretorio=DIRETORIO_SNAPSHOTS):
+    """Uma linha por snapshot: linhas, tamanho em disco e memória carregado, com e sem compactar"""
+    linhas = []
+    for versao, caminho in listar_snapshots(diretorio):
+        df = carregar_snapshot(caminho)
+        memoria = relatorio_memoria(df)
+        linhas.append({
+            'versao': versao,
+            'linhas': len(df),
+            'arquivo_kb': os.path.getsize(caminho) / 1024,
+            'memoria_kb': memoria['bytes'].sum() / 1024,
+            'sem_compactar_kb': memoria['bytes_sem_compactar'].sum() / 1024,
+        })
+    return pd.DataFrame(linhas, columns=['versao', 'linhas', 'arquivo_kb', 'memoria_kb', 'sem_compactar_kb'])
+
+# Consultas ao histórico: só as partições do intervalo pedido e só as colunas pedidas são lidas.
+# Cada BDR fica com sua linha mais recente do dia: uma análise parcial depois da completa não esconde
+# as BDRs que ela não buscou
+
+def _snapshots_por_dia(diretorio=DIRETORIO_SNAPSHOTS, desde=None, ate=None):
+    """{data: [caminhos]} dos snapshots de cada dia no intervalo, do mais antigo ao mais recente,
+    escolhidos pelos nomes das partições e arquivos, sem abrir nenhum Parquet"""
+    por_dia = {}
+    for particao in sorted(glob.glob(os.path.join(diretorio, 'data=*'))):
+        try:
+            dia = datetime.strptime(os.path.basename(particao)[len('data='):], '%Y-%m-%d').date()
+        except ValueError:
+            continue
+        if (desde and dia < desde) or (ate and dia > ate):
+            continue
+        arquivos = sorted(glob.glob(os.path.join(particao, '*.parquet')))
+        if arquivos:
+            por_dia[dia] = arquivos
+    return por_dia
+
+def _ler_dia(caminhos, colunas=None, bdrs=None):
+    """Linha mais recente de cada BDR entre os snapshots de um dia. Sem colunas, todas"""
+    filtros = [('BDR', 'in', list(bdrs))] if bdrs else None
+    colunas_lidas = None if colunas is None else ['BDR', *[c for c in colunas if c != 'BDR']]
+    partes = [pd.read_parquet(caminho, columns=colunas_lidas, filters=filtros) for caminho in caminhos]
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes, ignore_index=True).drop_duplicates('BDR', keep='last').reset_index(drop=True)
+
+def consultar_historico(colunas=('Score', 'ROE (%)', 'P/E'), bdrs=None, desde=None, ate=None,
+                        diretorio=DIRETORIO_SNAPSHOTS):
+    """Série histórica em formato longo (data, BDR, colunas...), com a linha mais recente de cada BDR
+    em cada dia"""
+    colunas = [c for c in colunas if c != 'BDR']
+    dias = _snapshots_por_dia(diretorio, desde, ate)
+    if not dias:
+        return pd.DataFrame(columns=['data', 'BDR', *colunas])
+    
+    # Snapshots antigos (object/float64) são convertidos para o esquema compacto depois de juntar
+    historico = pd.concat(
+        [_ler_dia(caminhos, colunas, bdrs).assign(data=pd.Timestamp(dia)) for dia, caminhos in dias.items()],
+        ignore_index=True
+    )[['data', 'BDR', *colunas]]
+    return compactar_resultado(historico.astype({'BDR': 'category'})).sort_values(['data', 'BDR'], ignore_index=True)
+
+def iterar_historico(colunas=None, bdrs=None, desde=None, ate=None, diretorio=DIRETORIO_SNAPSHOTS):
+    """Gera um DataFrame por dia (data, BDR, colunas...), do mais antigo ao mais recente, com a linha
+    mais recente de cada BDR no dia: para exportar o histórico inteiro sem montá-lo na memória.
+    Sem colunas, todas as do snapshot. Os tipos são os gravados em cada arquivo, sem compactar"""
+    for dia, caminhos in sorted(_snapshots_por_dia(diretorio, desde, ate).items()):
+        df = _ler_dia(caminhos, colunas, bdrs)
+        df.insert(0, 'data', pd.Timestamp(dia))
+        yield df
+
+def maiores_variacoes(desde, coluna='Score', n=20, ate=None, diretorio=DIRETORIO_SNAPSHOTS):
+    """BDRs cuja coluna mais mudou entre o último dia com snapshot até a data desde (ou o primeiro
+    depois dela, se não houver) e o último dia até ate. Lê só os snapshots desses dois dias.
+    Retorna (variações, dia_inicio, dia_fim)"""
+    vazio = pd.DataFrame(columns=['BDR', 'Empresa', 'inicio', 'fim', 'Variação'])
+    dias = _snapshots_por_dia(diretorio, ate=ate)
+    if len(dias) < 2:
+        return vazio, None, None
+    
+    anteriores = [dia for dia in dias if dia <= desde]
+    dia_inicio = anteriores[-1] if anteriores else min(dias)
+    dia_fim = max(dias)
+    if dia_inicio == dia_fim:
+        return vazio, dia_inicio, dia_fim
+    
+    inicio = _ler_dia(dias[dia_inicio], [coluna])
+    fim = _ler_dia(dias[dia_fim], ['Empresa', coluna])
+    variacoes = fim.merge(inicio, on='BDR', suffixes=('_fim', '_inicio'))
+    variacoes = pd.DataFrame({
+        'BDR': variacoes['BDR'],
+        'Empresa': variacoes['Empresa'].astype(str),
+        'inicio': variacoes[f'{coluna}_inicio'].astype(float).round(2),
+        'fim': variacoes[f'{coluna}_fim'].astype(float).round(2),
+    })
+    variacoes['Variação'] = (variacoes['fim'] - variacoes['inicio']).round(2)
+    variacoes = variacoes[variacoes['Variação'].fillna(0) != 0]
+    ordem = variacoes['Variação'].abs().sort_values(ascending=False).index
+    return variacoes.loc[ordem].head(n).reset_index(drop=True), dia_inicio, dia_fim
+
+def descrever_versao(versao):
+    """Versão do snapshot em formato legível, ex: 17/10/2026 06:00 (ou 17/10/2026 06:00 (parcial))"""
+    parcial = versao.endswith(SUFIXO_PARCIAL)
+    momento = datetime.strptime(versao[:-len(SUFIXO_PARCIAL)] if parcial else versao, FORMATO_VERSAO)
+    return momento.strftime('%d/%m/%Y %H:%M') + (' (parcial)' if parcial else '')
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Cache, snapshots e índice do universo em diretórios temporários: os módulos leem as variáveis ao importar
+os.environ['BDR_CACHE_DIR'] = tempfile.mkdtemp(prefix='bdr-cache-')
+os.environ['BDR_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='bdr-snapshots-')
+os.environ['BDR_AQUECIMENTO_REQ_HORA'] = '0'
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+N_TICKERS = 40
+
+@pytest.fixture(scope='session')
+def gravacao(tmp_path_factory):
+    """Universo sintético de N_TICKERS BDRs gravado em disco, para o ProvedorReplay"""
+    from benchmark_coleta import gerar_gravacao_sintetica
+    diretorio = str(tmp_path_factory.mktemp('gravacao'))
+    gerar_gravacao_sintetica(diretorio, N_TICKERS)
+    return diretorio
+
+@pytest.fixture
+def replay(gravacao, monkeypatch):
+    """ProvedorReplay como provedor global e o controlador de taxa global livre para os testes"""
+    import provedores
+    from dados import obter_controlador
+    provedor = provedores.ProvedorReplay(gravacao, latencia=0.02, semente=0)
+    monkeypatch.setattr(provedores, '_provedor', provedor)
+    controlador = obter_controlador()
+    monkeypatch.setattr(controlador, 'taxa', 200.0)
+    monkeypatch.setattr(controlador, 'taxa_max', 200.0)
+    return provedor
@@ -0,0 +1,30 @@
+import threading
+
+from aquecimento import AquecedorCache
+from dados import CacheFundamentos, obter_controlador, obter_universo
+
+def test_orcamento_cobra_so_as_requisicoes_do_aquecimento(replay, tmp_path):
+    obter_universo(provedor=replay)
+    aquecedor = AquecedorCache(orcamento_hora=40, janela_pausa='', intervalo=3600,
+                               cache=CacheFundamentos(str(tmp_path)))
+    antes = replay.requisicoes
+
+    # Outra thread usando o mesmo controlador durante o ciclo (ex: uma análise)
+    parar = threading.Event()
+
+    def outro_trafego():
+        while not parar.is_set():
+            obter_controlador().adquirir()
+
+    thread = threading.Thread(target=outro_trafego)
+    thread.start()
+    try:
+        resumo = aquecedor.executar_ciclo()
+    finally:
+        parar.set()
+        thread.join(5)
+
+    assert resumo['motivo'] is None
+    feitas = replay.requisicoes - antes
+    assert 0 < resumo['requisicoes'] == aquecedor.orcamento.gastas() == feitas <= 40
+    assert resumo['renovados'] > 0
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from atualizacao import AnaliseEmAndamento, GerenciadorAtualizacoes, executar_analise
+from dados import (
+    CacheFundamentos, ControladorTaxa, obter_controlador, obter_universo, planejar_busca, processar_em_paralelo
+)
+
+def aguardar(tarefa, timeout=60):
+    limite = time.monotonic() + timeout
+    while tarefa.ativa and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert not tarefa.ativa
+
+def test_pedidos_durante_a_analise_se_juntam_a_ela(replay):
+    gerenciador = GerenciadorAtualizacoes()
+    tarefa, nova = gerenciador.solicitar(limite=10, forcar_atualizacao=True)
+    mesma, nova_de_novo = gerenciador.solicitar(limite=10, n_workers=2, forcar_atualizacao=True)
+    assert nova and not nova_de_novo
+    assert mesma is tarefa and tarefa.sessoes == 2
+    assert gerenciador.ativa() is tarefa
+    assert gerenciador.acompanhar() is tarefa and tarefa.sessoes == 3
+
+    # Outros parâmetros dariam outro resultado: o pedido é recusado, sem se juntar à análise
+    with pytest.raises(AnaliseEmAndamento) as erro:
+        gerenciador.solicitar(limite=30)
+    assert erro.value.tarefa is tarefa and tarefa.sessoes == 3
+    assert '10 BDRs' in str(erro.value)
+
+    aguardar(tarefa)
+    assert tarefa.estado == 'concluida', tarefa.erro
+    assert len(tarefa.resultado) == 10
+    assert gerenciador.ativa() is None
+
+    assert gerenciador.acompanhar() is None
+    outra, nova = gerenciador.solicitar(limite=30)
+    assert nova and outra is not tarefa
+    aguardar(outra)
+
+def test_estado_final_publicado_com_resultado_e_horario(replay):
+    """Quem vê o estado final (outra sessão, em outra thread) já encontra o resultado e o horário"""
+    tarefa, _ = GerenciadorAtualizacoes().solicitar(limite=3, forcar_atualizacao=True)
+    limite = time.monotonic() + 60
+    while tarefa.estado == 'executando' and time.monotonic() < limite:
+        time.sleep(0)
+    assert tarefa.estado == 'concluida', tarefa.erro
+    assert tarefa.terminada_em is not None
+    assert tarefa.resultado is not None
+
+def test_taxa_maxima_aplicada_quando_a_analise_comeca(replay):
+    gerenciador = GerenciadorAtualizacoes()
+    controlador = obter_controlador()
+    tarefa, _ = gerenciador.solicitar(limite=3, taxa_maxima=150.0)
+    aguardar(tarefa)
+    assert controlador.taxa_max == 150.0
+
+    # Sem teto no pedido, o do controlador fica como está
+    outra, _ = gerenciador.solicitar(limite=3)
+    aguardar(outra)
+    assert controlador.taxa_max == 150.0
+
+def test_prazo_termina_no_tempo_com_parte_das_empresas(replay):
+    replay.latencia = 0.2  # 4 workers: ~20 requisições/s, ~6 empresas/s com 3 fragmentos cada
+    progressos = []
+    inicio = time.monotonic()
+    df = executar_analise(
+        n_workers=4, forcar_atualizacao=True, prazo=2.0,
+        ao_progredir=lambda evento, progresso: progressos.append((evento, dict(progresso)))
+    )
+    duracao = time.monotonic() - inicio
+
+    assert duracao < 2.0 + 0.5
+    evento, final = progressos[-1]
+    assert evento == 'fim'
+    assert 0 < final['fora_do_prazo'] < final['pendentes'] == final['total_bdrs']
+    assert final['concluidas'] + final['fora_do_prazo'] == final['pendentes']
+    assert len(df) == final['sucesso'] > 0
+    # Vazão medida pelas requisições concluídas, não só pelas empresas terminadas
+    assert final['vazao'] > 5
+
+def test_empresa_recusada_espera_em_vez_de_esvaziar_a_fila(replay, tmp_path):
+    plano = planejar_busca(obter_universo(provedor=replay))
+    consultas = []
+
+    def uma_por_vez(ticker_us, em_andamento):
+        consultas.append(ticker_us)
+        return not em_andamento
+
+    devolvidas = [t for t, _, _, _ in processar_em_paralelo(
+        plano, 4, cache=CacheFundamentos(str(tmp_path)), controlador=ControladorTaxa(taxa=200, taxa_max=200),
+        provedor=replay, pode_iniciar=uma_por_vez
+    )]
+    assert devolvidas == list(plano)
+    assert len(consultas) > len(plano)
+
+def test_recusada_sem_nada_em_andamento_encerra(replay, tmp_path):
+    plano = planejar_busca(obter_universo(provedor=replay))
+    devolvidas = list(processar_em_paralelo(
+        plano, 4, cache=CacheFundamentos(str(tmp_path)), controlador=ControladorTaxa(taxa=200, taxa_max=200),
+        provedor=replay, pode_iniciar=lambda ticker_us, em_andamento: False
+    ))
+    assert devolvidas == [] and replay.requisicoes == 0
+
+def test_prazo_cancela_as_buscas_em_andamento(replay, tmp_path):
+    replay.latencia = 0.5
+    plano = planejar_busca(obter_universo(provedor=replay))
+    inicio = time.monotonic()
+    devolvidas = list(processar_em_paralelo(
+        plano, 4, cache=CacheFundamentos(str(tmp_path)), controlador=ControladorTaxa(taxa=200, taxa_max=200),
+        provedor=replay, prazo_final=inicio + 0.3
+    ))
+    assert devolvidas == []
+    assert time.monotonic() - inicio < 0.45
+    # As buscas canceladas param antes do próximo fragmento: só a primeira requisição de cada uma sai
+    time.sleep(1.0)
+    assert replay.requisicoes <= 4
@@ -0,0 +1,78 @@
+import pytest
+
+from dados import (
+    CacheFundamentos, ControladorTaxa, _normalizar_cotacao, buscar_cotacoes_em_lote, buscar_dados_empresa_mae,
+    calcular_indicadores_lote, extrair_dados_mercado, montar_resultado, planejar_busca, processar_em_paralelo
+)
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheFundamentos(str(tmp_path))
+
+@pytest.fixture
+def controlador():
+    return ControladorTaxa(taxa=200.0, taxa_max=200.0)
+
+def test_info_em_cache_nao_completa_a_cotacao(replay, cache, controlador):
+    cache.gravar('ZAAA', 'info', {
+        'symbol': 'ZAAA', 'shortName': 'ZAAA Inc', 'sector': 'Energy', 'industry': 'Oil',
+        'trailingPE': 12.0, 'dividendYield': 0.04, 'marketCap': 1e9,
+    })
+    cache.gravar('ZAAA', 'cotacao', _normalizar_cotacao({
+        'symbol': 'ZAAA', 'regularMarketPrice': 50.0, 'marketCap': 5e10,
+    }))
+    dados = buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+
+    mercado = extrair_dados_mercado(dados['info'])
+    assert mercado['pe'] is None
+    assert mercado['dividend_yield'] == 0
+    assert mercado['preco'] == 50.0
+    assert mercado['market_cap'] == pytest.approx(50.0)
+    assert mercado['setor'] == 'Energy'
+    assert dados['info']['shortName'] == 'ZAAA Inc'
+
+def test_empresa_mae_buscada_uma_vez_por_grupo(replay, cache, controlador):
+    lista_bdrs = [
+        {'bdr': 'ZAAA34', 'ticker_us': 'ZAAA', 'nome': 'ZAAA Inc'},
+        {'bdr': 'ZAAA35', 'ticker_us': 'ZAAA', 'nome': 'ZAAA Inc'},
+        {'bdr': 'ZAAB34', 'ticker_us': 'ZAAB', 'nome': 'ZAAB Inc'},
+    ]
+    plano = planejar_busca(lista_bdrs)
+    assert {t: [b['bdr'] for b in grupo] for t, grupo in plano.items()} == {
+        'ZAAA': ['ZAAA34', 'ZAAA35'], 'ZAAB': ['ZAAB34'],
+    }
+
+    brutos = {}
+    for ticker_us, grupo, dados, erro in processar_em_paralelo(
+        plano, 2, cache=cache, controlador=controlador, provedor=replay
+    ):
+        assert erro is None and grupo is plano[ticker_us]
+        brutos[ticker_us] = dados
+    assert replay.requisicoes == 2 * 3  # info, DRE e balanço de cada empresa-mãe
+
+    df = montar_resultado(plano, calcular_indicadores_lote(brutos)).set_index('BDR')
+    assert sorted(df.index) == ['ZAAA34', 'ZAAA35', 'ZAAB34']
+    assert df.loc['ZAAA34'].equals(df.loc['ZAAA35'])
+
+def test_simbolo_desconhecido_vai_para_o_cache_negativo(replay, cache, controlador):
+    assert buscar_dados_empresa_mae('XXXX', cache=cache, controlador=controlador, provedor=replay) is None
+    assert replay.requisicoes == 1  # só o info, sem demonstrativos
+    assert 'XXXX' in cache.sem_dados()
+
+    assert buscar_dados_empresa_mae('XXXX', cache=cache, controlador=controlador, provedor=replay) is None
+    assert buscar_cotacoes_em_lote(['XXXX'], cache=cache, controlador=controlador, provedor=replay) == 0
+    assert replay.requisicoes == 1
+
+    # Forçar a atualização ignora o cache negativo, e o vencimento dele o tira da lista
+    buscar_dados_empresa_mae('XXXX', forcar_atualizacao=True, cache=cache, controlador=controlador, provedor=replay)
+    assert replay.requisicoes == 2
+    assert cache.sem_dados(ttl=-1) == {}
+
+def test_so_fundos_sem_demonstrativos_vao_para_o_cache_negativo(replay, cache, controlador):
+    for ticker, tipo in (('FUND', 'ETF'), ('EMPR', 'EQUITY')):
+        cache.gravar(ticker, 'cotacao', _normalizar_cotacao(
+            {'symbol': ticker, 'quoteType': tipo, 'regularMarketPrice': 10.0}
+        ))
+        assert buscar_dados_empresa_mae(ticker, cache=cache, controlador=controlador, provedor=replay) is None
+    # Demonstrativos vazios de uma empresa podem ser um 429 disfarçado: ela é buscada de novo na próxima
+    assert list(cache.sem_dados()) == ['FUND']
@@ -0,0 +1,89 @@
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+from dados import (
+    TTL_COTACAO, TTL_DEMONSTRATIVOS, TTL_INFO, CacheFundamentos, ControladorTaxa, buscar_dados_empresa_mae
+)
+from metricas import iniciar_metricas
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheFundamentos(str(tmp_path))
+
+def envelhecer(cache, ticker, endpoint, segundos):
+    """Recua o horário de gravação (e de acesso) da entrada"""
+    with sqlite3.connect(cache.caminho) as conn:
+        conn.execute(
+            "UPDATE respostas SET gravado_em = gravado_em - ?, acessado_em = acessado_em - ? "
+            "WHERE ticker = ? AND endpoint = ?",
+            (segundos, segundos, ticker, endpoint)
+        )
+
+def test_ttl_por_endpoint(cache):
+    for endpoint in ('cotacao', 'info', 'financials'):
+        cache.gravar('AAA', endpoint, {'endpoint': endpoint})
+        envelhecer(cache, 'AAA', endpoint, TTL_COTACAO + 60)
+
+    assert cache.obter('AAA', 'cotacao') is None
+    assert cache.obter('AAA', 'info') == {'endpoint': 'info'}
+    assert cache.obter('AAA', 'financials') == {'endpoint': 'financials'}
+    # TTL explícito vale no lugar do padrão do endpoint
+    assert cache.obter('AAA', 'info', ttl=TTL_COTACAO) is None
+
+    envelhecer(cache, 'AAA', 'info', TTL_INFO)
+    envelhecer(cache, 'AAA', 'financials', TTL_DEMONSTRATIVOS)
+    assert cache.obter('AAA', 'info') is None
+    assert cache.obter('AAA', 'financials') is None
+
+def test_espiar_nao_conta_nem_renova_o_acesso(cache):
+    metricas = iniciar_metricas()
+    cache.gravar('AAA', 'cotacao', {'preco': 1})
+    cache.gravar('BBB', 'cotacao', {'preco': 2})
+    envelhecer(cache, 'AAA', 'cotacao', 10)
+    envelhecer(cache, 'BBB', 'cotacao', 5)
+
+    assert cache.espiar('AAA', 'cotacao') == {'preco': 1}
+    assert cache.espiar('ZZZ', 'cotacao') is None
+    assert metricas.total('cache_acertos') == metricas.total('cache_faltas') == 0
+
+    assert cache.obter('BBB', 'cotacao') == {'preco': 2}
+    assert cache.obter('ZZZ', 'cotacao') is None
+    assert metricas.total('cache_acertos') == metricas.total('cache_faltas') == 1
+
+def test_despejo_remove_os_menos_acessados(tmp_path):
+    payload = 'x' * 40_000
+    cache = CacheFundamentos(str(tmp_path), limite_mb=0.1)
+    cache.gravar('AAA', 'info', payload)
+    cache.gravar('BBB', 'info', payload)
+    envelhecer(cache, 'AAA', 'info', 10)
+    envelhecer(cache, 'BBB', 'info', 10)
+    assert cache.obter('AAA', 'info') == payload  # AAA acessado, BBB não
+
+    cache.gravar('CCC', 'info', payload)
+    assert cache.espiar('BBB', 'info') is None
+    assert cache.espiar('AAA', 'info') == payload
+    assert cache.espiar('CCC', 'info') == payload
+
+def test_demonstrativos_vencem_no_proximo_relatorio(cache):
+    cache.gravar('AAA', 'financials', pd.DataFrame())
+    cache.gravar('AAA', 'cotacao', {})
+    # Exercício de dois anos atrás: o próximo relatório já deveria ter saído
+    cache.registrar_periodo('AAA', pd.Timestamp.now() - pd.DateOffset(years=2))
+    vencimentos = cache.vencimentos()
+    agora = time.time()
+    assert vencimentos[('AAA', 'financials')] < agora + TTL_DEMONSTRATIVOS / 10
+    assert vencimentos[('AAA', 'cotacao')] == pytest.approx(agora + TTL_COTACAO, abs=60)
+
+def test_segunda_busca_sai_do_cache(replay, cache):
+    controlador = ControladorTaxa(taxa=200.0, taxa_max=200.0)
+    primeira = buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    feitas = replay.requisicoes
+    assert feitas == 3  # info, DRE e balanço
+
+    segunda = buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    assert replay.requisicoes == feitas
+    assert segunda['info'] == primeira['info']
+    assert segunda['financials'].equals(primeira['financials'])
@@ -0,0 +1,87 @@
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+from atualizacao import custos_empresas
+from dados import (
+    ESPERA_NOVO_PERIODO, FRAGMENTOS, PRAZO_PUBLICACAO, CacheFundamentos, ControladorTaxa, buscar_dados_empresa_mae
+)
+from metricas import iniciar_metricas
+
+DIA = 24 * 3600
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheFundamentos(str(tmp_path))
+
+@pytest.fixture
+def controlador():
+    return ControladorTaxa(taxa=200.0, taxa_max=200.0)
+
+def vencer_calendario(cache, ticker):
+    """Leva a data prevista do próximo relatório para o passado"""
+    with sqlite3.connect(cache.caminho) as conn:
+        conn.execute("UPDATE calendario SET proximo_relatorio = ? WHERE ticker = ?", (time.time() - 60, ticker))
+
+def test_previsao_do_proximo_relatorio(cache):
+    # Exercício encerrado há seis meses: o seguinte fecha daqui a seis
+    ultimo = pd.Timestamp.now().normalize() - pd.DateOffset(months=6)
+    fim_seguinte = (ultimo + pd.DateOffset(years=1)).timestamp()
+
+    cache.registrar_periodo('AAA', ultimo)
+    assert cache.calendario('AAA')['proximo_relatorio'] == pytest.approx(fim_seguinte + PRAZO_PUBLICACAO)
+    assert cache.calendario('AAA')['ultimo_periodo'] == ultimo
+
+    # Data de resultado anunciada para depois do fechamento seguinte: vale ela, mais um dia
+    cache.registrar_periodo('AAA', ultimo, fim_seguinte + 30 * DIA)
+    assert cache.calendario('AAA')['proximo_relatorio'] == pytest.approx(fim_seguinte + 31 * DIA)
+    # Resultado de antes do fechamento é de outro trimestre: volta ao prazo padrão
+    cache.registrar_periodo('AAA', ultimo, fim_seguinte - 10 * DIA)
+    assert cache.calendario('AAA')['proximo_relatorio'] == pytest.approx(fim_seguinte + PRAZO_PUBLICACAO)
+
+    # Previsão já vencida sem período novo: verifica de novo em uma semana
+    cache.registrar_periodo('BBB', ultimo - pd.DateOffset(years=2))
+    assert cache.calendario('BBB')['proximo_relatorio'] == pytest.approx(time.time() + ESPERA_NOVO_PERIODO, abs=60)
+    assert cache.calendario('ZZZ') is None
+
+def test_periodo_novo_e_contado(cache):
+    metricas = iniciar_metricas()
+    cache.registrar_periodo('AAA', pd.Timestamp('2024-12-31'))
+    cache.registrar_periodo('AAA', pd.Timestamp('2024-12-31'))
+    assert metricas.total('periodos_novos') == 0
+    cache.registrar_periodo('AAA', pd.Timestamp('2025-12-31'))
+    assert metricas.total('periodos_novos') == 1
+
+def test_demonstrativos_baixados_de_novo_so_no_novo_periodo(replay, cache, controlador):
+    metricas = iniciar_metricas()
+    primeira = buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    assert replay.requisicoes == 3
+    assert cache.calendario('ZAAA')['ultimo_periodo'] == pd.Timestamp('2023-12-31')
+
+    # Antes do próximo relatório previsto, tudo sai do cache
+    buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    assert replay.requisicoes == 3
+    assert metricas.total('verificacoes_novo_periodo') == 0
+
+    # Previsão vencida: só os demonstrativos são baixados, e a próxima verificação fica para depois
+    vencer_calendario(cache, 'ZAAA')
+    segunda = buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    assert replay.requisicoes == 3 + 2
+    assert metricas.total('verificacoes_novo_periodo') == 1
+    assert segunda['financials'].equals(primeira['financials'])
+    assert cache.calendario('ZAAA')['proximo_relatorio'] > time.time()
+
+    buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    assert replay.requisicoes == 3 + 2
+
+def test_custos_seguem_o_calendario(replay, cache, controlador):
+    buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=replay)
+    cache.marcar_sem_dados('XXXX', "teste")
+
+    assert custos_empresas(['ZAAA', 'ZAAB', 'XXXX'], cache) == {'ZAAA': 0, 'ZAAB': len(FRAGMENTOS), 'XXXX': 0}
+    assert custos_empresas(['ZAAA'], cache, forcar_atualizacao=True) == {'ZAAA': len(FRAGMENTOS)}
+
+    vencer_calendario(cache, 'ZAAA')
+    assert custos_empresas(['ZAAA'], cache) == {'ZAAA': 2}  # DRE e balanço; o info segue no TTL
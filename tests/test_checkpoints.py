@@ -0,0 +1,52 @@
+import pytest
+
+from atualizacao import executar_analise
+from dados import CheckpointExecucoes, obter_checkpoints
+
+class Interrompida(Exception):
+    pass
+
+def test_falhas_sao_repetidas_ao_retomar(tmp_path):
+    checkpoints = CheckpointExecucoes(str(tmp_path))
+    lista = [{'bdr': 'AAA34', 'ticker_us': 'AAA', 'nome': 'A'}, {'bdr': 'BBB34', 'ticker_us': 'BBB', 'nome': 'B'}]
+    execucao_id = checkpoints.criar(lista)
+    checkpoints.registrar(execucao_id, 'AAA', {'info': {'symbol': 'AAA'}})
+    checkpoints.registrar(execucao_id, 'BBB', None)
+
+    assert checkpoints.carregar(execucao_id) == lista
+    assert checkpoints.concluidos(execucao_id) == {'AAA': {'info': {'symbol': 'AAA'}}}
+    assert checkpoints.interrompida_mais_recente() == {'id': execucao_id, 'tickers': 2, 'sucessos': 1, 'falhas': 1}
+    assert checkpoints.em_andamento() == execucao_id
+    assert checkpoints.em_andamento(janela=-1) is None
+
+    checkpoints.finalizar(execucao_id)
+    assert checkpoints.interrompida_mais_recente() is None
+    assert checkpoints.em_andamento() is None
+
+def test_retomada_busca_so_o_que_faltou(replay):
+    primeira = []
+
+    def interromper(evento, progresso):
+        if evento == 'empresa':
+            primeira.append(progresso['ticker_atual'])
+            if len(primeira) == 5:
+                raise Interrompida
+
+    with pytest.raises(Interrompida):
+        executar_analise(limite=12, n_workers=2, forcar_atualizacao=True, ao_progredir=interromper)
+    interrompida = obter_checkpoints().interrompida_mais_recente()
+    assert interrompida['sucessos'] == 5
+
+    eventos = []
+    df = executar_analise(
+        limite=12, n_workers=2, forcar_atualizacao=True, execucao_id=interrompida['id'],
+        ao_progredir=lambda evento, progresso: eventos.append((evento, dict(progresso)))
+    )
+    plano = next(progresso for evento, progresso in eventos if evento == 'plano')
+    assert plano['execucao_id'] == interrompida['id']
+    assert plano['recuperadas'] == 5 and plano['pendentes'] == 12 - 5
+    retomadas = {progresso['ticker_atual'] for evento, progresso in eventos if evento == 'empresa'}
+    assert len(retomadas) == 7 and not retomadas & set(primeira)
+
+    assert len(df) == 12
+    assert (obter_checkpoints().interrompida_mais_recente() or {}).get('id') != interrompida['id']
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+import requests
+
+from dados import ControladorTaxa, _requisitar
+
+def erro_429(retry_after=None):
+    resposta = requests.Response()
+    resposta.status_code = 429
+    if retry_after is not None:
+        resposta.headers['Retry-After'] = str(retry_after)
+    return requests.HTTPError("429 Client Error: Too Many Requests", response=resposta)
+
+def test_429_corta_a_taxa_pela_metade_ate_o_minimo():
+    controlador = ControladorTaxa(taxa=4.0, taxa_min=0.5, taxa_max=8.0)
+    controlador.registrar_429()
+    assert controlador.taxa == 2.0
+    for _ in range(5):
+        controlador.registrar_429()
+    assert controlador.taxa == 0.5
+    assert controlador.erros_429 == 6
+
+def test_sucesso_sobe_a_taxa_devagar_ate_o_teto():
+    controlador = ControladorTaxa(taxa=2.0, taxa_min=0.5, taxa_max=2.5, incremento=0.1)
+    controlador.registrar_sucesso()
+    assert controlador.taxa == pytest.approx(2.05)
+    for _ in range(100):
+        controlador.registrar_sucesso()
+    assert controlador.taxa == 2.5
+    assert controlador.sucessos == 101
+
+def test_retry_after_pausa_as_proximas_requisicoes():
+    controlador = ControladorTaxa(taxa=100.0, taxa_min=50.0)
+    controlador.registrar_429(retry_after=0.3)
+    inicio = time.monotonic()
+    controlador.adquirir()
+    assert time.monotonic() - inicio >= 0.29
+
+def test_requisitar_repete_o_429_e_registra_no_controlador():
+    controlador = ControladorTaxa(taxa=100.0, taxa_min=50.0, taxa_max=100.0)
+    respostas = [erro_429(0), erro_429(0), 'ok']
+
+    def funcao():
+        resposta = respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    assert _requisitar(funcao, controlador, max_tentativas=3) == 'ok'
+    assert controlador.erros_429 == 2
+    assert controlador.sucessos == 1
+    assert controlador.taxa == pytest.approx(50.0, abs=0.01)
+
+def test_requisitar_desiste_apos_as_tentativas():
+    controlador = ControladorTaxa(taxa=100.0, taxa_min=50.0)
+
+    def funcao():
+        raise erro_429(0)
+
+    with pytest.raises(requests.HTTPError):
+        _requisitar(funcao, controlador, max_tentativas=2)
+    assert controlador.erros_429 == 2
@@ -0,0 +1,81 @@
+import io
+import os
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import exportacao
+from exportacao import exportar, exportar_historico, historico_em_cache
+from pontuacao import compactar_resultado
+from snapshots import consultar_historico, salvar_snapshot
+
+N_DIAS = 6
+N_BDRS = 50
+
+def gravar_snapshots(diretorio):
+    """N_DIAS snapshots diários: os três primeiros no esquema antigo (object/float64), os demais compactos"""
+    for i in range(N_DIAS):
+        df = pd.DataFrame({
+            'BDR': [f"T{j}34" for j in range(N_BDRS)],
+            'Empresa': [f"Empresa {j}" for j in range(N_BDRS)],
+            'Setor': ['Technology'] * N_BDRS,
+            'Score': [float(j % 7 + i) for j in range(N_BDRS)],
+            'P/E': [None if j % 10 == 0 else 10.5 + j for j in range(N_BDRS)],
+        })
+        momento = datetime(2026, 10, 1, 6) + timedelta(days=i)
+        salvar_snapshot(df if i < 3 else compactar_resultado(df), diretorio, momento)
+
+def ler(caminho, formato):
+    if formato == 'csv':
+        return pd.read_csv(caminho, compression='gzip', parse_dates=['data'])
+    if formato == 'parquet':
+        return pd.read_parquet(caminho)
+    return pd.read_excel(caminho, sheet_name='Histórico', parse_dates=['data'])
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet', 'excel'])
+def test_historico_em_lotes_igual_a_consulta(tmp_path, monkeypatch, formato):
+    # Lotes menores que um dia: cada dia é uma escrita, com esquemas diferentes entre os dias
+    monkeypatch.setattr(exportacao, 'LINHAS_POR_LOTE', N_BDRS // 2)
+    snapshots = str(tmp_path / 'snapshots')
+    gravar_snapshots(snapshots)
+    destino = str(tmp_path / f"historico{exportacao.FORMATOS_EXPORTACAO[formato]['extensao']}")
+
+    linhas = exportar_historico(destino, colunas=['Score', 'P/E'], desde=date(2026, 10, 2), diretorio=snapshots)
+    assert linhas == (N_DIAS - 1) * N_BDRS
+    assert not os.path.exists(destino + '.tmp')
+
+    exportado = ler(destino, formato).astype({'BDR': str}).sort_values(['data', 'BDR'], ignore_index=True)
+    esperado = consultar_historico(['Score', 'P/E'], desde=date(2026, 10, 2), diretorio=snapshots)
+    assert list(exportado.columns) == ['data', 'BDR', 'Score', 'P/E']
+    assert (exportado['data'] == esperado['data']).all()
+    assert list(exportado['BDR']) == list(esperado['BDR'].astype(str))
+    for coluna in ('Score', 'P/E'):
+        assert exportado[coluna].astype(float).round(2).equals(esperado[coluna].astype(float).round(2))
+
+def test_intervalo_sem_snapshot_nao_deixa_arquivo(tmp_path):
+    snapshots = str(tmp_path / 'snapshots')
+    gravar_snapshots(snapshots)
+    destino = str(tmp_path / 'historico.csv.gz')
+    with pytest.raises(ValueError):
+        exportar_historico(destino, desde=date(2027, 1, 1), diretorio=snapshots)
+    assert os.listdir(tmp_path) == ['snapshots']
+
+def test_exportacao_em_cache_por_versao(tmp_path):
+    snapshots = str(tmp_path / 'snapshots')
+    gravar_snapshots(snapshots)
+    exportacoes = str(tmp_path / 'exportacoes')
+
+    caminho = historico_em_cache(exportacoes, 'csv', 'v1', diretorio_snapshots=snapshots)
+    gerado_em = os.path.getmtime(caminho)
+    assert historico_em_cache(exportacoes, 'csv', 'v1', diretorio_snapshots=snapshots) == caminho
+    assert os.path.getmtime(caminho) == gerado_em
+
+    # Versão nova: a exportação da anterior é apagada
+    novo = historico_em_cache(exportacoes, 'csv', 'v2', diretorio_snapshots=snapshots)
+    assert os.listdir(exportacoes) == [os.path.basename(novo)]
+
+def test_mesmo_conteudo_mesmos_bytes():
+    df = pd.DataFrame({'BDR': ['A34', 'B34'], 'Score': [1.0, 2.0]})
+    assert exportar(df, 'csv') == exportar(df.copy(), 'csv')
+    assert pd.read_parquet(io.BytesIO(exportar(df, 'parquet'))).equals(df)
@@ -0,0 +1,51 @@
+import random
+import string
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filtros import COLUNAS_BUSCA, IndiceFiltros
+
+def resultado_aleatorio(n=3000, semente=0):
+    aleatorio = random.Random(semente)
+
+    def palavra(k):
+        return ''.join(aleatorio.choice(string.ascii_letters + string.digits + ' .') for _ in range(k))
+
+    return pd.DataFrame({
+        'BDR': [palavra(4).upper() + '34' for _ in range(n)],
+        'Ticker US': [palavra(4).upper() for _ in range(n)],
+        'Empresa': [palavra(10) for _ in range(n)],
+        'Status': pd.Categorical([aleatorio.choice(['🟢 Excelente', '🟡 Bom', '🔴 Fraco']) for _ in range(n)]),
+        'Setor': [aleatorio.choice(['Technology', 'Healthcare', None]) for _ in range(n)],
+        'Tamanho': [aleatorio.choice(['Mega Cap', 'Small Cap']) for _ in range(n)],
+    })
+
+def referencia(df, busca):
+    mascara = np.zeros(len(df), dtype=bool)
+    for coluna in COLUNAS_BUSCA:
+        mascara |= df[coluna].astype(str).str.contains(busca, case=False, regex=False).to_numpy()
+    return mascara
+
+# Buscas raras (poucas linhas, caminho do find) e comuns (muitas linhas, teste linha a linha)
+@pytest.mark.parametrize('busca', ['a', '34', 'A3', 'x', 'qz', 'abc', ' ', '.', '4 ', 'zzzzzz', 'E34'])
+def test_busca_igual_a_str_contains(busca):
+    df = resultado_aleatorio()
+    assert (IndiceFiltros(df)._mascara_busca(busca) == referencia(df, busca)).all()
+
+def test_busca_nao_casa_entre_campos():
+    df = pd.DataFrame({'BDR': ['AB34'], 'Ticker US': ['CD'], 'Empresa': ['Ef'],
+                       'Status': ['🟡 Bom'], 'Setor': ['Technology'], 'Tamanho': ['Mega Cap']})
+    indice = IndiceFiltros(df)
+    assert not indice._mascara_busca('34cd').any()
+    assert not indice._mascara_busca('34\x1fcd').any()
+    assert indice._mascara_busca('ab3').all()
+
+def test_filtros_e_busca_combinados():
+    df = resultado_aleatorio()
+    indice = IndiceFiltros(df)
+    selecoes = {'Status': ['🟡 Bom'], 'Setor': ['Technology', 'Healthcare']}
+    esperado = (df['Status'] == '🟡 Bom') & df['Setor'].isin(['Technology', 'Healthcare']) & referencia(df, 'a')
+    assert indice.filtrar(selecoes, 'A').index.equals(df[esperado].index)
+    assert indice.opcoes['Setor'] == ['Healthcare', 'Technology']
@@ -0,0 +1,85 @@
+import pytest
+import requests
+
+from dados import (
+    RODADAS_FRAGMENTOS, BuscaIncompleta, CacheFundamentos, ControladorTaxa, buscar_dados_empresa_mae,
+    processar_em_paralelo
+)
+from metricas import iniciar_metricas
+from provedores import ProvedorReplay
+
+class ProvedorInstavel(ProvedorReplay):
+    """Replay cujo DRE falha nas primeiras falhas[ticker] requisições de cada ticker"""
+
+    def __init__(self, *args, falhas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.falhas = dict(falhas or {})
+        self.pedidos = []
+
+    def info(self, ticker):
+        self.pedidos.append(('info', ticker))
+        return super().info(ticker)
+
+    def financials(self, ticker):
+        self.pedidos.append(('financials', ticker))
+        if self.falhas.get(ticker, 0) > 0:
+            self.falhas[ticker] -= 1
+            self._simular_requisicao()
+            raise requests.ConnectionError(f"{ticker}: conexão interrompida")
+        return super().financials(ticker)
+
+    def balance_sheet(self, ticker):
+        self.pedidos.append(('balance_sheet', ticker))
+        return super().balance_sheet(ticker)
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheFundamentos(str(tmp_path))
+
+@pytest.fixture
+def controlador():
+    return ControladorTaxa(taxa=200.0, taxa_max=200.0)
+
+def test_retomada_busca_so_o_fragmento_que_faltou(gravacao, cache, controlador):
+    metricas = iniciar_metricas()
+    provedor = ProvedorInstavel(gravacao, falhas={'ZAAA': 1})
+    with pytest.raises(BuscaIncompleta) as excinfo:
+        buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=provedor)
+    erro = excinfo.value
+    assert erro.ticker == 'ZAAA' and list(erro.erros) == ['financials']
+    # O balanço é buscado mesmo com o DRE falho
+    assert sorted(erro.parciais) == ['balance_sheet', 'info']
+
+    provedor.pedidos.clear()
+    dados = buscar_dados_empresa_mae('ZAAA', cache=cache, controlador=controlador, provedor=provedor,
+                                     parciais=erro.parciais)
+    assert provedor.pedidos == [('financials', 'ZAAA')]
+    assert not dados['financials'].empty
+    assert metricas.total('fragmentos_falhos') == 1
+    assert metricas.total('fragmentos_reaproveitados') == 2
+
+def test_empresa_com_fragmento_falho_volta_para_a_fila(gravacao, cache, controlador):
+    metricas = iniciar_metricas()
+    provedor = ProvedorInstavel(gravacao, falhas={'ZAAA': 1})
+    plano = {'ZAAA': [{'bdr': 'ZAAA34'}], 'ZAAB': [{'bdr': 'ZAAB34'}]}
+
+    resultados = {t: (dados, erro) for t, _, dados, erro in processar_em_paralelo(
+        plano, 2, cache=cache, controlador=controlador, provedor=provedor
+    )}
+    assert all(erro is None and dados is not None for dados, erro in resultados.values())
+    assert metricas.total('empresas_reenfileiradas') == 1
+    # Na segunda rodada, só o DRE que faltou
+    assert provedor.pedidos.count(('financials', 'ZAAA')) == 2
+    assert provedor.pedidos.count(('info', 'ZAAA')) == provedor.pedidos.count(('balance_sheet', 'ZAAA')) == 1
+
+def test_reenfileiramento_limitado_por_rodadas(gravacao, cache, controlador):
+    metricas = iniciar_metricas()
+    provedor = ProvedorInstavel(gravacao, falhas={'ZAAA': RODADAS_FRAGMENTOS + 1})
+
+    (ticker_us, _, dados, erro), = processar_em_paralelo(
+        {'ZAAA': [{'bdr': 'ZAAA34'}]}, 1, cache=cache, controlador=controlador, provedor=provedor
+    )
+    assert ticker_us == 'ZAAA' and dados is None
+    assert isinstance(erro, BuscaIncompleta)
+    assert metricas.total('empresas_reenfileiradas') == RODADAS_FRAGMENTOS - 1
+    assert provedor.pedidos.count(('financials', 'ZAAA')) == RODADAS_FRAGMENTOS
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dados import calcular_indicadores_lote, calcular_indicadores_painel, montar_painel
+
+# Períodos como o yfinance entrega: mais recente primeiro
+PERIODOS = pd.to_datetime(['2023-12-31', '2022-12-31', '2021-12-31'])
+
+def demonstrativos(lucro, receita, patrimonio, ativo, divida, nomes=None):
+    nomes = nomes or {}
+    dre = pd.DataFrame(
+        [lucro, receita], columns=PERIODOS,
+        index=[nomes.get('lucro', 'Net Income'), nomes.get('receita', 'Total Revenue')]
+    )
+    balanco = pd.DataFrame(
+        [patrimonio, ativo, divida], columns=PERIODOS,
+        index=[nomes.get('patrimonio', 'Stockholders Equity'), 'Total Assets', 'Total Debt']
+    )
+    return {'financials': dre, 'balance_sheet': balanco}
+
+def test_indicadores_por_ticker():
+    brutos = {
+        'AAA': demonstrativos([30, 20, 10], [150, 120, 100], [100, 100, 100], [300, 300, 300], [50, 40, 30]),
+        # Aliases alternativos do Yahoo para lucro e patrimônio
+        'BBB': demonstrativos([5, 5, 5], [50, 50, 50], [20, 25, 50], [100, 100, 100], [10, 10, 10],
+                              nomes={'lucro': 'Net Income Common Stockholders',
+                                     'patrimonio': 'Total Equity Gross Minority Interest'}),
+    }
+    indicadores = calcular_indicadores_painel(montar_painel(brutos))
+
+    aaa = indicadores.loc['AAA']
+    assert aaa['roe'] == pytest.approx(20.0)  # média de 10%, 20%, 30%
+    assert aaa['margem'] == pytest.approx(np.mean([10 / 100, 20 / 120, 30 / 150]) * 100)
+    # Crescimento do mais antigo para o mais recente: +20% e +25%
+    assert aaa['crescimento'] == pytest.approx(22.5)
+    assert aaa['roa'] == pytest.approx(np.mean([10, 20, 30]) / 300 * 100)
+    assert aaa['dividapl'] == pytest.approx(40.0)
+
+    bbb = indicadores.loc['BBB']
+    assert bbb['roe'] == pytest.approx(np.mean([5 / 20, 5 / 25, 5 / 50]) * 100)
+    assert bbb['crescimento'] == pytest.approx(0.0)
+
+def test_mediana_e_cagr():
+    brutos = {'AAA': demonstrativos([30, 20, 10], [150, 120, 100], [100, 100, 100], [300, 300, 300], [0, 0, 90])}
+    indicadores = calcular_indicadores_painel(montar_painel(brutos), agregacao='mediana', crescimento_cagr=True)
+    assert indicadores.loc['AAA', 'dividapl'] == pytest.approx(0.0)
+    assert indicadores.loc['AAA', 'crescimento'] == pytest.approx((1.5 ** 0.5 - 1) * 100)
+
+def test_ticker_sem_campo_obrigatorio_fica_de_fora():
+    incompleto = demonstrativos([1, 1, 1], [10, 10, 10], [5, 5, 5], [20, 20, 20], [1, 1, 1])
+    incompleto['balance_sheet'] = incompleto['balance_sheet'].drop(index='Stockholders Equity')
+    brutos = {
+        'AAA': demonstrativos([30, 20, 10], [150, 120, 100], [100, 100, 100], [300, 300, 300], [50, 40, 30]),
+        'SEM': incompleto,
+        'VAZ': {'financials': pd.DataFrame(), 'balance_sheet': pd.DataFrame()},
+    }
+    assert list(calcular_indicadores_painel(montar_painel(brutos)).index) == ['AAA']
+
+def test_lote_junta_dados_de_mercado():
+    brutos = {'AAA': {
+        **demonstrativos([30, 20, 10], [150, 120, 100], [100, 100, 100], [300, 300, 300], [50, 40, 30]),
+        'info': {'currentPrice': 10.0, 'trailingPE': 15.0, 'priceToBook': 2.0, 'dividendYield': 0.02,
+                 'marketCap': 3e11, 'sector': 'Technology'},
+    }}
+    linha = calcular_indicadores_lote(brutos).loc['AAA']
+    assert linha['roe'] == pytest.approx(20.0)
+    assert linha['dividend_yield'] == pytest.approx(2.0)
+    assert linha['market_cap'] == pytest.approx(300.0)
+    assert linha['setor'] == 'Technology'
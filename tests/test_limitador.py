@@ -0,0 +1,38 @@
+import threading
+import time
+
+from dados import LimitadorTaxa
+
+def test_taxa_respeitada():
+    limitador = LimitadorTaxa(taxa=50)
+    inicio = time.monotonic()
+    for _ in range(26):
+        limitador.adquirir()
+    # A primeira é imediata; as outras 25 vêm a cada 1/50 s
+    assert time.monotonic() - inicio >= 25 / 50 * 0.95
+    assert limitador.requisicoes == 26
+
+def test_horarios_em_ordem_de_chegada():
+    """Nenhum worker fica sem vez: com 8 threads disputando, cada uma é atendida a cada ~8 horários"""
+    limitador = LimitadorTaxa(taxa=100)
+    esperas = {i: [] for i in range(8)}
+
+    def worker(i):
+        for _ in range(10):
+            antes = time.monotonic()
+            limitador.adquirir()
+            esperas[i].append(time.monotonic() - antes)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    inicio = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.monotonic() - inicio
+
+    assert duracao >= 79 / 100 * 0.95
+    # Sem ordem, uma thread podia esperar quase a execução inteira; em fila, cerca de 8 horários
+    pior_espera = max(max(e) for e in esperas.values())
+    assert pior_espera < 8 / 100 * 3
+    assert pior_espera < duracao / 3
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from pontuacao import CRITERIOS, COLUNAS_RESULTADO, pontuar_bdrs, ranquear_bdrs
+
+def classificar_bdr(dados):
+    """Pontuação linha a linha da versão anterior à vetorizada, usada como referência"""
+    score = 0
+    alertas = []
+    roe, margem, crescimento = dados['roe'], dados['margem'], dados['crescimento']
+    dividapl, pe, dividend_yield = dados['dividapl'], dados['pe'], dados['dividend_yield']
+
+    if roe >= CRITERIOS['excelente']['roe']:
+        score += 1
+    elif roe >= CRITERIOS['bom']['roe']:
+        score += 0.5
+    else:
+        alertas.append('ROE baixo')
+
+    if margem >= CRITERIOS['excelente']['margem']:
+        score += 1
+    elif margem >= CRITERIOS['bom']['margem']:
+        score += 0.5
+    else:
+        alertas.append('Margem baixa')
+
+    if crescimento >= CRITERIOS['excelente']['crescimento']:
+        score += 1
+    elif crescimento >= CRITERIOS['bom']['crescimento']:
+        score += 0.5
+    elif crescimento < 0:
+        alertas.append('Receita em queda')
+
+    if dividend_yield >= CRITERIOS['excelente']['dividend_yield']:
+        score += 1
+    elif dividend_yield >= CRITERIOS['bom']['dividend_yield']:
+        score += 0.5
+
+    if pe and pe > 0:
+        if pe <= CRITERIOS['excelente']['pe_max']:
+            score += 1
+        elif pe <= CRITERIOS['bom']['pe_max']:
+            score += 0.5
+        elif pe > CRITERIOS['atencao']['pe_max']:
+            alertas.append('P/E elevado')
+
+    if not np.isnan(dividapl):
+        if dividapl < 50:
+            score += 1
+        elif dividapl < 100:
+            score += 0.5
+        else:
+            alertas.append('Endividamento alto')
+
+    percentual = score / 6 * 100
+    if percentual >= 80:
+        status = '🟢 Excelente'
+    elif percentual >= 60:
+        status = '🟡 Bom'
+    elif percentual >= 40:
+        status = '🟠 Atenção'
+    else:
+        status = '🔴 Fraco'
+    return status, score, ', '.join(alertas) or 'OK'
+
+def resultado_aleatorio(n=2000, semente=0):
+    aleatorio = np.random.default_rng(semente)
+
+    def coluna(baixo, alto, prob_nan=0.1):
+        valores = aleatorio.uniform(baixo, alto, n).round(2)
+        # Valores exatamente nos limites dos critérios, onde >= e < fazem diferença
+        limites = aleatorio.random(n) < 0.15
+        valores[limites] = aleatorio.choice([0, 5, 10, 15, 20, 25, 35, 50, 100], limites.sum())
+        valores[aleatorio.random(n) < prob_nan] = np.nan
+        return valores
+
+    return pd.DataFrame({
+        'BDR': [f"T{i}34" for i in range(n)],
+        'Ticker US': [f"T{i}" for i in range(n)],
+        'Empresa': 'Empresa',
+        'Setor': 'Technology',
+        'ROE (%)': coluna(-20, 40),
+        'Margem (%)': coluna(-10, 30),
+        'Cresc (%)': coluna(-20, 30),
+        'Dívida/PL (%)': coluna(0, 200),
+        'P/E': coluna(-10, 80),
+        'P/B': coluna(0, 10),
+        'Div Yield (%)': coluna(0, 5, prob_nan=0),
+        'Market Cap (B)': coluna(0, 3000, prob_nan=0),
+    })
+
+def test_pontuacao_vetorizada_igual_a_linha_a_linha():
+    df = resultado_aleatorio()
+    pontuado = pontuar_bdrs(df)
+
+    for i, linha in df.iterrows():
+        status, score, alertas = classificar_bdr({
+            'roe': linha['ROE (%)'], 'margem': linha['Margem (%)'], 'crescimento': linha['Cresc (%)'],
+            'dividapl': linha['Dívida/PL (%)'], 'pe': linha['P/E'], 'dividend_yield': linha['Div Yield (%)'],
+        })
+        assert pontuado.at[i, 'Status'] == status, linha.to_dict()
+        assert pontuado.at[i, 'Score'] == score, linha.to_dict()
+        assert pontuado.at[i, 'Alertas'] == alertas, linha.to_dict()
+
+def test_tamanho_e_colunas():
+    df = resultado_aleatorio(n=4).assign(**{'Market Cap (B)': [250.0, 200.0, 9.99, 1.0]})
+    pontuado = pontuar_bdrs(df)
+    assert list(pontuado.columns) == COLUNAS_RESULTADO
+    assert list(pontuado['Tamanho']) == ['Mega Cap', 'Mega Cap', 'Mid Cap', 'Small Cap']
+
+def test_ranking_por_score_roe_e_dy():
+    ranqueado = ranquear_bdrs(resultado_aleatorio(n=300))
+    chave = list(zip(-ranqueado['Score'], -ranqueado['ROE (%)'].fillna(-np.inf), -ranqueado['Div Yield (%)']))
+    assert chave == sorted(chave)
@@ -0,0 +1,59 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+from snapshots import (
+    consultar_historico, descrever_versao, iterar_historico, maiores_variacoes, salvar_snapshot,
+    ultimo_snapshot
+)
+
+def resultado(scores):
+    return pd.DataFrame({
+        'BDR': list(scores),
+        'Empresa': [f"Empresa {bdr}" for bdr in scores],
+        'Score': list(scores.values()),
+        'ROE (%)': [10.0] * len(scores),
+    })
+
+def gravar_dias(diretorio):
+    """Completos em 15 e 16/10 e, depois, uma análise parcial em 16/10 só com A34"""
+    salvar_snapshot(resultado({'A34': 1.0, 'B34': 2.0, 'C34': 3.0}), diretorio, datetime(2026, 10, 15, 6))
+    salvar_snapshot(resultado({'A34': 2.0, 'B34': 2.0, 'C34': 5.0}), diretorio, datetime(2026, 10, 16, 6))
+    salvar_snapshot(resultado({'A34': 4.0}), diretorio, datetime(2026, 10, 16, 14), parcial=True)
+
+def test_parcial_nao_esconde_as_bdrs_que_nao_buscou(tmp_path):
+    diretorio = str(tmp_path)
+    gravar_dias(diretorio)
+
+    historico = consultar_historico(['Score'], bdrs=['C34'], diretorio=diretorio)
+    assert list(historico['data']) == list(pd.to_datetime(['2026-10-15', '2026-10-16']))
+    assert list(historico['Score']) == [3.0, 5.0]
+
+    # A linha da análise parcial, mais recente, vale para A34
+    dia = consultar_historico(['Score'], desde=date(2026, 10, 16), diretorio=diretorio)
+    assert dict(zip(dia['BDR'], dia['Score'])) == {'A34': 4.0, 'B34': 2.0, 'C34': 5.0}
+
+    variacoes, dia_inicio, dia_fim = maiores_variacoes(date(2026, 10, 15), diretorio=diretorio)
+    assert (dia_inicio, dia_fim) == (date(2026, 10, 15), date(2026, 10, 16))
+    assert dict(zip(variacoes['BDR'], variacoes['Variação'])) == {'A34': 3.0, 'C34': 2.0}
+
+def test_iterar_historico_igual_a_consulta(tmp_path):
+    diretorio = str(tmp_path)
+    gravar_dias(diretorio)
+    dias = list(iterar_historico(['Score'], diretorio=diretorio))
+    assert [len(df) for df in dias] == [3, 3]
+    juntos = pd.concat(dias).sort_values(['data', 'BDR'], ignore_index=True)
+    consulta = consultar_historico(['Score'], diretorio=diretorio)
+    assert list(juntos['Score']) == list(consulta['Score'].astype(float))
+
+def test_ultimo_snapshot_prefere_o_completo(tmp_path):
+    diretorio = str(tmp_path)
+    assert ultimo_snapshot(diretorio) is None
+    salvar_snapshot(resultado({'A34': 1.0}), diretorio, datetime(2026, 10, 15, 6), parcial=True)
+    versao, _ = ultimo_snapshot(diretorio)
+    assert descrever_versao(versao) == '15/10/2026 06:00 (parcial)'
+
+    gravar_dias(diretorio)
+    versao, caminho = ultimo_snapshot(diretorio)
+    assert versao == '20261016-060000'
+    assert len(pd.read_parquet(caminho)) == 3
@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+from dados import IndiceUniverso, obter_universo
+from metricas import iniciar_metricas
+from provedores import ProvedorReplay
+
+class ProvedorComEtag(ProvedorReplay):
+    """Replay que responde 304 (dados None) quando recebe o ETag da última lista, ou falha"""
+
+    def __init__(self, *args, falhar=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.falhar = falhar
+        self.etags_recebidos = []
+
+    def listar_acoes_condicional(self, etag=None, modificado_em=None):
+        self.etags_recebidos.append(etag)
+        if self.falhar:
+            raise requests.ConnectionError("BRAPI fora do ar")
+        if etag == 'v1':
+            return None, 'v1', None
+        return self.listar_acoes(), 'v1', None
+
+def resultados(metricas):
+    return [c['rotulos']['resultado'] for c in metricas.contadores() if c['nome'] == 'universo']
+
+@pytest.fixture
+def indice(tmp_path):
+    return IndiceUniverso(str(tmp_path))
+
+def test_brapi_consultada_uma_vez_por_intervalo(replay, indice):
+    metricas = iniciar_metricas()
+    bdrs = obter_universo(provedor=replay, indice=indice)
+    assert len(bdrs) == 40 and replay.requisicoes == 1
+    assert bdrs[0] == {'bdr': 'ZAAA34', 'ticker_us': 'ZAAA', 'nome': 'ZAAA Inc'}
+
+    assert obter_universo(provedor=replay, indice=indice) == bdrs
+    assert replay.requisicoes == 1
+
+    assert obter_universo(forcar_atualizacao=True, provedor=replay, indice=indice) == bdrs
+    assert replay.requisicoes == 2
+    assert sorted(resultados(metricas)) == ['alterado', 'recente', 'sem_alteracoes']
+
+def test_requisicao_condicional_com_etag(gravacao, indice):
+    metricas = iniciar_metricas()
+    provedor = ProvedorComEtag(gravacao)
+    bdrs = obter_universo(provedor=provedor, indice=indice, intervalo=0)
+    assert obter_universo(provedor=provedor, indice=indice, intervalo=0) == bdrs
+    assert provedor.etags_recebidos == [None, 'v1']
+    assert sorted(resultados(metricas)) == ['alterado', 'nao_modificado']
+    assert indice.recente()
+
+def test_so_as_diferencas_sao_gravadas(indice):
+    lista = [{'bdr': f"T{i}34", 'ticker_us': f"T{i}", 'nome': f"T{i} Inc"} for i in range(5)]
+    assert indice.aplicar(lista) == {'novas': 5, 'alteradas': 0, 'removidas': 0}
+    assert indice.aplicar(lista) == {'novas': 0, 'alteradas': 0, 'removidas': 0}
+
+    renomeada = {**lista[1], 'nome': 'Outro nome'}
+    assert indice.aplicar([lista[0], renomeada, *lista[2:4]]) == {'novas': 0, 'alteradas': 1, 'removidas': 1}
+    assert [b['bdr'] for b in indice.listar()] == ['T034', 'T134', 'T234', 'T334']
+    # BDR que volta à BRAPI conta como nova
+    assert indice.aplicar(lista)['novas'] == 1
+
+def test_brapi_fora_do_ar_usa_o_indice_anterior(gravacao, indice):
+    provedor = ProvedorComEtag(gravacao)
+    bdrs = obter_universo(provedor=provedor, indice=indice)
+
+    provedor.falhar = True
+    metricas = iniciar_metricas()
+    assert obter_universo(forcar_atualizacao=True, provedor=provedor, indice=indice) == bdrs
+    assert resultados(metricas) == ['erro']
+
+def test_brapi_fora_do_ar_sem_indice_falha(gravacao, indice):
+    with pytest.raises(requests.ConnectionError):
+        obter_universo(provedor=ProvedorComEtag(gravacao, falhar=True), indice=indice)
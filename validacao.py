@@ -0,0 +1,72 @@
+import argparse
+import re
+import sys
+
+import pandas as pd
+
+from dados import MAPA_BDRS_COMPLETO, obter_cache, obter_universo_indice
+
+# Validação offline dos mapeamentos BDR → empresa-mãe: usa só o índice do universo e o cache, sem rede
+
+def _palavras(texto):
+    return re.findall(r'[a-z0-9]+', (texto or '').lower())
+
+def _nome_confere(nome_bdr, nome_yahoo):
+    """A primeira palavra significativa do nome na B3 aparece no nome do Yahoo"""
+    palavras = [p for p in _palavras(nome_bdr) if len(p) >= 3 and p not in ('drn', 'dr2', 'dr3', 'inc', 'the')]
+    if not palavras or not nome_yahoo:
+        return True
+    return palavras[0] in ''.join(_palavras(nome_yahoo))
+
+def validar_mapeamentos(bdrs, cache=None):
+    """Lista os mapeamentos suspeitos: fallback que removeu dígitos do código (ex: X1YZ34 → XYZ),
+    tickers no cache negativo e nomes que não conferem com o info do Yahoo em cache"""
+    cache = cache or obter_cache()
+    sem_dados = cache.sem_dados()
+    suspeitos = []
+
+    for bdr_info in bdrs:
+        bdr, ticker_us, nome = bdr_info['bdr'], bdr_info['ticker_us'], bdr_info['nome']
+        problemas = []
+
+        if bdr not in MAPA_BDRS_COMPLETO and any(c.isdigit() for c in bdr[:-2]):
+            problemas.append(f"fallback removeu dígitos de {bdr}; confira e inclua no MAPA_BDRS_COMPLETO")
+
+        if ticker_us in sem_dados:
+            problemas.append(sem_dados[ticker_us])
+
+        info = cache.espiar(ticker_us, 'info')
+        if info:
+            nome_yahoo = info.get('longName') or info.get('shortName')
+            if not _nome_confere(nome, nome_yahoo):
+                problemas.append(f"nome não confere com o Yahoo ({nome_yahoo})")
+
+        for problema in problemas:
+            suspeitos.append({'BDR': bdr, 'Ticker US': ticker_us, 'Nome': nome, 'Problema': problema})
+
+    return pd.DataFrame(suspeitos, columns=['BDR', 'Ticker US', 'Nome', 'Problema'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Relata mapeamentos BDR → empresa-mãe suspeitos, a partir do índice do universo e do cache"
+    )
+    parser.add_argument('--csv', default=None, help="Grava o relatório neste arquivo CSV")
+    args = parser.parse_args(argv)
+
+    bdrs = obter_universo_indice().listar()
+    if not bdrs:
+        print("Índice do universo vazio: rode uma análise (app ou batch.py) antes", file=sys.stderr)
+        return 1
+
+    suspeitos = validar_mapeamentos(bdrs)
+    if args.csv:
+        suspeitos.to_csv(args.csv, index=False)
+    if suspeitos.empty:
+        print(f"{len(bdrs)} BDRs verificadas, nenhum mapeamento suspeito")
+    else:
+        print(suspeitos.to_string(index=False))
+        print(f"\n{suspeitos['BDR'].nunique()} de {len(bdrs)} BDRs com mapeamento suspeito")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())